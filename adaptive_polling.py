@@ -0,0 +1,175 @@
+"""
+جدولة تحديث متكيفة لكل رمز: الفاصل يُحسب من التذبذب الفعلي الأخير (ATR / السعر)
+ومن قرب السعر من أقرب تنبيه أو هدف أو وقف، فتُصرف حصة طلبات المزود حيث يُحتمل التفعيل
+"""
+
+import json
+import math
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from bar_data import as_bars
+
+# طول الشمعة بالثواني لكل فاصل من فواصل المزود
+INTERVAL_SECONDS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800,
+    '60m': 3600, '90m': 5400, '1h': 3600, '4h': 14400,
+    '1d': 86400, '5d': 432000, '1wk': 604800
+}
+
+
+class AdaptivePoller:
+    """فاصل التحديث لكل (قناة، رمز)
+
+    حركة السعر المتوقعة خلال t ثانية ≈ σ·√t حيث σ تذبذب الرمز لكل √ثانية،
+    فالفاصل هو الزمن الذي تحتاجه safety_factor من هذه الحركة لتقطع المسافة لأقرب مستوى.
+    """
+
+    def __init__(self, config_file: str = "adaptive_polling_config.json"):
+        self.config_file = config_file
+        self.config = self.load_config()
+        self.volatility: Dict[str, float] = {}   # الرمز -> التذبذب النسبي لكل √ثانية
+        self.next_due: Dict[tuple, float] = {}   # (القناة، الرمز) -> time.monotonic()
+        self.intervals: Dict[tuple, float] = {}  # (القناة، الرمز) -> آخر فاصل محسوب
+
+    def load_config(self) -> Dict:
+        """تحميل إعدادات الجدولة"""
+        try:
+            with open(self.config_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            default_config = {
+                "enabled": True,
+                "min_interval": 30,        # أقصر فاصل بالثواني (قرب مستوى أو تذبذب عالٍ)
+                "max_interval": 900,       # أطول فاصل للرموز الهادئة البعيدة عن أي مستوى
+                "default_interval": 60,    # قبل توفر تقدير للتذبذب
+                "atr_period": 14,
+                "quiet_move_pct": 0.5,     # الحركة التي تستحق تحديثاً حتى بدون مستويات قريبة
+                "safety_factor": 2.0,      # عدد الانحرافات المعيارية المسموح بها قبل الوصول للمستوى
+                "channel_min_interval": {  # فحص الإشارات بلا مستويات لا يحتاج تحديثاً أسرع من هذا
+                    "auto_scan": 120,
+                    "advanced_scan": 120
+                }
+            }
+
+            with open(self.config_file, "w") as f:
+                json.dump(default_config, f, indent=2)
+
+            return default_config
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.get('enabled', True)
+
+    def _bar_seconds(self, data, interval: Optional[str]) -> Optional[float]:
+        """طول الشمعة من الفاصل أو من فرق الطوابع الزمنية"""
+        if interval in INTERVAL_SECONDS:
+            return INTERVAL_SECONDS[interval]
+        try:
+            steps = np.diff(data.index.asi8[-50:]) / 1e9
+            steps = steps[steps > 0]
+            return float(np.median(steps)) if len(steps) else None
+        except Exception:
+            return None
+
+    def update_volatility(self, symbol: str, data, interval: Optional[str] = None) -> Optional[float]:
+        """تحديث تذبذب الرمز من شموعه (DataFrame أو BarData)"""
+        try:
+            if data is None or len(data) < 2:
+                return None
+
+            period = self.config.get('atr_period', 14)
+            bars = as_bars(data)
+            atr = float(np.mean(bars.true_range[1:][-period:]))
+            price = float(bars.close[-1])
+            bar_seconds = self._bar_seconds(bars.frame, interval)
+            if not bar_seconds or price <= 0 or not math.isfinite(atr):
+                return None
+
+            sigma = atr / price / math.sqrt(bar_seconds)
+            if sigma > 0:
+                self.volatility[symbol] = sigma
+                return sigma
+        except Exception as e:
+            print(f"خطأ في تقدير تذبذب الرمز {symbol}: {e}")
+        return None
+
+    def interval_for(self, symbol: str, price: Optional[float] = None, levels: Iterable[float] = (),
+                     channel: Optional[str] = None) -> float:
+        """فاصل التحديث بالثواني حسب التذبذب والمسافة لأقرب مستوى"""
+        min_interval = self.config.get('channel_min_interval', {}).get(channel, self.config.get('min_interval', 30))
+        max_interval = max(self.config.get('max_interval', 900), min_interval)
+
+        sigma = self.volatility.get(symbol)
+        if not sigma:
+            return float(max(self.config.get('default_interval', 60), min_interval))
+
+        distance = self.config.get('quiet_move_pct', 0.5) / 100
+        if price:
+            for level in levels:
+                if level is not None and math.isfinite(level):
+                    distance = min(distance, abs(level - price) / price)
+
+        interval = (distance / (self.config.get('safety_factor', 2.0) * sigma)) ** 2
+        return float(min(max(interval, min_interval), max_interval))
+
+    def schedule(self, channel: str, symbol: str, price: Optional[float] = None,
+                 levels: Iterable[float] = (), now: Optional[float] = None) -> float:
+        """تحديد موعد التحديث التالي للرمز بعد تحديثه الآن"""
+        now = time.monotonic() if now is None else now
+        interval = self.interval_for(symbol, price, levels, channel)
+        self.intervals[(channel, symbol)] = interval
+        self.next_due[(channel, symbol)] = now + interval
+        return interval
+
+    def observe(self, channel: str, symbol: str, data=None, interval: Optional[str] = None,
+                price: Optional[float] = None, levels: Iterable[float] = ()) -> float:
+        """تحديث التذبذب من الشموع المحملة ثم جدولة التحديث التالي"""
+        if data is not None and len(data) > 0:
+            self.update_volatility(symbol, data, interval)
+            if price is None:
+                price = float(data['Close'].iloc[-1])
+        return self.schedule(channel, symbol, price, levels)
+
+    def observe_quotes(self, channel: str, symbols: Iterable[str], snapshot, quotes: Dict[str, float],
+                       levels: Optional[Dict[str, List[float]]] = None):
+        """جدولة رموز لقطة الأسعار: التذبذب من شموع الدقيقة المحملة والمسافة للمستويات"""
+        levels = levels or {}
+        for symbol in symbols:
+            self.observe(channel, symbol, snapshot.cached_bars(symbol, "1d", "1m"), "1m",
+                         price=quotes.get(symbol), levels=levels.get(symbol, ()))
+
+    def due(self, channel: str, symbols: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """الرموز التي حان تحديثها (أو لم تُجدول بعد)"""
+        symbols = list(dict.fromkeys(symbols))
+        if not self.enabled:
+            return symbols
+
+        now = time.monotonic() if now is None else now
+        return [symbol for symbol in symbols if self.next_due.get((channel, symbol), 0) <= now]
+
+    def seconds_until_due(self, channel: str, symbols: Iterable[str], default: float,
+                          now: Optional[float] = None) -> float:
+        """الانتظار حتى أقرب موعد تحديث، بحد أدنى min_interval وأقصى default"""
+        if not self.enabled:
+            return default
+
+        now = time.monotonic() if now is None else now
+        waits = [self.next_due.get((channel, symbol), now) - now for symbol in symbols]
+        if not waits:
+            return default
+        return float(min(max(min(waits), self.config.get('min_interval', 30)), default))
+
+    def get_stats(self, channel: Optional[str] = None) -> Dict:
+        """الفواصل الحالية لكل رمز (للعرض)"""
+        return {
+            f"{key[0]}:{key[1]}" if channel is None else key[1]: round(interval)
+            for key, interval in self.intervals.items()
+            if channel is None or key[0] == channel
+        }
+
+
+# الجدولة المشتركة: التذبذب المقدر من أي حلقة يفيد بقية الحلقات
+adaptive_poller = AdaptivePoller()
@@ -5,13 +5,19 @@
 import pandas as pd
 import numpy as np
 
+import kernels
+from bar_data import as_bars
+
 class AdditionalIndicators:
     def __init__(self, data):
-        self.data = data
-        self.high = data['High'].values
-        self.low = data['Low'].values
-        self.close = data['Close'].values
-        self.volume = data['Volume'].values if 'Volume' in data.columns else np.ones(len(data))
+        # data: حاوية BarData مشتركة أو DataFrame
+        bars = as_bars(data)
+        self.bars = bars
+        self.data = bars.frame
+        self.high = bars.high
+        self.low = bars.low
+        self.close = bars.close
+        self.volume = bars.volume_or_ones
     
     def stochastic_oscillator(self, k_period=14, d_period=3):
         """مذبذب ستوكاستيك"""
@@ -70,7 +76,7 @@ class AdditionalIndicators:
     def commodity_channel_index(self, period=20):
         """مؤشر قناة السلع CCI"""
         # حساب السعر النموذجي
-        typical_price = (self.high + self.low + self.close) / 3
+        typical_price = self.bars.typical_price
         
         # المتوسط المتحرك البسيط للسعر النموذجي
         sma_tp = pd.Series(typical_price).rolling(window=period).mean()
@@ -104,35 +110,36 @@ class AdditionalIndicators:
         }
     
     def average_directional_index(self, period=14):
-        """مؤشر الاتجاه المتوسط ADX"""
-        # حساب True Range
-        tr1 = self.high - self.low
-        tr2 = np.abs(self.high - np.roll(self.close, 1))
-        tr3 = np.abs(self.low - np.roll(self.close, 1))
-        true_range = np.maximum(tr1, np.maximum(tr2, tr3))
+        """مؤشر الاتجاه المتوسط ADX بتنعيم Wilder"""
+        # حساب True Range (الشمعة الأولى بلا إغلاق سابق فلا تدخل في التنعيم)
+        true_range = np.array(self.bars.true_range, dtype=np.float64)
+        true_range[:1] = np.nan
         
         # حساب Directional Movement
-        dm_plus = np.where((self.high - np.roll(self.high, 1)) > (np.roll(self.low, 1) - self.low), 
-                          np.maximum(self.high - np.roll(self.high, 1), 0), 0)
-        dm_minus = np.where((np.roll(self.low, 1) - self.low) > (self.high - np.roll(self.high, 1)), 
-                           np.maximum(np.roll(self.low, 1) - self.low, 0), 0)
-        
-        # Smoothed values
-        tr_smooth = pd.Series(true_range).rolling(window=period).mean()
-        dm_plus_smooth = pd.Series(dm_plus).rolling(window=period).mean()
-        dm_minus_smooth = pd.Series(dm_minus).rolling(window=period).mean()
-        
-        # Directional Indicators
-        di_plus = 100 * (dm_plus_smooth / tr_smooth)
-        di_minus = 100 * (dm_minus_smooth / tr_smooth)
-        
-        # ADX calculation
-        dx = 100 * np.abs(di_plus - di_minus) / (di_plus + di_minus)
-        adx = pd.Series(dx).rolling(window=period).mean()
+        up_move = np.full(len(self.high), np.nan)
+        down_move = np.full(len(self.low), np.nan)
+        up_move[1:] = np.diff(self.high)
+        down_move[1:] = -np.diff(self.low)
+        dm_plus = np.where(np.isnan(up_move), np.nan, np.where(up_move > down_move, np.maximum(up_move, 0), 0))
+        dm_minus = np.where(np.isnan(down_move), np.nan, np.where(down_move > up_move, np.maximum(down_move, 0), 0))
+        
+        # تنعيم Wilder (تسلسلي: نواة مترجمة عند توفر numba)
+        tr_smooth = kernels.wilder_smoothing(true_range, period)
+        dm_plus_smooth = kernels.wilder_smoothing(dm_plus, period)
+        dm_minus_smooth = kernels.wilder_smoothing(dm_minus, period)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Directional Indicators
+            di_plus = 100 * (dm_plus_smooth / tr_smooth)
+            di_minus = 100 * (dm_minus_smooth / tr_smooth)
+            
+            # ADX calculation
+            dx = 100 * np.abs(di_plus - di_minus) / (di_plus + di_minus)
+        adx = kernels.wilder_smoothing(dx, period)
         
-        current_adx = adx.iloc[-1] if not pd.isna(adx.iloc[-1]) else 0
-        current_di_plus = di_plus.iloc[-1] if not pd.isna(di_plus.iloc[-1]) else 0
-        current_di_minus = di_minus.iloc[-1] if not pd.isna(di_minus.iloc[-1]) else 0
+        current_adx = adx[-1] if not np.isnan(adx[-1]) else 0
+        current_di_plus = di_plus[-1] if not np.isnan(di_plus[-1]) else 0
+        current_di_minus = di_minus[-1] if not np.isnan(di_minus[-1]) else 0
         
         signals = []
         
@@ -154,52 +161,8 @@ class AdditionalIndicators:
     
     def parabolic_sar(self, af=0.02, max_af=0.2):
         """مؤشر البارابوليك SAR"""
-        length = len(self.close)
-        psar = np.zeros(length)
-        trend = np.zeros(length)
-        af_values = np.zeros(length)
-        ep = np.zeros(length)
-        
-        # Initialize
-        psar[0] = self.low[0]
-        trend[0] = 1  # 1 for uptrend, -1 for downtrend
-        af_values[0] = af
-        ep[0] = self.high[0]
-        
-        for i in range(1, length):
-            if trend[i-1] == 1:  # Uptrend
-                psar[i] = psar[i-1] + af_values[i-1] * (ep[i-1] - psar[i-1])
-                
-                if self.low[i] <= psar[i]:
-                    trend[i] = -1
-                    psar[i] = ep[i-1]
-                    ep[i] = self.low[i]
-                    af_values[i] = af
-                else:
-                    trend[i] = 1
-                    if self.high[i] > ep[i-1]:
-                        ep[i] = self.high[i]
-                        af_values[i] = min(af_values[i-1] + af, max_af)
-                    else:
-                        ep[i] = ep[i-1]
-                        af_values[i] = af_values[i-1]
-                        
-            else:  # Downtrend
-                psar[i] = psar[i-1] - af_values[i-1] * (psar[i-1] - ep[i-1])
-                
-                if self.high[i] >= psar[i]:
-                    trend[i] = 1
-                    psar[i] = ep[i-1]
-                    ep[i] = self.high[i]
-                    af_values[i] = af
-                else:
-                    trend[i] = -1
-                    if self.low[i] < ep[i-1]:
-                        ep[i] = self.low[i]
-                        af_values[i] = min(af_values[i-1] + af, max_af)
-                    else:
-                        ep[i] = ep[i-1]
-                        af_values[i] = af_values[i-1]
+        # حلقة تسلسلية: تُنفذ في نواة مترجمة عند توفر numba
+        psar, trend = kernels.parabolic_sar(self.high, self.low, af, max_af)
         
         current_psar = psar[-1]
         current_trend = trend[-1]
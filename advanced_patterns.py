@@ -5,6 +5,8 @@
 import pandas as pd
 import numpy as np
 
+from bar_data import as_bars
+
 try:
     from scipy import stats
     from scipy.signal import find_peaks
@@ -23,12 +25,15 @@ except ImportError:
 
 class AdvancedPatterns:
     def __init__(self, data):
-        self.data = data
-        self.high = data['High'].values
-        self.low = data['Low'].values
-        self.close = data['Close'].values
-        self.open = data['Open'].values
-        self.volume = data['Volume'].values if 'Volume' in data.columns else np.ones(len(data))
+        # data: حاوية BarData مشتركة أو DataFrame
+        bars = as_bars(data)
+        self.bars = bars
+        self.data = bars.frame
+        self.high = bars.high
+        self.low = bars.low
+        self.close = bars.close
+        self.open = bars.open
+        self.volume = bars.volume_or_ones
         
     def detect_support_resistance(self, window=20, min_touches=2):
         """كشف مستويات الدعم والمقاومة"""
@@ -5,13 +5,21 @@
 
 import json
 import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from data_collector import DataCollector
+from adaptive_polling import adaptive_poller
+from correlation_engine import RollingCorrelationEngine
+from data_collector import DataCollector, resample_ohlcv, RESAMPLE_RULES
+from market_sessions import market_sessions
 from recommendation_system import RecommendationSystem
+from signal_scanner import SignalScanner
+from symbol_mapper import get_pip_size
+from task_offload import offloader
+from trade_journal import TradeJournal
+from trade_monitor import TradeLevelMonitor
 from utils import load_permissions, send_to_telegram
 import os
 
@@ -20,6 +28,8 @@ class AdvancedTradingSystem:
         self.data_collector = DataCollector()
         self.recommendation_system = RecommendationSystem()
         self.active_trades = {}
+        self.trade_monitor = TradeLevelMonitor()
+        self.journal = TradeJournal("advanced_active_trades.json")
         self.trading_config = self.load_advanced_config()
         self.bot_token = os.getenv("BOT_TOKEN")
         
@@ -64,6 +74,26 @@ class AdvancedTradingSystem:
         # الأطر الزمنية المدعومة
         self.timeframes = ['1m', '5m', '15m', '30m', '1h']
         
+        # السلسلة الأساسية (الأدق) التي تُشتق منها باقي الأطر بتحميل واحد
+        self.base_period = '5d'
+        self.base_interval = '1m'
+        self.base_cache_ttl = 60  # ثانية
+        self._base_series_cache = {}
+        
+        # ماسح كامل قائمة الرموز بمجموعة عمال وميزانية زمنية لكل دورة
+        self.signal_scanner = SignalScanner(
+            self.generate_advanced_signal,
+            max_workers=self.trading_config.get('scan_workers', 8),
+            cycle_budget=self.trading_config.get('scan_cycle_budget', 120)
+        )
+        
+        # ارتباط العوائد بين الرموز لتجنب تكرار نفس المخاطرة في صفقات مرتبطة
+        self.correlation_engine = RollingCorrelationEngine(
+            window=self.trading_config.get('correlation_window', 120),
+            bar_interval=self.trading_config.get('correlation_bar_interval', '15m'),
+            correlation_threshold=self.trading_config.get('correlation_threshold', 0.6)
+        )
+        
     def load_advanced_config(self):
         """تحميل إعدادات التداول المتقدمة"""
         try:
@@ -89,6 +119,12 @@ class AdvancedTradingSystem:
                     "crypto": 2        # العملات الرقمية
                 },
                 "risk_reward_ratios": [1.5, 2.5, 4.0],  # نسب المخاطرة للأهداف الثلاثة
+                "scan_workers": 8,          # عدد العمال المتوازيين لفحص الرموز
+                "scan_cycle_budget": 120,   # الميزانية الزمنية لكل دورة فحص (ثانية)
+                "correlation_window": 120,          # عدد الشموع في نافذة الارتباط
+                "correlation_bar_interval": "15m",  # فاصل شموع حساب الارتباط
+                "correlation_threshold": 0.6,       # أقل ارتباط يُحسب ضمن التعرض
+                "max_correlated_exposure": 0.8,     # أقصى تعرض مرتبط مسموح لصفقة جديدة
                 "notification_groups": []
             }
             
@@ -99,142 +135,233 @@ class AdvancedTradingSystem:
     
     def calculate_pip_value(self, symbol: str, price: float) -> float:
         """حساب قيمة النقطة بدقة عالية حسب نوع الرمز"""
-        symbol_upper = symbol.upper()
-        
-        # أزواج الين اليابانية
-        if 'JPY' in symbol_upper:
-            return 0.01
-        # أزواج العملات العادية
-        elif any(curr in symbol_upper for curr in ['USD', 'EUR', 'GBP', 'CHF', 'AUD', 'CAD', 'NZD']):
-            return 0.0001
-        # المعادن
-        elif symbol_upper in ['GC=F', 'GOLD', 'XAUUSD']:  # الذهب
-            return 0.1
-        elif symbol_upper in ['SI=F', 'SILVER', 'XAGUSD']:  # الفضة
-            return 0.001
-        # النفط
-        elif symbol_upper in ['CL=F', 'BZ=F']:
-            return 0.01
-        # المؤشرات
-        elif symbol_upper.startswith('^') or 'INDEX' in symbol_upper:
-            return 1.0
-        # العملات الرقمية
-        elif '-USD' in symbol_upper or 'USDT' in symbol_upper:
-            if 'BTC' in symbol_upper:
-                return 1.0
-            elif 'ETH' in symbol_upper:
-                return 0.1
-            else:
-                return 0.0001
-        else:
-            return 0.0001  # افتراضي
+        # بحث واحد في سجل الرموز بدل فحص أجزاء الرمز عند كل استدعاء
+        return get_pip_size(symbol)
     
     def calculate_pips_difference(self, symbol: str, price1: float, price2: float) -> float:
         """حساب الفرق بالنقاط بين سعرين"""
         pip_value = self.calculate_pip_value(symbol, price1)
         return abs(price2 - price1) / pip_value
     
-    def get_multi_timeframe_analysis(self, symbol: str) -> Dict:
-        """تحليل متعدد الأطر الزمنية"""
-        analyses = {}
+    def get_base_series(self, symbol: str, snapshot=None) -> Optional[pd.DataFrame]:
+        """الحصول على السلسلة الأساسية للرمز مع إعادة استخدامها خلال مدة التخزين"""
+        # لقطة السوق المشتركة من المجدول تغني عن التحميل
+        if snapshot is not None:
+            return snapshot.bars(symbol, self.base_period, self.base_interval)
+        
+        cached = self._base_series_cache.get(symbol)
+        if cached and time.time() - cached[0] < self.base_cache_ttl:
+            return cached[1]
+        
+        data = self.data_collector.get_data_by_type(
+            symbol, period=self.base_period, interval=self.base_interval
+        )
         
+        if data is None or data.empty:
+            return None
+        
+        self._base_series_cache[symbol] = (time.time(), data)
+        return data
+    
+    def get_multi_timeframe_analysis(self, symbol: str, base_data: Optional[pd.DataFrame] = None) -> Dict:
+        """تحليل متعدد الأطر الزمنية من تحميل واحد للسلسلة الأدق"""
+        if base_data is None:
+            base_data = self.get_base_series(symbol)
+        
+        if base_data is None or base_data.empty:
+            return {}
+        
+        # اشتقاق الأطر الأكبر من السلسلة الأساسية
+        frames = {}
         for timeframe in self.timeframes:
             try:
-                # تحويل الإطار الزمني لتنسيق yfinance
-                if timeframe == '1m':
-                    period, interval = '1d', '1m'
-                elif timeframe == '5m':
-                    period, interval = '5d', '5m'
-                elif timeframe == '15m':
-                    period, interval = '1mo', '15m'
-                elif timeframe == '30m':
-                    period, interval = '1mo', '30m'
-                elif timeframe == '1h':
-                    period, interval = '3mo', '1h'
+                if timeframe == self.base_interval:
+                    frames[timeframe] = base_data
                 else:
-                    continue
-                
-                # الحصول على البيانات
-                ticker = yf.Ticker(symbol)
-                data = ticker.history(period=period, interval=interval)
-                
-                if data.empty:
-                    continue
-                
-                # التحليل الفني للإطار الزمني
-                analysis = self._analyze_timeframe_data(data, timeframe)
-                analyses[timeframe] = analysis
-                
+                    frames[timeframe] = resample_ohlcv(base_data, timeframe)
             except Exception as e:
-                print(f"خطأ في تحليل الإطار الزمني {timeframe} للرمز {symbol}: {e}")
-                continue
+                print(f"خطأ في اشتقاق الإطار الزمني {timeframe} للرمز {symbol}: {e}")
         
-        return analyses
+        # الأطر التي لا تحتوي بيانات لا تدخل في التحليل
+        frames = {tf: data for tf, data in frames.items() if data is not None and not data.empty}
+        
+        return self._analyze_timeframes_batch(frames)
     
     def _analyze_timeframe_data(self, data: pd.DataFrame, timeframe: str) -> Dict:
         """تحليل بيانات إطار زمني واحد"""
-        if data.empty or len(data) < 20:
-            return {'trend': 'غير محدد', 'strength': 0, 'signals': []}
+        return self._analyze_timeframes_batch({timeframe: data})[timeframe]
+    
+    def _analyze_timeframes_batch(self, frames: Dict[str, pd.DataFrame]) -> Dict:
+        """تحليل عدة أطر زمنية دفعة واحدة بعمليات مصفوفية"""
+        analyses = {}
+        valid = []
+        
+        for timeframe, data in frames.items():
+            if data.empty or len(data) < 20:
+                analyses[timeframe] = {'trend': 'غير محدد', 'strength': 0, 'signals': []}
+            else:
+                valid.append(timeframe)
         
-        # حساب المؤشرات
-        closes = data['Close']
-        highs = data['High']
-        lows = data['Low']
+        if not valid:
+            return analyses
+        
+        # آخر 20 إغلاق لكل إطار تكفي لـ MA20 و RSI14
+        closes = np.vstack([frames[tf]['Close'].values[-20:].astype(np.float64) for tf in valid])
         
         # المتوسطات المتحركة
-        ma_short = closes.rolling(window=10).mean().iloc[-1]
-        ma_long = closes.rolling(window=20).mean().iloc[-1]
-        current_price = closes.iloc[-1]
+        ma_short = closes[:, -10:].mean(axis=1)
+        ma_long = closes.mean(axis=1)
+        current_price = closes[:, -1]
         
         # RSI
-        delta = closes.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        current_rsi = rsi.iloc[-1] if not rsi.empty else 50
+        delta = np.diff(closes[:, -15:], axis=1)
+        gain = np.where(delta > 0, delta, 0.0).mean(axis=1)
+        loss = np.where(delta < 0, -delta, 0.0).mean(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = gain / loss
+            rsi = 100 - (100 / (1 + rs))
         
         # تحديد الاتجاه
-        trend = 'صاعد' if current_price > ma_short > ma_long else 'هابط' if current_price < ma_short < ma_long else 'عرضي'
+        uptrend = (current_price > ma_short) & (ma_short > ma_long)
+        downtrend = (current_price < ma_short) & (ma_short < ma_long)
         
         # قوة الإشارة
-        strength = 0
-        signals = []
-        
-        if trend == 'صاعد':
-            strength += 30
-            if current_rsi < 70:  # ليس في منطقة التشبع الشرائي
-                strength += 20
-                signals.append('فرصة شراء')
-        elif trend == 'هابط':
-            strength += 30
-            if current_rsi > 30:  # ليس في منطقة التشبع البيعي
-                strength += 20
-                signals.append('فرصة بيع')
-        
-        # إشارات إضافية
-        if current_rsi > 70:
-            signals.append('تشبع شرائي')
-        elif current_rsi < 30:
-            signals.append('تشبع بيعي')
+        strength = np.where(uptrend | downtrend, 30, 0)
+        strength = strength + np.where((uptrend & (rsi < 70)) | (downtrend & (rsi > 30)), 20, 0)
+        strength = np.minimum(strength, 100)
+        
+        for i, timeframe in enumerate(valid):
+            signals = []
+            
+            if uptrend[i]:
+                trend = 'صاعد'
+                if rsi[i] < 70:  # ليس في منطقة التشبع الشرائي
+                    signals.append('فرصة شراء')
+            elif downtrend[i]:
+                trend = 'هابط'
+                if rsi[i] > 30:  # ليس في منطقة التشبع البيعي
+                    signals.append('فرصة بيع')
+            else:
+                trend = 'عرضي'
+            
+            # إشارات إضافية
+            if rsi[i] > 70:
+                signals.append('تشبع شرائي')
+            elif rsi[i] < 30:
+                signals.append('تشبع بيعي')
+            
+            analyses[timeframe] = {
+                'trend': trend,
+                'strength': int(strength[i]),
+                'rsi': round(float(rsi[i]), 2),
+                'ma_short': round(float(ma_short[i]), 5),
+                'ma_long': round(float(ma_long[i]), 5),
+                'current_price': round(float(current_price[i]), 5),
+                'signals': signals
+            }
         
-        return {
-            'trend': trend,
-            'strength': min(strength, 100),
-            'rsi': round(current_rsi, 2),
-            'ma_short': round(ma_short, 5),
-            'ma_long': round(ma_long, 5),
-            'current_price': round(current_price, 5),
-            'signals': signals
-        }
+        return analyses
+    
+    def consensus_series(self, base_data: pd.DataFrame) -> pd.DataFrame:
+        """إجماع الأطر الزمنية لكل شمعة من السلسلة الأساسية دفعة واحدة (للاختبار التاريخي)
+
+        عند كل شمعة يُعامل الإطار الأكبر كما في التحليل الحي: شموعه المكتملة
+        بالإضافة إلى شمعة جارية إغلاقها هو إغلاق الشمعة الأساسية الحالية.
+        """
+        base_data = base_data.dropna(subset=['Close'])
+        close = base_data['Close'].values.astype(np.float64)
+        n = len(close)
+        
+        weight_sum_buy = np.zeros(n)
+        weight_sum_sell = np.zeros(n)
+        total_strength = np.zeros(n)
+        
+        for timeframe in self.timeframes:
+            if timeframe == self.base_interval:
+                frame_close = close
+                bucket = np.arange(n)
+            else:
+                frame = resample_ohlcv(base_data, timeframe)
+                frame_close = frame['Close'].values.astype(np.float64)
+                labels = base_data.index.floor(RESAMPLE_RULES.get(timeframe, timeframe))
+                bucket = frame.index.get_indexer(labels)
+            
+            trend, strength = self._timeframe_series(close, frame_close, bucket)
+            total_strength += strength
+            
+            weight = 2 if timeframe in ['15m', '30m', '1h'] else 1
+            weight_sum_buy += np.where((trend > 0) & (strength > 60), weight, 0)
+            weight_sum_sell += np.where((trend < 0) & (strength > 60), weight, 0)
+        
+        avg_strength = total_strength / len(self.timeframes)
+        
+        is_buy = (weight_sum_buy > weight_sum_sell) & (weight_sum_buy >= 3)
+        is_sell = (weight_sum_sell > weight_sum_buy) & (weight_sum_sell >= 3)
+        direction = np.where(is_buy, 1, np.where(is_sell, -1, 0)).astype(np.int8)
+        confidence = np.where(
+            is_buy | is_sell,
+            np.minimum(85 + np.abs(weight_sum_buy - weight_sum_sell) * 5, 95),
+            avg_strength
+        )
+        
+        return pd.DataFrame({
+            'direction': direction,
+            'confidence': np.round(confidence, 1),
+            'avg_strength': avg_strength
+        }, index=base_data.index)
     
-    def generate_advanced_signal(self, symbol: str) -> Optional[Dict]:
+    def _timeframe_series(self, close: np.ndarray, frame_close: np.ndarray, bucket: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """اتجاه وقوة إطار زمني عند كل شمعة أساسية بمجاميع تراكمية (نفس قواعد التحليل الحي)"""
+        n = len(close)
+        trend = np.zeros(n, dtype=np.int8)
+        strength = np.zeros(n)
+        
+        # الإطار يحتاج 20 شمعة على الأقل (19 مكتملة + الجارية)
+        valid = bucket >= 19
+        if not valid.any():
+            return trend, strength
+        
+        k = bucket[valid]
+        current = close[valid]
+        
+        # مجاميع تراكمية للإغلاقات المكتملة وللصعود والهبوط بينها
+        close_sum = np.concatenate([[0.0], np.cumsum(frame_close)])
+        delta = np.diff(frame_close, prepend=frame_close[0])
+        gain_sum = np.concatenate([[0.0], np.cumsum(np.where(delta > 0, delta, 0.0))])
+        loss_sum = np.concatenate([[0.0], np.cumsum(np.where(delta < 0, -delta, 0.0))])
+        
+        ma_short = (close_sum[k] - close_sum[k - 9] + current) / 10
+        ma_long = (close_sum[k] - close_sum[k - 19] + current) / 20
+        
+        last_delta = current - frame_close[k - 1]
+        gain = (gain_sum[k] - gain_sum[k - 13] + np.maximum(last_delta, 0.0)) / 14
+        loss = (loss_sum[k] - loss_sum[k - 13] + np.maximum(-last_delta, 0.0)) / 14
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + gain / loss))
+        
+        uptrend = (current > ma_short) & (ma_short > ma_long)
+        downtrend = (current < ma_short) & (ma_short < ma_long)
+        
+        tf_strength = np.where(uptrend | downtrend, 30, 0)
+        tf_strength = tf_strength + np.where((uptrend & (rsi < 70)) | (downtrend & (rsi > 30)), 20, 0)
+        
+        trend[valid] = np.where(uptrend, 1, np.where(downtrend, -1, 0))
+        strength[valid] = np.minimum(tf_strength, 100)
+        return trend, strength
+    
+    def generate_advanced_signal(self, symbol: str, snapshot=None) -> Optional[Dict]:
         """إنتاج إشارة تداول متقدمة بدقة عالية"""
         try:
             print(f"🔍 تحليل متقدم للرمز: {symbol}")
             
             # تحليل متعدد الأطر الزمنية
-            multi_tf_analysis = self.get_multi_timeframe_analysis(symbol)
+            if snapshot is not None:
+                multi_tf_analysis = snapshot.memo(
+                    ('multi_timeframe', symbol),
+                    lambda: self.get_multi_timeframe_analysis(symbol, self.get_base_series(symbol, snapshot))
+                )
+            else:
+                multi_tf_analysis = self.get_multi_timeframe_analysis(symbol)
             
             if not multi_tf_analysis:
                 print(f"❌ فشل في التحليل متعدد الأطر الزمنية للرمز {symbol}")
@@ -247,12 +374,12 @@ class AdvancedTradingSystem:
                 print(f"⚠️ إجماع ضعيف للرمز {symbol}: {consensus['confidence']}%")
                 return None
             
-            # الحصول على السعر الحالي
-            current_price_data = self.data_collector.get_current_price(symbol)
-            if not current_price_data:
+            # السعر الحالي من السلسلة الأساسية المحملة مسبقاً
+            base_data = self.get_base_series(symbol, snapshot)
+            if base_data is None or base_data.empty:
                 return None
             
-            current_price = current_price_data['price']
+            current_price = float(base_data['Close'].iloc[-1])
             
             # تحديد نوع الإشارة
             signal_type = consensus['signal_type']
@@ -496,7 +623,9 @@ class AdvancedTradingSystem:
             trade_id = f"{signal['symbol']}_{int(signal['timestamp'].timestamp())}"
             signal['trade_id'] = trade_id
             self.active_trades[trade_id] = signal
-            self.save_active_trades()
+            self.trade_monitor.add_trade(trade_id, signal)
+            self.correlation_engine.add_position(trade_id, signal['symbol'], self._trade_direction(signal))
+            self.record_trade_event('open', trade_id, signal)
             
             # إرسال للمستخدمين المصرح لهم
             permissions = load_permissions()
@@ -522,24 +651,51 @@ class AdvancedTradingSystem:
         except Exception as e:
             print(f"❌ خطأ في إرسال الإشارة المتقدمة: {e}")
     
+    def record_trade_event(self, event: str, trade_id: str, fields: Dict):
+        """تسجيل تغيير صفقة في السجل الإلحاقي مع ضغط دوري في لقطة"""
+        try:
+            self.journal.record(event, trade_id, fields)
+            self.journal.maybe_compact(self.active_trades)
+        except Exception as e:
+            print(f"خطأ في تسجيل حدث الصفقة {trade_id}: {e}")
+    
     def save_active_trades(self):
-        """حفظ الصفقات النشطة"""
+        """حفظ لقطة كاملة للصفقات النشطة وتفريغ السجل"""
         try:
-            with open("advanced_active_trades.json", "w") as f:
-                json.dump(self.active_trades, f, indent=2, default=str)
+            self.journal.compact(self.active_trades)
         except Exception as e:
             print(f"خطأ في حفظ الصفقات النشطة: {e}")
     
     def load_active_trades(self):
-        """تحميل الصفقات النشطة"""
+        """تحميل الصفقات النشطة من اللقطة وأحداث السجل"""
         try:
-            with open("advanced_active_trades.json", "r") as f:
-                self.active_trades = json.load(f)
-        except FileNotFoundError:
-            self.active_trades = {}
+            self.active_trades = self.journal.load()
         except Exception as e:
             print(f"خطأ في تحميل الصفقات النشطة: {e}")
             self.active_trades = {}
+        
+        self.trade_monitor.load(self.active_trades)
+        
+        for trade_id, trade in self.active_trades.items():
+            if trade.get('status') not in ['closed', 'cancelled']:
+                self.correlation_engine.add_position(trade_id, trade['symbol'], self._trade_direction(trade))
+    
+    @staticmethod
+    def _trade_direction(trade: Dict) -> int:
+        """اتجاه الصفقة: 1 للشراء و -1 للبيع"""
+        return 1 if trade['type'] == 'شراء' else -1
+    
+    def update_correlations(self, snapshot=None) -> int:
+        """تحديث محرك الارتباط بالشموع المكتملة الجديدة من البيانات المحملة مسبقاً"""
+        frames = {}
+        for symbol in self.get_all_symbols():
+            if snapshot is not None:
+                # الرموز التي لم تُحمل في هذه الدورة (سوق مغلق أو لم يحن تحديثها) لا تُحمّل هنا
+                frames[symbol] = snapshot.cached_bars(symbol, self.base_period, self.base_interval)
+            elif symbol in self._base_series_cache:
+                frames[symbol] = self._base_series_cache[symbol][1]
+        
+        return self.correlation_engine.update_from_frames(frames)
     
     async def advanced_monitoring_loop(self):
         """حلقة المراقبة المتقدمة"""
@@ -566,71 +722,44 @@ class AdvancedTradingSystem:
                 print(f"❌ خطأ في حلقة المراقبة المتقدمة: {e}")
                 await asyncio.sleep(300)
     
-    async def monitor_active_trades(self):
-        """مراقبة الصفقات النشطة"""
-        for trade_id, trade in list(self.active_trades.items()):
-            try:
-                if trade['status'] in ['closed', 'cancelled']:
-                    continue
-                
-                # فحص الأهداف ووقف الخسارة
-                await self.check_trade_levels(trade_id, trade)
-                
-            except Exception as e:
-                print(f"خطأ في مراقبة الصفقة {trade_id}: {e}")
-    
-    async def check_trade_levels(self, trade_id: str, trade: Dict):
-        """فحص مستويات الصفقة"""
+    async def monitor_active_trades(self, quotes: Optional[Dict[str, float]] = None):
+        """مراقبة جميع الصفقات النشطة مقابل لقطة أسعار واحدة"""
+        if len(self.trade_monitor) == 0:
+            return
+        
         try:
-            symbol = trade['symbol']
-            current_price_data = self.data_collector.get_current_price(symbol)
-            
-            if not current_price_data:
-                return
-            
-            current_price = current_price_data['price']
-            signal_type = trade['type']
-            
-            # فحص الأهداف
-            targets_hit = []
+            # لقطة أسعار واحدة لكل رموز الصفقات المفتوحة
+            if quotes is None:
+                quotes = await offloader.run_io(
+                    self.data_collector.get_quote_snapshot, self.trade_monitor.get_symbols()
+                )
+            
+            # فحص الأهداف ووقف الخسارة لكل الصفقات دفعة واحدة
+            hits = self.trade_monitor.evaluate(quotes)
+        except Exception as e:
+            print(f"خطأ في فحص مستويات الصفقات: {e}")
+            return
+        
+        await self.process_level_hits(hits)
+    
+    async def process_level_hits(self, hits: List[Dict]):
+        """معالجة الأهداف ووقف الخسارة المحققة"""
+        for hit in hits:
+            trade_id = hit['trade_id']
+            trade = self.active_trades.get(trade_id)
             
-            if signal_type == 'شراء':
-                # فحص الأهداف للشراء
-                if current_price >= trade['target_1'] and 'target_1' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_1')
-                if current_price >= trade['target_2'] and 'target_2' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_2')
-                if current_price >= trade['target_3'] and 'target_3' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_3')
-                
-                # فحص وقف الخسارة
-                if current_price <= trade['stop_loss']:
-                    await self.close_trade(trade_id, current_price, 'stop_loss')
-                    return
-                    
-            else:  # بيع
-                # فحص الأهداف للبيع
-                if current_price <= trade['target_1'] and 'target_1' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_1')
-                if current_price <= trade['target_2'] and 'target_2' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_2')
-                if current_price <= trade['target_3'] and 'target_3' not in trade.get('targets_hit', []):
-                    targets_hit.append('target_3')
-                
-                # فحص وقف الخسارة
-                if current_price >= trade['stop_loss']:
-                    await self.close_trade(trade_id, current_price, 'stop_loss')
-                    return
-            
-            # إرسال تنبيهات للأهداف المحققة
-            for target in targets_hit:
-                await self.send_target_hit_notification(trade_id, trade, target, current_price)
-                
-                # تحديث وقف الخسارة
-                await self.update_trailing_stop(trade_id, trade, target, current_price)
+            if not trade or trade['status'] in ['closed', 'cancelled']:
+                continue
             
-        except Exception as e:
-            print(f"خطأ في فحص مستويات الصفقة {trade_id}: {e}")
+            try:
+                if hit['event'] == 'stop_loss':
+                    await self.close_trade(trade_id, hit['price'], 'stop_loss')
+                else:
+                    # إرسال تنبيه الهدف المحقق ثم تحديث وقف الخسارة
+                    await self.send_target_hit_notification(trade_id, trade, hit['target'], hit['price'])
+                    await self.update_trailing_stop(trade_id, trade, hit['target'], hit['price'])
+            except Exception as e:
+                print(f"خطأ في معالجة مستويات الصفقة {trade_id}: {e}")
     
     async def send_target_hit_notification(self, trade_id: str, trade: Dict, target: str, current_price: float):
         """إرسال تنبيه عند تحقق الهدف"""
@@ -671,7 +800,8 @@ class AdvancedTradingSystem:
         if 'targets_hit' not in trade:
             trade['targets_hit'] = []
         trade['targets_hit'].append(target)
-        self.save_active_trades()
+        self.trade_monitor.mark_target_hit(trade_id, target)
+        self.record_trade_event('target_hit', trade_id, {'targets_hit': trade['targets_hit']})
     
     async def update_trailing_stop(self, trade_id: str, trade: Dict, target: str, current_price: float):
         """تحديث وقف الخسارة المتحرك"""
@@ -693,7 +823,8 @@ class AdvancedTradingSystem:
                 midpoint = (trade['entry_zone_1'] + trade['target_1']) / 2
                 trade['stop_loss'] = min(trade['stop_loss'], midpoint)
         
-        self.save_active_trades()
+        self.trade_monitor.update_stop(trade_id, trade['stop_loss'])
+        self.record_trade_event('stop_moved', trade_id, {'stop_loss': trade['stop_loss']})
     
     async def close_trade(self, trade_id: str, close_price: float, reason: str):
         """إغلاق الصفقة"""
@@ -705,6 +836,8 @@ class AdvancedTradingSystem:
         trade['close_price'] = close_price
         trade['close_time'] = datetime.now()
         trade['close_reason'] = reason
+        self.trade_monitor.remove_trade(trade_id)
+        self.correlation_engine.remove_position(trade_id)
         
         # حساب النتيجة
         pips_result = self.calculate_pips_difference(trade['symbol'], trade['entry_zone_1'], close_price)
@@ -714,6 +847,13 @@ class AdvancedTradingSystem:
             pips_result = pips_result if close_price > trade['entry_zone_1'] else -pips_result
         
         trade['pips_result'] = pips_result
+        self.record_trade_event('closed', trade_id, {
+            'status': trade['status'],
+            'close_price': close_price,
+            'close_time': trade['close_time'],
+            'close_reason': reason,
+            'pips_result': pips_result
+        })
         
         # إرسال تنبيه الإغلاق
         reason_text = {
@@ -746,37 +886,123 @@ class AdvancedTradingSystem:
                 send_to_telegram(user_id, message, self.bot_token)
             except Exception as e:
                 print(f"خطأ في إرسال تنبيه الإغلاق للمستخدم {user_id}: {e}")
-        
-        self.save_active_trades()
     
-    async def scan_for_new_signals(self):
-        """البحث عن إشارات جديدة"""
+    def get_all_symbols(self) -> List[str]:
+        """جميع الرموز المدعومة بدون تكرار"""
+        all_symbols = []
+        for category in self.supported_symbols.values():
+            all_symbols.extend(category)
+        return list(dict.fromkeys(all_symbols))
+    
+    async def scan_for_new_signals(self, snapshot=None):
+        """البحث عن إشارات جديدة في كامل قائمة الرموز"""
         if not self.trading_config.get('auto_trading_enabled', False):
             return
         
         # فحص الحد الأقصى للصفقات اليومية
+        today = datetime.now().strftime('%Y-%m-%d')
         today_trades = sum(1 for trade in self.active_trades.values() 
-                          if trade.get('timestamp', '').startswith(datetime.now().strftime('%Y-%m-%d')) 
+                          if str(trade.get('timestamp', '')).startswith(today) 
                           and trade['status'] != 'cancelled')
         
-        if today_trades >= self.trading_config.get('max_daily_trades', 3):
+        max_daily_trades = self.trading_config.get('max_daily_trades', 3)
+        if today_trades >= max_daily_trades:
             print(f"⚠️ تم الوصول للحد الأقصى من الصفقات اليومية: {today_trades}")
+            if snapshot is not None:
+                for symbol in adaptive_poller.due('advanced_scan', self.get_all_symbols()):
+                    adaptive_poller.schedule('advanced_scan', symbol)
             return
         
-        # فحص جميع الرموز المدعومة
-        all_symbols = []
-        for category in self.supported_symbols.values():
-            all_symbols.extend(category)
+        # فحص الرموز المدعومة التي سوقها مفتوح، وما لا تتسع له الميزانية ينتقل للدورة التالية
+        symbols = market_sessions.filter_active(self.get_all_symbols(), label="الإشارات المتقدمة: ")
+        budget = self.signal_scanner.cycle_budget
+        scan_function = None
+        if snapshot is not None:
+            # مع المجدول يُفحص كل رمز حسب فاصله المتكيف مع تذبذبه
+            symbols = adaptive_poller.due('advanced_scan', symbols)
+            time_left = snapshot.time_left()
+            if time_left is not None:
+                budget = min(budget, time_left)
+            
+            def scan_and_schedule(symbol):
+                signal = self.generate_advanced_signal(symbol, snapshot)
+                adaptive_poller.observe('advanced_scan', symbol, self.get_base_series(symbol, snapshot),
+                                        self.base_interval)
+                return signal
+            
+            scan_function = scan_and_schedule
+        
+        if not symbols:
+            return
         
-        for symbol in all_symbols[:10]:  # فحص أول 10 رموز في كل دورة
+        # الدورة تنتظر عمال الفحص، فتُشغّل خارج حلقة الأحداث حتى تبقى أوامر المستخدمين متجاوبة
+        try:
+            signals = await offloader.run_io(
+                self.signal_scanner.run_cycle, symbols, budget, scan_function,
+                timeout=budget + 30
+            )
+        except asyncio.TimeoutError:
+            print("⏱️ انتهت مهلة دورة فحص الإشارات المتقدمة")
+            return
+        
+        # الشموع المحملة في الفحص تحدّث الارتباطات قبل فلترة الإشارات
+        try:
+            await offloader.run_io(self.update_correlations, snapshot)
+        except Exception as e:
+            print(f"خطأ في تحديث الارتباطات: {e}")
+        
+        # إرسال الإشارات الأعلى ثقة ضمن الحصة اليومية المتبقية، مع تجاهل ما يكرر مخاطرة صفقات مفتوحة
+        max_exposure = self.trading_config.get('max_correlated_exposure', 0.8)
+        remaining = max_daily_trades - today_trades
+        signals.sort(key=lambda signal: signal['confidence'], reverse=True)
+        for signal in signals:
+            if remaining <= 0:
+                break
+            
+            direction = self._trade_direction(signal)
+            exposure = self.correlation_engine.exposure_if_opened(signal['symbol'], direction)
+            if exposure > max_exposure:
+                related = ', '.join(
+                    f"{position['symbol']} ({position['correlation']})"
+                    for position in self.correlation_engine.correlated_positions(signal['symbol'], direction)
+                )
+                print(f"🔗 تم تجاهل إشارة {signal['symbol']}: تعرض مرتبط {exposure:.2f} مع {related}")
+                continue
+            
             try:
-                signal = self.generate_advanced_signal(symbol)
-                if signal:
-                    await self.send_advanced_signal(signal)
-                    await asyncio.sleep(5)  # فترة انتظار بين الإشارات
-                    
+                await self.send_advanced_signal(signal)
+                remaining -= 1
             except Exception as e:
-                print(f"خطأ في فحص الرمز {symbol}: {e}")
+                print(f"خطأ في إرسال إشارة الرمز {signal['symbol']}: {e}")
+    
+    def snapshot_requirements(self) -> List[Tuple[List[str], str, str]]:
+        """البيانات المطلوبة من لقطة السوق المشتركة: السلسلة الأساسية للرموز التي سوقها مفتوح"""
+        symbols = market_sessions.filter_active(self.get_all_symbols(), verbose=False)
+        return [(adaptive_poller.due('advanced_scan', symbols), self.base_period, self.base_interval)]
+    
+    async def run_cycle(self, snapshot):
+        """دورة واحدة على لقطة السوق المشتركة: مراقبة الصفقات ثم البحث عن إشارات"""
+        # أسعار الصفقات التي حان تحديثها فقط: الأقرب لوقفها أو أهدافها تُحدّث أسرع
+        trade_symbols = adaptive_poller.due('advanced_trades', self.trade_monitor.get_symbols())
+        if trade_symbols:
+            # الرموز غير المحملة في اللقطة تُحمّل هنا، فيُشغّل خارج حلقة الأحداث
+            quotes = await offloader.run_io(snapshot.quotes, trade_symbols)
+            await self.monitor_active_trades(quotes=quotes)
+            adaptive_poller.observe_quotes('advanced_trades', trade_symbols, snapshot, quotes,
+                                           self.trade_monitor.levels_by_symbol())
+        await self.scan_for_new_signals(snapshot)
+    
+    def next_poll_seconds(self, default: float) -> float:
+        """الانتظار حتى أقرب صفقة أو رمز حان تحديثه"""
+        scan_symbols = market_sessions.filter_active(self.get_all_symbols(), verbose=False)
+        return min(
+            adaptive_poller.seconds_until_due('advanced_trades', self.trade_monitor.get_symbols(), default),
+            adaptive_poller.seconds_until_due('advanced_scan', scan_symbols, default)
+        )
+    
+    def get_scan_stats(self) -> Dict:
+        """إحصائيات التغطية وزمن الاستجابة لدورات الفحص"""
+        return self.signal_scanner.get_stats()
 
 # إنشاء مثيل النظام المتقدم
 advanced_trading = AdvancedTradingSystem()
\ No newline at end of file
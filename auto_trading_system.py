@@ -7,7 +7,13 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from data_collector import DataCollector
-from recommendation_system import RecommendationSystem
+from adaptive_polling import adaptive_poller
+from market_sessions import market_sessions
+from symbol_mapper import get_timeframe_config
+from recommendation_system import RecommendationSystem, analyze_preloaded
+from task_offload import offloader
+from trade_journal import TradeJournal
+from trade_monitor import TradeLevelMonitor
 from utils import load_permissions, send_to_telegram, send_alert_to_enabled_groups
 import os
 
@@ -16,6 +22,9 @@ class AutoTradingSystem:
         self.data_collector = DataCollector()
         self.recommendation_system = RecommendationSystem()
         self.active_trades = {}
+        self.trade_monitor = TradeLevelMonitor(target_keys=('take_profit',), entry_key='entry_price')
+        self.journal = TradeJournal("active_trades.json")
+        self.analysis_timeframe = "1h"
         self.trading_config = self.load_trading_config()
         self.bot_token = os.getenv("BOT_TOKEN")
         
@@ -50,25 +59,54 @@ class AutoTradingSystem:
             json.dump(self.trading_config, f, indent=2)
     
     def load_active_trades(self):
-        """تحميل الصفقات النشطة"""
+        """تحميل الصفقات النشطة من اللقطة وأحداث السجل"""
         try:
-            with open("active_trades.json", "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+            self.active_trades = self.journal.load()
+        except Exception as e:
+            print(f"خطأ في تحميل الصفقات النشطة: {e}")
+            self.active_trades = {}
+        
+        self.trade_monitor.load(self.active_trades)
+        return self.active_trades
+    
+    def record_trade_event(self, event, trade_id, fields):
+        """تسجيل تغيير صفقة في السجل الإلحاقي مع ضغط دوري في لقطة"""
+        try:
+            self.journal.record(event, trade_id, fields)
+            self.journal.maybe_compact(self.active_trades)
+        except Exception as e:
+            print(f"خطأ في تسجيل حدث الصفقة {trade_id}: {e}")
     
     def save_active_trades(self):
-        """حفظ الصفقات النشطة"""
-        with open("active_trades.json", "w") as f:
-            json.dump(self.active_trades, f, indent=2, default=str)
+        """حفظ لقطة كاملة للصفقات النشطة وتفريغ السجل"""
+        self.journal.compact(self.active_trades)
     
-    async def generate_trading_signal(self, symbol):
-        """إنتاج إشارة تداول للرمز المحدد"""
+    async def generate_trading_signal(self, symbol, snapshot=None):
+        """إنتاج إشارة تداول للرمز المحدد (snapshot: لقطة السوق المشتركة من المجدول)"""
         try:
             print(f"🔍 فحص إشارة تداول للرمز: {symbol}")
             
             # الحصول على التوصية
-            recommendation = self.recommendation_system.analyze_symbol(symbol)
+            # التحميل في مجموعة الخيوط والتحليل في مجموعة العمليات حتى لا تتجمد حلقة الأحداث
+            if snapshot is not None:
+                timeframe_config = get_timeframe_config(self.analysis_timeframe)
+                data = await offloader.run_io(
+                    snapshot.bars, symbol, timeframe_config['period'], timeframe_config['interval']
+                )
+                if data is None or data.empty:
+                    return None
+                recommendation = await snapshot.memo_async(
+                    ('recommendation', symbol, self.analysis_timeframe, 'fast'),
+                    lambda: offloader.run_cpu(
+                        analyze_preloaded, symbol, self.analysis_timeframe, data,
+                        profile='fast', min_confidence=self.trading_config['min_confidence']
+                    )
+                )
+            else:
+                recommendation = await offloader.run_io(
+                    self.recommendation_system.analyze_symbol, symbol, timeframe=self.analysis_timeframe,
+                    profile='fast', min_confidence=self.trading_config['min_confidence']
+                )
             
             if not recommendation:
                 return None
@@ -87,7 +125,11 @@ class AutoTradingSystem:
                 return None
             
             # الحصول على السعر الحالي
-            current_price_data = self.data_collector.get_current_price(symbol)
+            if snapshot is not None:
+                current_price = (await offloader.run_io(snapshot.quotes, [symbol])).get(symbol)
+                current_price_data = {'price': current_price} if current_price is not None else None
+            else:
+                current_price_data = await offloader.run_io(self.data_collector.get_current_price, symbol)
             if not current_price_data:
                 print(f"❌ فشل في الحصول على السعر الحالي للرمز {symbol}")
                 return None
@@ -121,6 +163,9 @@ class AutoTradingSystem:
             print(f"✅ إشارة تداول جديدة: {symbol} - {signal_type} - {confidence}%")
             return signal
             
+        except asyncio.TimeoutError:
+            print(f"⏱️ انتهت مهلة تحليل الرمز {symbol}")
+            return None
         except Exception as e:
             print(f"❌ خطأ في إنتاج إشارة التداول للرمز {symbol}: {e}")
             return None
@@ -160,7 +205,8 @@ class AutoTradingSystem:
             self.active_trades[signal_id] = signal
             self.active_trades[signal_id]['id'] = signal_id
             self.active_trades[signal_id]['status'] = 'active'
-            self.save_active_trades()
+            self.trade_monitor.add_trade(signal_id, self.active_trades[signal_id])
+            self.record_trade_event('open', signal_id, self.active_trades[signal_id])
             
             print(f"✅ تم إرسال إشارة التداول: {signal_id}")
             return signal_id
@@ -169,56 +215,38 @@ class AutoTradingSystem:
             print(f"❌ خطأ في إرسال إشارة التداول: {e}")
             return None
     
-    async def monitor_active_trades(self):
-        """مراقبة الصفقات النشطة"""
+    async def monitor_active_trades(self, quotes=None):
+        """مراقبة جميع الصفقات النشطة مقابل لقطة أسعار واحدة"""
         try:
-            if not self.active_trades:
+            if len(self.trade_monitor) == 0:
                 return
                 
-            print(f"📊 مراقبة {len(self.active_trades)} صفقة نشطة...")
+            print(f"📊 مراقبة {len(self.trade_monitor)} صفقة نشطة...")
             
-            for trade_id, trade in list(self.active_trades.items()):
-                if trade['status'] != 'active':
-                    continue
-                    
+            # لقطة أسعار واحدة لكل رموز الصفقات المفتوحة
+            if quotes is None:
+                quotes = await offloader.run_io(
+                    self.data_collector.get_quote_snapshot, self.trade_monitor.get_symbols()
+                )
+            
+            for trade_id, current_price in self.trade_monitor.prices_for(quotes).items():
+                if current_price is not None:
+                    self.active_trades[trade_id]['current_price'] = current_price
+            
+            # فحص وقف الخسارة وجني الأرباح لكل الصفقات دفعة واحدة
+            for hit in self.trade_monitor.evaluate(quotes):
+                trade_id = hit['trade_id']
                 try:
-                    # الحصول على السعر الحالي
-                    current_price_data = self.data_collector.get_current_price(trade['symbol'])
-                    
-                    if not current_price_data:
-                        continue
-                    
-                    current_price = current_price_data['price']
-                    trade['current_price'] = current_price
-                    
-                    # فحص وقف الخسارة وجني الأرباح
-                    trade_closed = False
-                    close_reason = ""
-                    
-                    if trade['type'] == 'شراء':
-                        if current_price <= trade['stop_loss']:
-                            trade_closed = True
-                            close_reason = "وقف خسارة"
-                            trade['result'] = 'loss'
-                        elif current_price >= trade['take_profit']:
-                            trade_closed = True
-                            close_reason = "جني أرباح"
-                            trade['result'] = 'profit'
-                    else:  # بيع
-                        if current_price >= trade['stop_loss']:
-                            trade_closed = True
-                            close_reason = "وقف خسارة"
-                            trade['result'] = 'loss'
-                        elif current_price <= trade['take_profit']:
-                            trade_closed = True
-                            close_reason = "جني أرباح"
-                            trade['result'] = 'profit'
+                    trade = self.active_trades[trade_id]
                     
-                    if trade_closed:
-                        await self.close_trade(trade_id, current_price, close_reason)
+                    if hit['event'] == 'stop_loss':
+                        close_reason = "وقف خسارة"
+                        trade['result'] = 'loss'
+                    else:
+                        close_reason = "جني أرباح"
+                        trade['result'] = 'profit'
                     
-                    # حفظ التحديثات
-                    self.save_active_trades()
+                    await self.close_trade(trade_id, hit['price'], close_reason)
                     
                 except Exception as trade_error:
                     print(f"❌ خطأ في مراقبة الصفقة {trade_id}: {trade_error}")
@@ -237,6 +265,7 @@ class AutoTradingSystem:
             trade['close_time'] = datetime.now()
             trade['close_reason'] = reason
             trade['status'] = 'closed'
+            self.trade_monitor.remove_trade(trade_id)
             
             # حساب النتيجة
             if trade['type'] == 'شراء':
@@ -245,6 +274,15 @@ class AutoTradingSystem:
                 pips = (trade['entry_price'] - close_price) * 10000
             
             trade['pips'] = round(pips, 1)
+            self.record_trade_event('closed', trade_id, {
+                'status': trade['status'],
+                'close_price': close_price,
+                'close_time': trade['close_time'],
+                'close_reason': reason,
+                'result': trade.get('result'),
+                'current_price': trade.get('current_price'),
+                'pips': trade['pips']
+            })
             
             # تنسيق رسالة الإغلاق
             result_emoji = "✅" if trade['result'] == 'profit' else "❌"
@@ -299,6 +337,8 @@ class AutoTradingSystem:
     
     async def auto_trading_loop(self):
         """الحلقة الرئيسية للتداول التلقائي"""
+        self.load_active_trades()
+        
         while True:
             try:
                 if not self.trading_config.get('auto_trading_enabled', False):
@@ -311,31 +351,7 @@ class AutoTradingSystem:
                 await self.monitor_active_trades()
                 
                 # فحص إشارات جديدة
-                symbols = self.trading_config.get('symbols_to_monitor', [])
-                
-                for symbol in symbols:
-                    try:
-                        # فحص إذا وصلنا للحد الأقصى من الصفقات اليومية
-                        daily_trades = self._count_daily_trades()
-                        max_daily_trades = self.trading_config.get('max_daily_trades', 5)
-                        
-                        if daily_trades >= max_daily_trades:
-                            print(f"⚠️ تم الوصول للحد الأقصى من الصفقات اليومية: {daily_trades}")
-                            break
-                        
-                        # فحص إذا كان لدينا صفقة نشطة للرمز
-                        if self._has_active_trade_for_symbol(symbol):
-                            continue
-                        
-                        # إنتاج إشارة جديدة
-                        signal = await self.generate_trading_signal(symbol)
-                        
-                        if signal:
-                            await self.send_trading_signal(signal)
-                            await asyncio.sleep(5)  # انتظار بين الإشارات
-                    
-                    except Exception as symbol_error:
-                        print(f"❌ خطأ في معالجة الرمز {symbol}: {symbol_error}")
+                await self.scan_symbols()
                 
                 # انتظار الفترة التالية
                 interval = self.trading_config.get('monitoring_interval', 300)
@@ -346,6 +362,89 @@ class AutoTradingSystem:
                 print(f"❌ خطأ في حلقة التداول التلقائي: {e}")
                 await asyncio.sleep(60)  # انتظار دقيقة في حالة الخطأ
     
+    async def scan_symbols(self, snapshot=None):
+        """فحص الرموز المراقبة بالتوازي وإرسال الإشارات الجديدة ضمن الحد اليومي"""
+        symbols = market_sessions.filter_active(
+            self.trading_config.get('symbols_to_monitor', []), label="التداول التلقائي: "
+        )
+        max_daily_trades = self.trading_config.get('max_daily_trades', 5)
+        
+        if snapshot is not None:
+            # مع المجدول يُفحص كل رمز حسب فاصله المتكيف مع تذبذبه،
+            # والرمز المستحق يُجدول حتى لو لم يُحلل (حد يومي أو صفقة نشطة)
+            symbols = adaptive_poller.due('auto_scan', symbols)
+            for symbol in symbols:
+                adaptive_poller.schedule('auto_scan', symbol)
+        
+        # فحص إذا وصلنا للحد الأقصى من الصفقات اليومية
+        daily_trades = self._count_daily_trades()
+        if daily_trades >= max_daily_trades:
+            print(f"⚠️ تم الوصول للحد الأقصى من الصفقات اليومية: {daily_trades}")
+            return
+        
+        # الرموز التي لديها صفقة نشطة لا تُفحص
+        candidates = [symbol for symbol in symbols if not self._has_active_trade_for_symbol(symbol)]
+        
+        # تحليل كل الرموز بالتوازي عبر طبقة التفريغ، والحلقة تبقى متجاوبة
+        results = await asyncio.gather(
+            *(self.generate_trading_signal(symbol, snapshot) for symbol in candidates),
+            return_exceptions=True
+        )
+        
+        if snapshot is not None:
+            timeframe_config = get_timeframe_config(self.analysis_timeframe)
+            for symbol in candidates:
+                adaptive_poller.observe('auto_scan', symbol, snapshot.cached_bars(
+                    symbol, timeframe_config['period'], timeframe_config['interval']
+                ), timeframe_config['interval'])
+        
+        for symbol, signal in zip(candidates, results):
+            try:
+                if isinstance(signal, Exception):
+                    raise signal
+                if not signal:
+                    continue
+                
+                daily_trades = self._count_daily_trades()
+                if daily_trades >= max_daily_trades:
+                    print(f"⚠️ تم الوصول للحد الأقصى من الصفقات اليومية: {daily_trades}")
+                    break
+                
+                await self.send_trading_signal(signal)
+                await asyncio.sleep(5)  # انتظار بين الإشارات
+            
+            except Exception as symbol_error:
+                print(f"❌ خطأ في معالجة الرمز {symbol}: {symbol_error}")
+    
+    def snapshot_requirements(self):
+        """البيانات المطلوبة من لقطة السوق المشتركة: شموع التحليل للرموز المراقبة"""
+        timeframe_config = get_timeframe_config(self.analysis_timeframe)
+        symbols = market_sessions.filter_active(self.trading_config.get('symbols_to_monitor', []), verbose=False)
+        return [(adaptive_poller.due('auto_scan', symbols), timeframe_config['period'], timeframe_config['interval'])]
+    
+    async def run_cycle(self, snapshot):
+        """دورة واحدة على لقطة السوق المشتركة: مراقبة الصفقات ثم فحص الرموز"""
+        # أسعار الصفقات التي حان تحديثها والرموز المراقبة المستحقة للفحص بطلب واحد
+        trade_symbols = adaptive_poller.due('auto_trades', self.trade_monitor.get_symbols())
+        scan_symbols = market_sessions.filter_active(self.trading_config.get('symbols_to_monitor', []), verbose=False)
+        # الرموز غير المحملة في اللقطة تُحمّل هنا، فيُشغّل خارج حلقة الأحداث
+        quotes = await offloader.run_io(
+            snapshot.quotes, trade_symbols + adaptive_poller.due('auto_scan', scan_symbols)
+        )
+        if trade_symbols:
+            await self.monitor_active_trades(quotes=quotes)
+            adaptive_poller.observe_quotes('auto_trades', trade_symbols, snapshot, quotes,
+                                           self.trade_monitor.levels_by_symbol())
+        await self.scan_symbols(snapshot)
+    
+    def next_poll_seconds(self, default: float) -> float:
+        """الانتظار حتى أقرب صفقة أو رمز حان تحديثه"""
+        scan_symbols = market_sessions.filter_active(self.trading_config.get('symbols_to_monitor', []), verbose=False)
+        return min(
+            adaptive_poller.seconds_until_due('auto_trades', self.trade_monitor.get_symbols(), default),
+            adaptive_poller.seconds_until_due('auto_scan', scan_symbols, default)
+        )
+    
     def _count_daily_trades(self):
         """عد الصفقات اليومية"""
         today = datetime.now().date()
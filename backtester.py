@@ -0,0 +1,367 @@
+"""
+محرك الاختبار التاريخي: إعادة تشغيل الشموع المحلية عبر نفس منطق التوصيات والإجماع
+يحسب الإشارات لكامل التاريخ دفعة واحدة ثم يحاكي الدخول والأهداف ووقف الخسارة المتحرك
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from technical_analysis_simple import TechnicalAnalysisSimple
+
+HISTORY_DIR = "historical_data"
+
+# أسباب الخروج حسب رموز kernels.simulate_position
+EXIT_REASONS = {
+    kernels.REASON_OPEN: None,
+    kernels.REASON_STOP_LOSS: 'stop_loss',
+    kernels.REASON_TAKE_PROFIT: 'take_profit'
+}
+
+
+def history_path(symbol: str, interval: str, data_dir: str = HISTORY_DIR) -> str:
+    """مسار ملف الشموع المحلي للرمز"""
+    safe_symbol = symbol.replace('/', '_').replace('^', '_').replace('=', '_')
+    return os.path.join(data_dir, f"{safe_symbol}_{interval}.csv")
+
+
+def load_history(symbol: str, interval: str = "1h", data_dir: str = HISTORY_DIR) -> Optional[pd.DataFrame]:
+    """تحميل الشموع التاريخية من ملف CSV محلي (بدون اتصال بالشبكة)"""
+    path = history_path(symbol, interval, data_dir)
+    try:
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+    except FileNotFoundError:
+        print(f"❌ لا توجد بيانات تاريخية محلية للرمز {symbol}: {path}")
+        return None
+
+    data = data.sort_index()
+    data = data[~data.index.duplicated(keep='last')]
+    return data.dropna(subset=['Open', 'High', 'Low', 'Close'])
+
+
+def save_history(symbol: str, data: pd.DataFrame, interval: str = "1h", data_dir: str = HISTORY_DIR):
+    """حفظ الشموع في ملف CSV محلي لاستخدامها في الاختبار التاريخي"""
+    os.makedirs(data_dir, exist_ok=True)
+    data.to_csv(history_path(symbol, interval, data_dir))
+
+
+def simulate_positions(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                       day: np.ndarray, direction: np.ndarray, entry: np.ndarray, stop: np.ndarray,
+                       targets: np.ndarray, weights: Sequence[float], trailing: bool = True,
+                       max_daily: int = 0) -> List[Dict]:
+    """محاكاة الصفقات لرمز واحد: صفقة واحدة مفتوحة على الأكثر كما في النظام الحي
+
+    الدخول عند إغلاق شمعة الإشارة، والفحص يبدأ من الشمعة التالية. داخل الشمعة الواحدة
+    يُفحص وقف الخسارة قبل الأهداف، وإذا افتتحت الشمعة خلف الوقف يكون الخروج بسعر الافتتاح.
+    الهدف الأول يحرك الوقف للتعادل والثاني لمنتصف المسافة (مثل update_trailing_stop).
+    """
+    n = len(close)
+    weights = np.asarray(weights, dtype=np.float64)
+    candidates = np.flatnonzero(direction != 0)
+    daily_counts = {}
+    trades = []
+    earliest = 0
+
+    while True:
+        position = np.searchsorted(candidates, earliest)
+        if position >= len(candidates):
+            break
+
+        i0 = int(candidates[position])
+        if max_daily and daily_counts.get(day[i0], 0) >= max_daily:
+            # الحد اليومي مكتمل: الانتقال مباشرة لأول شمعة في اليوم التالي
+            earliest = int(np.searchsorted(day, day[i0], side='right'))
+            continue
+        daily_counts[day[i0]] = daily_counts.get(day[i0], 0) + 1
+
+        side = int(direction[i0])
+        entry_price = float(entry[i0])
+        stop_price = float(stop[i0])
+        initial_stop = stop_price
+        levels = targets[i0][~np.isnan(targets[i0])]
+        if len(levels) == 0 or np.isnan(entry_price) or np.isnan(stop_price):
+            earliest = i0 + 1
+            continue
+
+        # تتبع الصفقة حتى الخروج (نواة مترجمة عند توفر numba)
+        realized, remaining, hit, code, exit_index = kernels.simulate_position(
+            open_, high, low, side, entry_price, stop_price, levels, weights, i0 + 1, trailing
+        )
+        reason = EXIT_REASONS[code]
+
+        if reason is None:
+            # نهاية البيانات: إغلاق المتبقي بآخر سعر
+            realized += remaining * float(close[n - 1])
+            reason = 'end_of_data'
+            exit_index = n - 1
+
+        trades.append({
+            'entry_index': i0,
+            'exit_index': exit_index,
+            'direction': side,
+            'entry_price': entry_price,
+            'exit_price': realized,
+            'initial_stop': initial_stop,
+            'targets_hit': hit,
+            'reason': reason
+        })
+
+        # يسمح بصفقة جديدة من شمعة الخروج نفسها (الإشارة تُحسب عند الإغلاق)
+        earliest = max(exit_index, i0 + 1)
+
+    return trades
+
+
+def drawdown(equity: np.ndarray) -> float:
+    """أكبر تراجع من القمة في منحنى رأس المال"""
+    if len(equity) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(equity)
+    return float(np.max(peaks - equity))
+
+
+def summarize_trades(trades: pd.DataFrame, risk_per_trade: float, n_targets: int) -> Dict:
+    """ملخص الأداء: الربح بالنقاط ونسب تحقق الأهداف والتراجع"""
+    if trades.empty:
+        return {
+            'trades': 0, 'wins': 0, 'losses': 0, 'hit_rate': 0.0,
+            'total_pips': 0.0, 'avg_pips': 0.0, 'max_drawdown_pips': 0.0,
+            'return_pct': 0.0, 'max_drawdown_pct': 0.0,
+            'target_hit_rates': [0.0] * n_targets, 'profit_factor': 0.0
+        }
+
+    pips = trades['pips'].values
+    r_multiple = trades['r_multiple'].values
+
+    # منحنى النقاط التراكمي ومنحنى رأس المال بنسبة مخاطرة ثابتة لكل صفقة
+    cumulative_pips = np.concatenate([[0.0], np.cumsum(pips)])
+    equity = np.concatenate([[1.0], np.cumprod(1 + (risk_per_trade / 100) * r_multiple)])
+    equity_drawdown = (np.maximum.accumulate(equity) - equity) / np.maximum.accumulate(equity)
+
+    gross_profit = pips[pips > 0].sum()
+    gross_loss = -pips[pips < 0].sum()
+
+    return {
+        'trades': int(len(pips)),
+        'wins': int((pips > 0).sum()),
+        'losses': int((pips <= 0).sum()),
+        'hit_rate': round(float((pips > 0).mean() * 100), 1),
+        'total_pips': round(float(pips.sum()), 1),
+        'avg_pips': round(float(pips.mean()), 1),
+        'max_drawdown_pips': round(drawdown(cumulative_pips), 1),
+        'return_pct': round(float((equity[-1] - 1) * 100), 2),
+        'max_drawdown_pct': round(float(equity_drawdown.max() * 100), 2),
+        'target_hit_rates': [
+            round(float((trades['targets_hit'].values > k).mean() * 100), 1) for k in range(n_targets)
+        ],
+        'profit_factor': round(float(gross_profit / gross_loss), 2) if gross_loss > 0 else float('inf')
+    }
+
+
+class Backtester:
+    """اختبار تاريخي لنظام التداول التلقائي (auto) أو المتقدم (advanced) على بيانات محلية"""
+
+    def __init__(self, mode: str = "auto", config: Optional[Dict] = None, interval: Optional[str] = None,
+                 data_dir: str = HISTORY_DIR, lookback: int = 120):
+        if mode not in ("auto", "advanced"):
+            raise ValueError(f"نمط غير مدعوم: {mode}")
+
+        self.mode = mode
+        self.data_dir = data_dir
+        # طول نافذة التحليل الحي (1h لمدة 5 أيام ≈ 120 شمعة)
+        self.lookback = lookback
+
+        if mode == "auto":
+            from auto_trading_system import auto_trading
+            self.system = auto_trading
+            self.interval = interval or "1h"
+        else:
+            from advanced_trading_system import advanced_trading
+            self.system = advanced_trading
+            self.interval = interval or self.system.base_interval
+
+        self.config = dict(self.system.trading_config)
+        self.config.update(config or {})
+
+    def precompute(self, symbol: str, data: pd.DataFrame) -> Dict:
+        """حساب إشارات كامل التاريخ مرة واحدة (لا تعتمد على إعدادات الصفقات)"""
+        data = data.dropna(subset=['Close'])
+
+        if self.mode == "auto":
+            signals = TechnicalAnalysisSimple(data).recommendation_series(lookback=self.lookback)
+            extra = {}
+        else:
+            signals = self.system.consensus_series(data)
+            extra = {'avg_strength': signals['avg_strength'].values}
+
+        return {
+            'symbol': symbol,
+            'index': data.index,
+            'day': data.index.normalize().asi8,
+            'open': data['Open'].values.astype(np.float64),
+            'high': data['High'].values.astype(np.float64),
+            'low': data['Low'].values.astype(np.float64),
+            'close': data['Close'].values.astype(np.float64),
+            'direction': signals['direction'].values,
+            'confidence': signals['confidence'].values,
+            **extra
+        }
+
+    def trade_levels(self, arrays: Dict, config: Dict):
+        """مستويات الدخول والوقف والأهداف لكل شمعة بنفس معادلات النظام الحي"""
+        symbol = arrays['symbol']
+        price = arrays['close']
+        buy = arrays['direction'] > 0
+
+        if self.mode == "auto":
+            # نفس حساب generate_trading_signal: مسافات ثابتة بالنقاط
+            stop_distance = config['stop_loss_pips'] / 10000
+            target_distance = config['take_profit_pips'] / 10000
+            side = np.where(buy, 1.0, -1.0)
+            entry = price
+            stop = price - side * stop_distance
+            targets = (price + side * target_distance)[:, None]
+            return entry, stop, targets, [1.0], False, 0.0001
+
+        # نفس _calculate_advanced_levels مع مصفوفات بدلاً من قيمة واحدة
+        strength = {'consensus': {'strength': arrays['avg_strength']}}
+        levels = {}
+        for signal_type in ('شراء', 'بيع'):
+            entry_zones, targets, stop_loss = self.system._calculate_advanced_levels(
+                symbol, price, signal_type, strength
+            )
+            levels[signal_type] = (entry_zones[0], stop_loss, np.column_stack(targets))
+
+        entry = np.where(buy, levels['شراء'][0], levels['بيع'][0])
+        stop = np.where(buy, levels['شراء'][1], levels['بيع'][1])
+        targets = np.where(buy[:, None], levels['شراء'][2], levels['بيع'][2])
+        weights = [0.3, 0.4, 0.3] if config.get('partial_close', True) else [0.0, 0.0, 1.0]
+        pip_value = self.system.calculate_pip_value(symbol, float(price[-1]))
+        return entry, stop, targets, weights, config.get('trailing_stop', True), pip_value
+
+    def simulate(self, arrays: Dict, config: Optional[Dict] = None) -> pd.DataFrame:
+        """محاكاة صفقات رمز واحد بإعدادات معينة على الإشارات المحسوبة مسبقاً"""
+        config = {**self.config, **(config or {})}
+
+        direction = np.where(arrays['confidence'] >= config['min_confidence'], arrays['direction'], 0)
+        entry, stop, targets, weights, trailing, pip_value = self.trade_levels(arrays, config)
+
+        trades = simulate_positions(
+            arrays['open'], arrays['high'], arrays['low'], arrays['close'], arrays['day'],
+            direction, entry, stop, targets, weights,
+            trailing=trailing, max_daily=config.get('max_daily_trades', 0)
+        )
+
+        columns = ['symbol', 'type', 'entry_time', 'exit_time', 'entry_price', 'exit_price',
+                   'stop_loss', 'confidence', 'targets_hit', 'reason', 'pips', 'r_multiple']
+        if not trades:
+            return pd.DataFrame(columns=columns)
+
+        trades = pd.DataFrame(trades)
+        side = trades['direction'].values
+        risk = np.abs(trades['entry_price'].values - trades['initial_stop'].values)
+        move = side * (trades['exit_price'].values - trades['entry_price'].values)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r_multiple = np.where(risk > 0, move / risk, 0.0)
+
+        index = arrays['index']
+        return pd.DataFrame({
+            'symbol': arrays['symbol'],
+            'type': np.where(side > 0, 'شراء', 'بيع'),
+            'entry_time': index[trades['entry_index'].values],
+            'exit_time': index[trades['exit_index'].values],
+            'entry_price': trades['entry_price'].values,
+            'exit_price': trades['exit_price'].values,
+            'stop_loss': trades['initial_stop'].values,
+            'confidence': arrays['confidence'][trades['entry_index'].values],
+            'targets_hit': trades['targets_hit'].values,
+            'reason': trades['reason'].values,
+            'pips': np.round(move / pip_value, 1),
+            'r_multiple': r_multiple
+        }, columns=columns)
+
+    def run(self, symbols: List[str], histories: Optional[Dict[str, pd.DataFrame]] = None,
+            config: Optional[Dict] = None) -> Dict:
+        """تشغيل الاختبار التاريخي لعدة رموز وإرجاع تقرير لكل رمز وللمحفظة"""
+        config = {**self.config, **(config or {})}
+        n_targets = 1 if self.mode == "auto" else 3
+
+        per_symbol = {}
+        all_trades = []
+
+        for symbol in symbols:
+            data = histories.get(symbol) if histories else load_history(symbol, self.interval, self.data_dir)
+            if data is None or len(data) < 60:
+                print(f"⚠️ بيانات غير كافية للاختبار التاريخي للرمز {symbol}")
+                continue
+
+            try:
+                arrays = self.precompute(symbol, data)
+                trades = self.simulate(arrays, config)
+            except Exception as e:
+                print(f"❌ خطأ في الاختبار التاريخي للرمز {symbol}: {e}")
+                continue
+
+            per_symbol[symbol] = summarize_trades(trades, config['risk_per_trade'], n_targets)
+            per_symbol[symbol]['bars'] = len(arrays['close'])
+            all_trades.append(trades)
+            print(f"✅ {symbol}: {per_symbol[symbol]['trades']} صفقة، {per_symbol[symbol]['total_pips']:+.1f} نقطة")
+
+        trades = pd.concat(all_trades, ignore_index=True) if all_trades else pd.DataFrame()
+        if not trades.empty:
+            trades = trades.sort_values('exit_time', kind='mergesort').reset_index(drop=True)
+
+        return {
+            'mode': self.mode,
+            'interval': self.interval,
+            'config': config,
+            'symbols': per_symbol,
+            'portfolio': summarize_trades(trades, config['risk_per_trade'], n_targets),
+            'trades': trades
+        }
+
+    def format_report(self, report: Dict) -> str:
+        """تنسيق تقرير الاختبار التاريخي"""
+        portfolio = report['portfolio']
+
+        message = f"""
+📊 **تقرير الاختبار التاريخي**
+
+⚙️ **النظام:** {'المتقدم' if report['mode'] == 'advanced' else 'التلقائي'} - {report['interval']}
+🎯 **الحد الأدنى للثقة:** {report['config']['min_confidence']}%
+
+💼 **المحفظة:**
+• عدد الصفقات: {portfolio['trades']}
+• نسبة النجاح: {portfolio['hit_rate']}%
+• صافي النقاط: {portfolio['total_pips']:+.1f}
+• العائد: {portfolio['return_pct']:+.2f}%
+• أقصى تراجع: {portfolio['max_drawdown_pct']}%
+
+📈 **حسب الرمز:**"""
+
+        for symbol, stats in report['symbols'].items():
+            targets = " / ".join(f"{rate}%" for rate in stats['target_hit_rates'])
+            message += (
+                f"\n• {symbol}: {stats['trades']} صفقة | نجاح {stats['hit_rate']}% | "
+                f"{stats['total_pips']:+.1f} نقطة | تراجع {stats['max_drawdown_pips']} نقطة | أهداف {targets}"
+            )
+
+        return message
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="الاختبار التاريخي على بيانات محلية")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--mode", default="auto", choices=["auto", "advanced"])
+    parser.add_argument("--interval", default=None)
+    parser.add_argument("--data-dir", default=HISTORY_DIR)
+    args = parser.parse_args()
+
+    backtester = Backtester(mode=args.mode, interval=args.interval, data_dir=args.data_dir)
+    print(backtester.format_report(backtester.run(args.symbols)))
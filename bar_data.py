@@ -0,0 +1,117 @@
+"""
+حاوية الشموع المشتركة: مصفوفات متجاورة للقراءة فقط تتشاركها كل المحللات بدون نسخ،
+مع سلاسل مشتقة تُحسب عند أول طلب مرة واحدة
+"""
+
+from functools import cached_property
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _readonly(values, dtype) -> np.ndarray:
+    """مصفوفة متجاورة للقراءة فقط (بدون نسخ إذا كانت بالنوع والترتيب الصحيح)"""
+    # عرض جديد حتى يقتصر منع الكتابة عليه ولا يمس مصفوفة DataFrame الأصلية
+    array = np.ascontiguousarray(values, dtype=dtype).view()
+    array.flags.writeable = False
+    return array
+
+
+class BarData:
+    """شموع OHLCV بمصفوفات float64 (أو float32 اختيارياً) مع الطوابع الزمنية"""
+
+    def __init__(self, open_, high, low, close, volume=None, index=None, dtype=np.float64,
+                 frame: Optional[pd.DataFrame] = None):
+        self.dtype = np.dtype(dtype)
+        self.open = _readonly(open_, self.dtype)
+        self.high = _readonly(high, self.dtype)
+        self.low = _readonly(low, self.dtype)
+        self.close = _readonly(close, self.dtype)
+        self.volume = _readonly(volume, self.dtype) if volume is not None else None
+        self.index = index if index is not None else pd.RangeIndex(len(self.close))
+        self._frame = frame
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, dtype=np.float64) -> 'BarData':
+        """بناء الحاوية من DataFrame بأعمدة Open/High/Low/Close/Volume"""
+        volume = data['Volume'].to_numpy() if 'Volume' in data.columns else None
+        return cls(
+            data['Open'].to_numpy(), data['High'].to_numpy(), data['Low'].to_numpy(),
+            data['Close'].to_numpy(), volume, index=data.index, dtype=dtype, frame=data
+        )
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def has_volume(self) -> bool:
+        return self.volume is not None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """DataFrame الأصلي (أو مبني من المصفوفات عند الحاجة) للمحللات التي تستخدم pandas"""
+        if self._frame is None:
+            columns = {'Open': self.open, 'High': self.high, 'Low': self.low, 'Close': self.close}
+            if self.volume is not None:
+                columns['Volume'] = self.volume
+            self._frame = pd.DataFrame(columns, index=self.index)
+        return self._frame
+
+    # السلاسل المشتقة: تُحسب مرة واحدة لكل حاوية
+
+    @cached_property
+    def volume_or_ones(self) -> np.ndarray:
+        """الحجم، أو أحجام ثابتة إذا لم يكن متوفراً"""
+        if self.volume is not None:
+            return self.volume
+        return _readonly(np.ones(len(self)), self.dtype)
+
+    @cached_property
+    def typical_price(self) -> np.ndarray:
+        return _readonly((self.high + self.low + self.close) / 3, self.dtype)
+
+    @cached_property
+    def prev_close(self) -> np.ndarray:
+        """إغلاق الشمعة السابقة (الأولى تستخدم إغلاقها)"""
+        prev = np.empty_like(self.close)
+        prev[1:] = self.close[:-1]
+        prev[:1] = self.close[:1]
+        return _readonly(prev, self.dtype)
+
+    @cached_property
+    def true_range(self) -> np.ndarray:
+        """المدى الحقيقي؛ للشمعة الأولى يساوي مداها"""
+        return _readonly(np.maximum.reduce([
+            self.high - self.low,
+            np.abs(self.high - self.prev_close),
+            np.abs(self.low - self.prev_close)
+        ]), self.dtype)
+
+    @cached_property
+    def body(self) -> np.ndarray:
+        """جسم الشمعة بإشارة الاتجاه (الإغلاق - الافتتاح)"""
+        return _readonly(self.close - self.open, self.dtype)
+
+    @cached_property
+    def body_size(self) -> np.ndarray:
+        return _readonly(np.abs(self.body), self.dtype)
+
+    @cached_property
+    def upper_shadow(self) -> np.ndarray:
+        return _readonly(self.high - np.maximum(self.open, self.close), self.dtype)
+
+    @cached_property
+    def lower_shadow(self) -> np.ndarray:
+        return _readonly(np.minimum(self.open, self.close) - self.low, self.dtype)
+
+    @cached_property
+    def total_range(self) -> np.ndarray:
+        return _readonly(self.high - self.low, self.dtype)
+
+
+def as_bars(data, dtype=np.float64) -> BarData:
+    """قبول حاوية شموع أو DataFrame في المحللات"""
+    if isinstance(data, BarData):
+        return data
+    return BarData.from_frame(data, dtype=dtype)
@@ -0,0 +1,190 @@
+"""
+قياس سرعة حسابات التحليل المتجهة مقارنة بالحلقات القديمة لكل شمعة، مع التحقق من تطابق النتائج
+
+الاستخدام: python benchmarks.py [عدد الشموع ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from technical_analysis import TechnicalAnalysis
+from technical_analysis_simple import TechnicalAnalysisSimple
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def make_bars(size: int, seed: int = 7) -> pd.DataFrame:
+    """شموع عشوائية للقياس"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, size))
+    open_ = close + rng.normal(0, 0.2, size)
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + rng.random(size),
+        'Low': np.minimum(open_, close) - rng.random(size),
+        'Close': close,
+        'Volume': rng.integers(100, 10_000, size).astype(np.float64)
+    })
+
+
+# الحلقات القديمة كمرجع للتطابق
+
+def legacy_obv(close, volume):
+    obv = [0]
+    for i in range(1, len(close)):
+        if close[i] > close[i-1]:
+            obv.append(obv[-1] + volume[i])
+        elif close[i] < close[i-1]:
+            obv.append(obv[-1] - volume[i])
+        else:
+            obv.append(obv[-1])
+    return np.array(obv)
+
+
+def legacy_money_flow(high, low, close, volume):
+    typical_price = (high + low + close) / 3
+    money_flow = typical_price * volume
+    positive_flow = []
+    negative_flow = []
+    for i in range(1, len(typical_price)):
+        if typical_price[i] > typical_price[i-1]:
+            positive_flow.append(money_flow[i])
+            negative_flow.append(0)
+        else:
+            positive_flow.append(0)
+            negative_flow.append(money_flow[i])
+    return np.array(positive_flow, dtype=np.float64), np.array(negative_flow, dtype=np.float64)
+
+
+def legacy_true_range(high, low, close):
+    tr_values = []
+    for i in range(1, len(close)):
+        tr_values.append(max(high[i] - low[i], abs(high[i] - close[i-1]), abs(low[i] - close[i-1])))
+    return np.array(tr_values)
+
+
+def legacy_peaks(high):
+    recent_highs = []
+    for i in range(10, len(high) - 10):
+        if high[i] > max(high[i-10:i]) and high[i] > max(high[i+1:i+11]):
+            recent_highs.append((i, high[i]))
+    return recent_highs
+
+
+def legacy_supply_demand(high, low):
+    resistance_levels = []
+    support_levels = []
+    for i in range(10, len(high) - 10):
+        if high[i] > max(high[i-10:i]) and high[i] > max(high[i+1:i+10]):
+            resistance_levels.append(high[i])
+        if low[i] < min(low[i-10:i]) and low[i] < min(low[i+1:i+10]):
+            support_levels.append(low[i])
+    return np.array(resistance_levels), np.array(support_levels)
+
+
+def timed(function, *args):
+    """تشغيل الدالة وإرجاع نتيجتها وزمنها بالثواني"""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def same(a, b) -> bool:
+    if isinstance(a, list) and a and isinstance(a[0], tuple):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, tuple):
+        return all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, list):
+        return a == b
+    a, b = np.asarray(a), np.asarray(b)
+    # القيم NaN في بداية السلاسل المنعمة متطابقة أيضاً
+    return np.array_equal(a, b, equal_nan=a.dtype.kind == 'f' and b.dtype.kind == 'f')
+
+
+def run(size: int):
+    data = make_bars(size)
+    h, l, c, v = (data[column].to_numpy() for column in ('High', 'Low', 'Close', 'Volume'))
+
+    cases = [
+        ('OBV', lambda: legacy_obv(c, v), lambda: TechnicalAnalysisSimple(data).calculate_obv()),
+        ('تدفق المال MFI', lambda: legacy_money_flow(h, l, c, v), lambda: TechnicalAnalysisSimple(data).money_flows()),
+        ('المدى الحقيقي', lambda: legacy_true_range(h, l, c), lambda: TechnicalAnalysisSimple(data).bars.true_range[1:]),
+        ('قمم النماذج', lambda: legacy_peaks(h), lambda: TechnicalAnalysisSimple(data).local_peaks()),
+        ('العرض والطلب', lambda: legacy_supply_demand(h, l), lambda: TechnicalAnalysis(data).swing_levels()),
+    ]
+
+    print(f"\n📊 {size:,} شمعة")
+    for name, legacy, vectorized in cases:
+        expected, legacy_seconds = timed(legacy)
+        actual, vectorized_seconds = timed(vectorized)
+        status = "✅ مطابق" if same(expected, actual) else "❌ غير مطابق"
+        speedup = legacy_seconds / vectorized_seconds if vectorized_seconds > 0 else float('inf')
+        print(f"  {name:<16} حلقة: {legacy_seconds:8.3f}ث  متجه: {vectorized_seconds:8.4f}ث  تسريع: {speedup:7.1f}x  {status}")
+
+    # مسار التحليل الكامل كما يستخدمه البوت
+    _, seconds = timed(lambda: TechnicalAnalysis(data).supply_demand_zones())
+    print(f"  supply_demand_zones كاملة: {seconds:.4f}ث")
+
+
+def simulate_all(simulate_position, data, every=50):
+    """محاكاة صفقة شراء كل every شمعة حتى خروجها"""
+    o, h, l, c = (data[column].to_numpy() for column in ('Open', 'High', 'Low', 'Close'))
+    weights = np.array([0.3, 0.4, 0.3])
+    results = []
+    for i in range(0, len(c) - 1, every):
+        levels = c[i] + np.array([1.0, 2.0, 3.0])
+        results.append(simulate_position(o, h, l, 1, c[i], c[i] - 1.5, levels, weights, i + 1, True))
+    return results
+
+
+def run_kernels(size: int):
+    """نوى الحلقات التسلسلية: Python مقابل numba"""
+    data = make_bars(size)
+    h, l = data['High'].to_numpy(), data['Low'].to_numpy()
+    tr = TechnicalAnalysisSimple(data).bars.true_range
+
+    python = kernels.get_kernels('python')
+    if kernels.NUMBA_AVAILABLE:
+        compiled = kernels.get_kernels('numba')
+        label = "numba"
+        # الاستدعاء الأول يترجم الدوال فلا يدخل في القياس
+        small = make_bars(100)
+        compiled['parabolic_sar'](small['High'].to_numpy(), small['Low'].to_numpy(), 0.02, 0.2)
+        compiled['wilder_smoothing'](small['Close'].to_numpy(), 14)
+        simulate_all(compiled['simulate_position'], small)
+    else:
+        # بدون numba: نفس المصدر الذي تترجمه numba (مسح شمعة بشمعة) للتحقق من التطابق فقط
+        compiled = {
+            'parabolic_sar': kernels._parabolic_sar,
+            'wilder_smoothing': kernels._wilder_smoothing,
+            'simulate_position': kernels._make_simulate_position(kernels._scan_crossing),
+        }
+        label = "مصدر numba"
+
+    cases = [
+        ('البارابوليك SAR', lambda k: k['parabolic_sar'](h, l, 0.02, 0.2)),
+        ('تنعيم Wilder', lambda k: k['wilder_smoothing'](tr, 14)),
+        ('الوقف المتحرك', lambda k: simulate_all(k['simulate_position'], data)),
+    ]
+
+    print(f"\n⚙️ النوى التسلسلية - {size:,} شمعة (الواجهة الحالية: {kernels.BACKEND})")
+    if not kernels.NUMBA_AVAILABLE:
+        print("  ⚠️ numba غير مثبتة: المقارنة مع نسخة Python من المصدر المترجم")
+    for name, case in cases:
+        expected, python_seconds = timed(case, python)
+        actual, compiled_seconds = timed(case, compiled)
+        status = "✅ مطابق" if same(expected, actual) else "❌ غير مطابق"
+        speedup = python_seconds / compiled_seconds if compiled_seconds > 0 else float('inf')
+        print(f"  {name:<16} Python: {python_seconds:8.3f}ث  {label}: {compiled_seconds:8.4f}ث  تسريع: {speedup:7.1f}x  {status}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
+    for size in sizes:
+        run_kernels(size)
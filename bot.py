@@ -1,12 +1,13 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler
-from utils import load_permissions, is_authorized, is_admin, add_user_request, approve_user, reject_user, get_pending_requests, get_all_users, remove_user_approval, search_user_by_id
+from utils import permission_store, load_permissions, is_authorized, is_admin, add_user_request, approve_user, reject_user, get_pending_requests, get_all_users, remove_user_approval, search_user_by_id
 from recommendation_system import RecommendationSystem
 from symbol_mapper import TIMEFRAMES
+from symbol_search import resolve_symbol
 from price_alerts import PriceAlerts
 from daily_reports import DailyReports
+from market_overview import market_overview_service
 from datetime import datetime
-import json
 import os
 import asyncio
 
@@ -135,10 +136,8 @@ async def enable_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         await update.message.reply_text("🚫 هذا الأمر مخصص للمشرفين فقط.")
         return
-    config = load_permissions()
-    config["groups"][chat_id] = { "enabled": True }
-    with open("permissions.json", "w") as f:
-        json.dump(config, f)
+    with permission_store.edit() as config:
+        config.setdefault("groups", {})[chat_id] = { "enabled": True }
     await update.message.reply_text("✅ تم تفعيل استقبال إشعارات TradingView لهذه المجموعة.")
 
 async def disable_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -147,11 +146,11 @@ async def disable_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         await update.message.reply_text("🚫 هذا الأمر مخصص للمشرفين فقط.")
         return
-    config = load_permissions()
-    if chat_id in config["groups"]:
-        config["groups"][chat_id]["enabled"] = False
-        with open("permissions.json", "w") as f:
-            json.dump(config, f)
+    with permission_store.edit() as config:
+        registered = chat_id in config.get("groups", {})
+        if registered:
+            config["groups"][chat_id]["enabled"] = False
+    if registered:
         await update.message.reply_text("⛔️ تم إيقاف استقبال التنبيهات في هذه المجموعة.")
     else:
         await update.message.reply_text("⚠️ هذه المجموعة غير مسجلة بعد.")
@@ -173,22 +172,39 @@ async def analyze_symbol(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    symbol = context.args[0].upper()
     timeframe = context.args[1] if len(context.args) > 1 else "1h"
     
-    await update.message.reply_text("🔄 جاري التحليل... يرجى الانتظار")
+    # تصحيح الأخطاء الإملائية الواضحة قبل أي طلب بيانات (البادئة = تفرض الرمز كما كُتب)
+    match = resolve_symbol(context.args[0])
+    symbol = match['symbol']
+    if match['corrected']:
+        await update.message.reply_text(
+            f"✏️ تم تصحيح الرمز إلى {symbol} - جاري التحليل... يرجى الانتظار\n"
+            f"(لتحليل الرمز كما كُتب: /analyze ={context.args[0].upper()} {timeframe})"
+        )
+    else:
+        await update.message.reply_text("🔄 جاري التحليل... يرجى الانتظار")
+    
+    # اقتراحات الرموز القريبة تُضاف فقط إذا لم تتوفر بيانات للرمز كما كُتب
+    did_you_mean = ""
+    if match['suggestions']:
+        did_you_mean = "\n\n❓ هل تقصد:\n" + "\n".join(
+            f"• /analyze {suggestion} {timeframe}" for suggestion in match['suggestions']
+        )
     
     try:
-        recommendation = recommendation_system.analyze_symbol(symbol, timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, symbol, timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
             await update.message.reply_text(message, parse_mode='Markdown')
         else:
-            await update.message.reply_text("❌ لم يتم العثور على بيانات كافية لهذا الرمز")
+            await update.message.reply_text("❌ لم يتم العثور على بيانات كافية لهذا الرمز" + did_you_mean)
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
-        await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
+        await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}" + did_you_mean)
 
 async def analyze_forex(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """تحليل زوج عملات"""
@@ -212,7 +228,7 @@ async def analyze_forex(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔄 جاري تحليل زوج العملات... يرجى الانتظار")
     
     try:
-        recommendation = recommendation_system.analyze_symbol(symbol, timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, symbol, timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
@@ -220,6 +236,8 @@ async def analyze_forex(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ لم يتم العثور على بيانات كافية لهذا الزوج")
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
 
@@ -245,7 +263,7 @@ async def analyze_crypto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔄 جاري تحليل العملة الرقمية... يرجى الانتظار")
     
     try:
-        recommendation = recommendation_system.analyze_symbol(symbol, timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, symbol, timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
@@ -253,6 +271,8 @@ async def analyze_crypto(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ لم يتم العثور على بيانات كافية لهذه العملة")
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
 
@@ -278,7 +298,7 @@ async def analyze_stock(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔄 جاري تحليل السهم... يرجى الانتظار")
     
     try:
-        recommendation = recommendation_system.analyze_symbol(symbol, timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, symbol, timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
@@ -286,6 +306,8 @@ async def analyze_stock(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ لم يتم العثور على بيانات كافية لهذا السهم")
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
 
@@ -296,39 +318,9 @@ async def market_overview(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 ليس لديك صلاحية استخدام هذا الأمر.")
         return
     
-    await update.message.reply_text("🔄 جاري تحليل السوق العام... يرجى الانتظار")
-    
+    # اللقطة محسوبة مسبقاً في الخلفية فتُعرض فوراً
     try:
-        overview = recommendation_system.get_market_overview()
-        
-        message = f"""
-📊 **نظرة عامة على الأسواق** 📊
-
-**إحصائيات عامة:**
-🟢 إشارات شراء: {overview['bullish']}
-🔴 إشارات بيع: {overview['bearish']}
-🟡 إشارات محايدة: {overview['neutral']}
-
-**توصيات سريعة:**
-"""
-        
-        for rec in overview['recommendations'][:3]:  # أول 3 توصيات
-            symbol = rec.get('symbol', 'غير محدد')
-            rec_type = rec.get('type', 'محايد')
-            confidence = rec.get('confidence', 0)
-            
-            if rec_type == "شراء":
-                icon = "🟢"
-            elif rec_type == "بيع":
-                icon = "🔴"
-            else:
-                icon = "🟡"
-            
-            message += f"\n{icon} {symbol}: {rec_type} ({confidence:.0f}%)"
-        
-        message += "\n\n━━━━━━━━━━━━━━━━━━━━━━━\n🤖 *تحديث كل 30 دقيقة*"
-        
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text(market_overview_service.format_message(), parse_mode='Markdown')
     
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء جمع البيانات: {str(e)}")
@@ -345,7 +337,7 @@ async def analyze_gold(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🥇 جاري تحليل الذهب... يرجى الانتظار")
     
     try:
-        recommendation = recommendation_system.analyze_symbol("GOLD", timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, "GOLD", timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
@@ -353,6 +345,8 @@ async def analyze_gold(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ لم يتم العثور على بيانات كافية للذهب")
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
 
@@ -367,7 +361,7 @@ async def analyze_us30(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🇺🇸 جاري تحليل مؤشر داو جونز... يرجى الانتظار")
     
     try:
-        recommendation = recommendation_system.analyze_symbol("US30", timeframe=timeframe)
+        recommendation = await run_analysis(recommendation_system, "US30", timeframe=timeframe)
         
         if recommendation:
             message = recommendation_system.format_recommendation_message(recommendation)
@@ -375,6 +369,8 @@ async def analyze_us30(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ لم يتم العثور على بيانات كافية للمؤشر")
     
+    except asyncio.TimeoutError:
+        await update.message.reply_text(ANALYSIS_TIMEOUT_MESSAGE)
     except Exception as e:
         await update.message.reply_text(f"❌ حدث خطأ أثناء التحليل: {str(e)}")
 
@@ -449,7 +445,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 from bot_new_commands import (
     price_alert_command, my_alerts_command, daily_report_command,
     weekly_report_command, correlation_command, performance_command,
-    quick_menu_command, handle_quick_menu_callback, patterns_command
+    quick_menu_command, handle_quick_menu_callback, patterns_command,
+    run_analysis, ANALYSIS_TIMEOUT_MESSAGE
 )
 from market_news import MarketNews
 
@@ -631,8 +628,7 @@ async def list_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message += f"{i}. **معرف المستخدم:** `{user_id}`\n"
         
         # إضافة زر إلغاء الموافقة (ما عدا المشرفين)
-        permissions = load_permissions()
-        if user_id not in permissions.get('admins', []):
+        if not is_admin(user_id):
             message += f"   • `/remove_user {user_id}` - إلغاء الموافقة\n"
         else:
             message += f"   • 🔑 **مشرف**\n"
@@ -667,8 +663,7 @@ async def remove_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     # منع حذف المشرفين
-    permissions = load_permissions()
-    if target_user_id in permissions.get('admins', []):
+    if is_admin(target_user_id):
         await update.message.reply_text("❌ لا يمكن حذف المشرفين.")
         return
     
@@ -708,8 +703,7 @@ async def search_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     if search_user_by_id(search_id):
-        permissions = load_permissions()
-        is_admin_user = search_id in permissions.get('admins', [])
+        is_admin_user = is_admin(search_id)
         
         status = "🔑 مشرف" if is_admin_user else "✅ معتمد"
         message = f"🔍 **نتيجة البحث:**\n\n"
@@ -786,6 +780,25 @@ if __name__ == "__main__":
     alert_thread = threading.Thread(target=run_alert_monitoring, daemon=True)
     alert_thread.start()
     
+    # تشغيل مجدول التداول الموحد (التلقائي والمتقدم على لقطة سوق مشتركة)
+    def run_trading_scheduler():
+        from trading_scheduler import trading_scheduler
+        asyncio.run(trading_scheduler.run_forever())
+    
+    trading_thread = threading.Thread(target=run_trading_scheduler, daemon=True)
+    trading_thread.start()
+    
+    # تحديث النظرة العامة على السوق في الخلفية
+    def run_market_overview():
+        asyncio.run(market_overview_service.run_forever())
+    
+    overview_thread = threading.Thread(target=run_market_overview, daemon=True)
+    overview_thread.start()
+    
+    # تحميل مصفوفة الارتباط في الخلفية حتى يجيب /correlation من الذاكرة
+    from correlation_engine import correlation_cache
+    correlation_cache.ensure_fresh(block_if_empty=False)
+    
     print("🤖 البوت يعمل الآن مع جميع الميزات المتقدمة...")
     print("🔔 نظام التنبيهات نشط...")
     print("📊 النماذج الفنية المتقدمة جاهزة...")
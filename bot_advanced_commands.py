@@ -46,6 +46,15 @@ async def advanced_trading_command(update: Update, context: ContextTypes.DEFAULT
             
             win_rate = (winning_trades / closed_trades * 100) if closed_trades > 0 else 0
             
+            # إحصائيات آخر دورة فحص
+            scan_stats = advanced_trading.get_scan_stats()
+            if scan_stats:
+                scan_info = (f"🔎 تغطية آخر دورة: {scan_stats['scanned']}/{scan_stats['universe_size']} "
+                             f"({scan_stats['coverage']}%) | مؤجل: {scan_stats['deferred']}\n"
+                             f"⏱️ زمن الفحص: {scan_stats['duration']} ث | p95 للرمز: {scan_stats['latency_p95']} ث")
+            else:
+                scan_info = "🔎 لم تكتمل أي دورة فحص بعد"
+            
             status_emoji = "🟢" if config.get('auto_trading_enabled', False) else "🔴"
             
             message = f"""
@@ -55,7 +64,7 @@ async def advanced_trading_command(update: Update, context: ContextTypes.DEFAULT
 
 ⚙️ **إعدادات النظام:**
 🎯 أقل نسبة ثقة: {config.get('min_confidence', 85)}%
-📊 عدد الرموز المراقبة: {len(advanced_trading.supported_symbols.get('forex_majors', [])) + len(advanced_trading.supported_symbols.get('commodities', [])) + len(advanced_trading.supported_symbols.get('crypto', []))}
+📊 عدد الرموز المراقبة: {len(advanced_trading.get_all_symbols())}
 ⏰ الأطر الزمنية: {', '.join(config.get('timeframes_to_analyze', []))}
 🎯 عدد الأهداف: {config.get('targets', 3)}
 🚪 مناطق الدخول: {config.get('entry_zones', 2)}
@@ -67,6 +76,8 @@ async def advanced_trading_command(update: Update, context: ContextTypes.DEFAULT
 🏆 معدل النجاح: {win_rate:.1f}%
 💰 إجمالي النقاط: {total_pips:+.1f}
 
+{scan_info}
+
 🔄 **مراقبة متقدمة:**
 • تحليل متعدد الأطر الزمنية
 • ثلاثة أهداف لكل صفقة
@@ -7,7 +7,26 @@ from telegram.ext import ContextTypes
 from utils import is_authorized, is_admin
 from price_alerts import PriceAlerts
 from daily_reports import DailyReports
+from config import ANALYSIS_TIMEOUT_SECONDS
+from task_offload import offloader
 import asyncio
+import time
+from functools import partial
+
+# رد انتهاء مهلة التحليل
+ANALYSIS_TIMEOUT_MESSAGE = f"⏱️ انتهت مهلة التحليل ({ANALYSIS_TIMEOUT_SECONDS} ثانية)، يرجى المحاولة بعد قليل."
+
+async def run_analysis(recommendation_system, symbol, **kwargs):
+    """تحليل رمز في مجموعة خيوط التفريغ بموعد نهائي يبدأ عند استلام الطلب
+    
+    الموعد يشمل الانتظار على خانة وخيط في المجموعة المشتركة مع حلقات التداول،
+    فالتحليل يتخطى المراحل التي لا يتسع لها الوقت ويصل الرد في موعده حتى تحت الضغط
+    """
+    deadline = time.monotonic() + ANALYSIS_TIMEOUT_SECONDS
+    job = partial(recommendation_system.analyze_symbol, symbol, deadline=deadline, **kwargs)
+    # ثانية إضافية لتجميع التوصية الجزئية من المراحل المكتملة بعد الموعد
+    budget = ANALYSIS_TIMEOUT_SECONDS + 1
+    return await asyncio.wait_for(offloader.run_io(job, timeout=budget), timeout=budget)
 
 # تنبيهات الأسعار
 async def price_alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -156,7 +175,7 @@ async def correlation_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     try:
         daily_reports = DailyReports()
-        correlation_report = daily_reports.analyze_pair_correlation()
+        correlation_report = await offloader.run_io(daily_reports.analyze_pair_correlation)
         await update.message.reply_text(correlation_report, parse_mode='Markdown')
     
     except Exception as e:
@@ -253,7 +272,8 @@ async def handle_quick_menu_callback(update: Update, context: ContextTypes.DEFAU
         try:
             from recommendation_system import RecommendationSystem
             recommendation_system = RecommendationSystem()
-            recommendation = recommendation_system.analyze_symbol(symbol)
+            # القائمة السريعة تكتفي بالحكم: مراحل الملف السريع فقط
+            recommendation = await run_analysis(recommendation_system, symbol, profile="fast")
             
             if recommendation:
                 message = recommendation_system.format_recommendation_message(recommendation)
@@ -261,43 +281,15 @@ async def handle_quick_menu_callback(update: Update, context: ContextTypes.DEFAU
             else:
                 await query.edit_message_text(f"❌ لم يتم العثور على بيانات كافية لـ {symbol}")
         
+        except asyncio.TimeoutError:
+            await query.edit_message_text(ANALYSIS_TIMEOUT_MESSAGE)
         except Exception as e:
             await query.edit_message_text(f"❌ خطأ في التحليل: {str(e)}")
     
     elif callback_data == "market_overview":
-        await query.edit_message_text("📊 جاري تحليل السوق العام...")
-        
         try:
-            from recommendation_system import RecommendationSystem
-            recommendation_system = RecommendationSystem()
-            overview = recommendation_system.get_market_overview()
-            
-            message = f"""
-📊 **نظرة عامة على الأسواق** 📊
-
-**إحصائيات عامة:**
-🟢 إشارات شراء: {overview['bullish']}
-🔴 إشارات بيع: {overview['bearish']}
-🟡 إشارات محايدة: {overview['neutral']}
-
-**توصيات سريعة:**
-"""
-            
-            for rec in overview['recommendations'][:3]:
-                symbol = rec.get('symbol', 'غير محدد')
-                rec_type = rec.get('type', 'محايد')
-                confidence = rec.get('confidence', 0)
-                
-                if rec_type == "شراء":
-                    icon = "🟢"
-                elif rec_type == "بيع":
-                    icon = "🔴"
-                else:
-                    icon = "🟡"
-                
-                message += f"\n{icon} {symbol}: {rec_type} ({confidence:.0f}%)"
-            
-            await query.edit_message_text(message, parse_mode='Markdown')
+            from market_overview import market_overview_service
+            await query.edit_message_text(market_overview_service.format_message(), parse_mode='Markdown')
         
         except Exception as e:
             await query.edit_message_text(f"❌ خطأ في جمع البيانات: {str(e)}")
@@ -341,7 +333,7 @@ async def handle_quick_menu_callback(update: Update, context: ContextTypes.DEFAU
         
         try:
             daily_reports = DailyReports()
-            correlation_report = daily_reports.analyze_pair_correlation()
+            correlation_report = await offloader.run_io(daily_reports.analyze_pair_correlation)
             # إرسال جزء من التقرير فقط بسبب حدود الرسائل
             short_report = correlation_report[:1000] + "...\n\nللتقرير الكامل استخدم: /correlation"
             await query.edit_message_text(short_report, parse_mode='Markdown')
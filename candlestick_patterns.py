@@ -5,19 +5,24 @@
 import pandas as pd
 import numpy as np
 
+from bar_data import as_bars
+
 class CandlestickPatterns:
     def __init__(self, data):
-        self.data = data
-        self.open = data['Open'].values
-        self.high = data['High'].values
-        self.low = data['Low'].values
-        self.close = data['Close'].values
+        # data: حاوية BarData مشتركة أو DataFrame
+        bars = as_bars(data)
+        self.bars = bars
+        self.data = bars.frame
+        self.open = bars.open
+        self.high = bars.high
+        self.low = bars.low
+        self.close = bars.close
         
-        # حساب خصائص الشموع
-        self.body_size = np.abs(self.close - self.open)
-        self.upper_shadow = self.high - np.maximum(self.open, self.close)
-        self.lower_shadow = np.minimum(self.open, self.close) - self.low
-        self.total_range = self.high - self.low
+        # خصائص الشموع من الحاوية (تُحسب مرة واحدة لكل الشموع)
+        self.body_size = bars.body_size
+        self.upper_shadow = bars.upper_shadow
+        self.lower_shadow = bars.lower_shadow
+        self.total_range = bars.total_range
         
         # تحديد لون الشمعة
         self.is_bullish = self.close > self.open
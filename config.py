@@ -7,3 +7,9 @@ POLYGON_API_KEY = "0PC5NqAdENPmvcpqjzbhfPeYpN7xZJ1g"
 APP_VERSION = "2.0"
 DEFAULT_TIMEFRAMES = ["1m", "5m", "15m", "30m", "1H", "4H", "1D"]
 ADMIN_USER_IDS = [1142810150]  # Updated: the bot owner's ID
+
+# المهلة القصوى لتحليل الأوامر التفاعلية (ثانية)؛ بعدها تُرجع توصية جزئية
+ANALYSIS_TIMEOUT_SECONDS = 15
+
+# واجهة نوى الحسابات التسلسلية: "auto" (numba إن كانت مثبتة) أو "numba" أو "python"
+KERNEL_BACKEND = "auto"
@@ -0,0 +1,407 @@
+"""
+محرك الارتباط والتعرض للمحفظة: ارتباط وتباين متدحرج يُحدّث تزايدياً مع كل شمعة
+واستعلام فوري عن التعرض المرتبط قبل فتح إشارة جديدة،
+ومصفوفة عوائد مخزنة لتحليل الارتباط والتجميع على قائمة رموز كبيرة
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_collector import DataCollector, RESAMPLE_RULES
+from symbol_mapper import SYMBOL_MAPPING, get_correct_symbol
+
+
+class RollingCorrelationEngine:
+    """نافذة متدحرجة من العوائد مع مجاميع تراكمية للتباين المشترك"""
+
+    def __init__(self, window: int = 120, min_periods: int = 30, bar_interval: str = '15m',
+                 correlation_threshold: float = 0.5):
+        self.window = window
+        self.min_periods = min_periods
+        self.bar_interval = bar_interval
+        # الارتباطات الأضعف من هذا الحد لا تُحسب في التعرض
+        self.correlation_threshold = correlation_threshold
+
+        self.symbols = []
+        self.index = {}
+        self.returns = np.zeros((window, 0))  # حلقة دائرية من العوائد
+        self.sums = np.zeros(0)
+        self.products = np.zeros((0, 0))
+        self.count = 0
+        self.position = 0  # موضع الكتابة التالي في الحلقة
+        self.updates_since_rebuild = 0
+
+        self.last_prices = np.zeros(0)
+        self.last_bar_time = None
+        self.correlation = np.zeros((0, 0))
+
+        # التعرض المفتوح لكل رمز (+ شراء، - بيع) وحاصل ضربه في مصفوفة الارتباط
+        self.positions = {}
+        self.exposure = np.zeros(0)
+        self.correlated_exposure = np.zeros(0)
+
+    def _ensure_symbols(self, symbols: Iterable[str]):
+        """إضافة رموز جديدة للمصفوفات بعوائد صفرية في التاريخ السابق"""
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.index]
+        if not new_symbols:
+            return
+
+        extra = len(new_symbols)
+        for symbol in new_symbols:
+            self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        self.returns = np.hstack([self.returns, np.zeros((self.window, extra))])
+        self.sums = np.concatenate([self.sums, np.zeros(extra)])
+        self.products = np.pad(self.products, ((0, extra), (0, extra)))
+        self.last_prices = np.concatenate([self.last_prices, np.full(extra, np.nan)])
+        self.exposure = np.concatenate([self.exposure, np.zeros(extra)])
+        self._refresh_correlation()
+
+    def update_bar(self, prices: np.ndarray):
+        """إضافة شمعة جديدة لكل الرموز (بترتيب self.symbols) بتكلفة O(n²) لا تعتمد على طول النافذة"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new = np.log(prices / self.last_prices)
+        new = np.where(np.isfinite(new), new, 0.0)
+        self.last_prices = np.where(np.isfinite(prices), prices, self.last_prices)
+
+        # إزالة أقدم عائد من المجاميع عند امتلاء النافذة
+        if self.count == self.window:
+            old = self.returns[self.position]
+            self.sums -= old
+            self.products -= np.outer(old, old)
+        else:
+            self.count += 1
+
+        self.returns[self.position] = new
+        self.sums += new
+        self.products += np.outer(new, new)
+        self.position = (self.position + 1) % self.window
+
+        # إعادة بناء دورية من الحلقة لتفادي تراكم أخطاء الطرح
+        self.updates_since_rebuild += 1
+        if self.updates_since_rebuild >= self.window:
+            rows = self.returns if self.count == self.window else self.returns[:self.count]
+            self.sums = rows.sum(axis=0)
+            self.products = rows.T @ rows
+            self.updates_since_rebuild = 0
+
+    def update_from_frames(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """تحديث المحرك من شموع الرموز (أي فاصل أدق) بالشموع المكتملة الجديدة فقط"""
+        closes = {}
+        rule = RESAMPLE_RULES.get(self.bar_interval, self.bar_interval)
+        for symbol, data in frames.items():
+            if data is None or data.empty:
+                continue
+            closes[symbol] = data['Close'].resample(rule).last()
+
+        if not closes:
+            return 0
+
+        self._ensure_symbols(closes)
+        matrix = pd.DataFrame(closes).reindex(columns=self.symbols).sort_index().ffill()
+
+        # آخر شمعة قد تكون جارية فلا تدخل حتى تكتمل
+        matrix = matrix.iloc[:-1]
+        if self.last_bar_time is not None:
+            matrix = matrix[matrix.index > self.last_bar_time]
+
+        if matrix.empty:
+            return 0
+
+        values = matrix.values.astype(np.float64)
+        for row in values:
+            self.update_bar(row)
+
+        self.last_bar_time = matrix.index[-1]
+        self._refresh_correlation()
+        return len(values)
+
+    def _refresh_correlation(self):
+        """حساب مصفوفة الارتباط من المجاميع ثم تحديث التعرض المرتبط"""
+        n = len(self.symbols)
+        if self.count < max(2, self.min_periods):
+            self.correlation = np.eye(n)
+        else:
+            k = self.count
+            covariance = (self.products - np.outer(self.sums, self.sums) / k) / (k - 1)
+            std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correlation = covariance / np.outer(std, std)
+            correlation = np.where(np.isfinite(correlation), correlation, 0.0)
+            np.fill_diagonal(correlation, 1.0)
+            self.correlation = np.clip(correlation, -1.0, 1.0)
+
+        self.correlated_exposure = self._masked_correlation() @ self.exposure
+
+    def _masked_correlation(self) -> np.ndarray:
+        """مصفوفة الارتباط بعد حذف الارتباطات الضعيفة"""
+        return np.where(np.abs(self.correlation) >= self.correlation_threshold, self.correlation, 0.0)
+
+    def covariance(self) -> np.ndarray:
+        """مصفوفة التباين المشترك الحالية"""
+        k = self.count
+        if k < 2:
+            return np.zeros((len(self.symbols), len(self.symbols)))
+        return (self.products - np.outer(self.sums, self.sums) / k) / (k - 1)
+
+    def correlation_of(self, symbol_a: str, symbol_b: str) -> Optional[float]:
+        """الارتباط بين رمزين (O(1))"""
+        if symbol_a not in self.index or symbol_b not in self.index:
+            return None
+        return float(self.correlation[self.index[symbol_a], self.index[symbol_b]])
+
+    def add_position(self, position_id: str, symbol: str, direction: int, weight: float = 1.0):
+        """تسجيل صفقة مفتوحة في التعرض (O(n))"""
+        if position_id in self.positions:
+            self.remove_position(position_id)
+
+        self._ensure_symbols([symbol])
+        column = self.index[symbol]
+        signed = direction * weight
+
+        self.positions[position_id] = (symbol, signed)
+        self.exposure[column] += signed
+        masked = self.correlation[:, column] * (np.abs(self.correlation[:, column]) >= self.correlation_threshold)
+        self.correlated_exposure += masked * signed
+
+    def remove_position(self, position_id: str):
+        """حذف صفقة مغلقة من التعرض (O(n))"""
+        entry = self.positions.pop(position_id, None)
+        if entry is None:
+            return
+
+        symbol, signed = entry
+        column = self.index[symbol]
+        self.exposure[column] -= signed
+        masked = self.correlation[:, column] * (np.abs(self.correlation[:, column]) >= self.correlation_threshold)
+        self.correlated_exposure -= masked * signed
+
+    def exposure_if_opened(self, symbol: str, direction: int) -> float:
+        """التعرض المرتبط في نفس الاتجاه إذا فُتحت صفقة على الرمز (O(1))"""
+        column = self.index.get(symbol)
+        if column is None:
+            return 0.0
+        return float(direction * self.correlated_exposure[column])
+
+    def correlated_positions(self, symbol: str, direction: int) -> List[Dict]:
+        """الصفقات المفتوحة التي تسبب التعرض المرتبط للرمز"""
+        column = self.index.get(symbol)
+        if column is None:
+            return []
+
+        result = []
+        for position_id, (other, signed) in self.positions.items():
+            correlation = self.correlation[column, self.index[other]]
+            if abs(correlation) >= self.correlation_threshold and direction * signed * correlation > 0:
+                result.append({'id': position_id, 'symbol': other, 'correlation': round(float(correlation), 2)})
+        return result
+
+
+# فترات التحليل بعدد الشموع اليومية
+LOOKBACK_BARS = {'1mo': 21, '3mo': 63, '6mo': 126, '1y': 252}
+
+
+class ReturnMatrixCache:
+    """أسعار إغلاق قائمة رموز كبيرة بتحميل مجمع، تمتد بالشموع الجديدة فقط، مع ارتباط محسوب مرة لكل تحديث"""
+
+    def __init__(self, symbols: Optional[List[str]] = None, interval: str = '1d',
+                 history_period: str = '1y', update_period: str = '5d', max_bars: int = 260,
+                 refresh_seconds: float = 3600, batch_size: int = 50,
+                 cache_file: Optional[str] = 'correlation_prices.csv'):
+        # القائمة الافتراضية: كل الرموز المعروفة في خريطة الرموز
+        symbols = symbols or list(SYMBOL_MAPPING.values())
+        self.tickers = list(dict.fromkeys(get_correct_symbol(symbol) for symbol in symbols))
+        self.interval = interval
+        self.history_period = history_period
+        self.update_period = update_period
+        self.max_bars = max_bars
+        self.refresh_seconds = refresh_seconds
+        self.batch_size = batch_size
+        self.cache_file = cache_file
+
+        self.data_collector = None
+        self.prices = pd.DataFrame()
+        self.version = 0
+        self.last_refresh = 0.0
+        self._loaded = False
+        self._refreshing = False
+        self._lock = threading.RLock()
+        self._correlations = {}  # عدد الشموع -> (الإصدار، الرموز، المصفوفة)
+
+    def _load_cache_file(self):
+        """تحميل الأسعار المحفوظة من التشغيل السابق"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                self.prices = pd.read_csv(self.cache_file, index_col=0, parse_dates=True)
+                self.version += 1
+            except Exception as e:
+                print(f"خطأ في تحميل ملف أسعار الارتباط: {e}")
+
+    def _normalize(self, series: pd.Series) -> pd.Series:
+        """توحيد فهرس الوقت بين الأسواق المختلفة"""
+        index = series.index
+        if self.interval.endswith(('d', 'wk', 'mo')):
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            index = index.normalize()
+        elif index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        series = series.copy()
+        series.index = index
+        return series[~series.index.duplicated(keep='last')]
+
+    def refresh(self) -> int:
+        """تحميل مجمع: تاريخ كامل للرموز الجديدة وآخر الشموع فقط للرموز المخزنة"""
+        with self._lock:
+            self._load_cache_file()
+            if self.data_collector is None:
+                self.data_collector = DataCollector()
+
+            known = [ticker for ticker in self.tickers if ticker in self.prices.columns]
+            missing = [ticker for ticker in self.tickers if ticker not in self.prices.columns]
+
+        # التحميل خارج القفل حتى تبقى الاستعلامات من الذاكرة تجيب فوراً أثناء التحديث
+        closes = {}
+        for period, group in ((self.history_period, missing), (self.update_period, known)):
+            for start in range(0, len(group), self.batch_size):
+                chunk = group[start:start + self.batch_size]
+                history = self.data_collector.get_batch_history(chunk, period=period, interval=self.interval)
+                for ticker, frame in history.items():
+                    closes[ticker] = self._normalize(frame['Close'])
+        fresh = pd.DataFrame(closes)
+
+        with self._lock:
+            self.last_refresh = time.time()
+            if not closes:
+                return 0
+
+            # القيم الجديدة تستبدل الشمعة الأخيرة غير المكتملة من التحديث السابق
+            prices = fresh.combine_first(self.prices) if not self.prices.empty else fresh
+            self.prices = prices.sort_index().iloc[-(self.max_bars + 1):]
+            self.version += 1
+
+            if self.cache_file:
+                try:
+                    self.prices.to_csv(self.cache_file)
+                except Exception as e:
+                    print(f"خطأ في حفظ ملف أسعار الارتباط: {e}")
+
+            return len(closes)
+
+    def is_stale(self) -> bool:
+        return time.time() - self.last_refresh > self.refresh_seconds
+
+    def ensure_fresh(self, block_if_empty: bool = True):
+        """تحديث في الخلفية عند قدم البيانات؛ يحظر فقط إذا لم تكن هناك بيانات أصلاً"""
+        with self._lock:
+            self._load_cache_file()
+            empty = self.prices.empty
+
+        if empty and block_if_empty:
+            self.refresh()
+            return
+
+        # الفحص والتعيين تحت القفل حتى لا يبدأ مستدعيان تحديثين متزامنين
+        with self._lock:
+            if self._refreshing or not (empty or self.is_stale()):
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"خطأ في تحديث مصفوفة الارتباط: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def returns(self, lookback: Optional[int] = None) -> pd.DataFrame:
+        """العوائد اللوغاريتمية لآخر الشموع، بعد حذف الأيام التي لا يتداول فيها أغلب الرموز"""
+        prices = self.prices
+        if lookback is not None:
+            prices = prices.iloc[-(lookback + 1):]
+
+        observed = prices.notna()
+        returns = np.log(prices.ffill()).diff().iloc[1:]
+        # أيام العطل لبعض الأسواق تُحذف حتى لا تضعف الارتباط بعوائد صفرية
+        returns = returns[observed.iloc[1:].mean(axis=1) >= 0.5]
+        return returns
+
+    def correlation(self, lookback: int = 63, min_periods: int = 10) -> Tuple[List[str], np.ndarray]:
+        """مصفوفة الارتباط لكل الرموز، محسوبة بـ NumPy مرة واحدة لكل تحديث للأسعار"""
+        with self._lock:
+            cached = self._correlations.get(lookback)
+            if cached and cached[0] == self.version:
+                return cached[1], cached[2]
+
+            returns = self.returns(lookback)
+            returns = returns.loc[:, returns.notna().sum() >= min_periods]
+            symbols = list(returns.columns)
+            if len(symbols) < 2:
+                return symbols, np.eye(len(symbols))
+
+            values = returns.values
+            values = np.where(np.isnan(values), np.nanmean(values, axis=0), values)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                matrix = np.corrcoef(values, rowvar=False)
+            matrix = np.where(np.isfinite(matrix), matrix, 0.0)
+            np.fill_diagonal(matrix, 1.0)
+
+            self._correlations[lookback] = (self.version, symbols, matrix)
+            return symbols, matrix
+
+    def sub_matrix(self, symbols: List[str], lookback: int = 63) -> pd.DataFrame:
+        """ارتباط مجموعة رموز مختارة من المصفوفة المخزنة"""
+        all_symbols, matrix = self.correlation(lookback)
+        position = {ticker: i for i, ticker in enumerate(all_symbols)}
+        names = [symbol for symbol in symbols if get_correct_symbol(symbol) in position]
+        rows = [position[get_correct_symbol(symbol)] for symbol in names]
+        return pd.DataFrame(matrix[np.ix_(rows, rows)], index=names, columns=names)
+
+    def strongest_pairs(self, threshold: float = 0.7, lookback: int = 63, limit: int = 15) -> List[Tuple[str, str, float]]:
+        """أقوى الارتباطات (طردية أو عكسية) مرتبة تنازلياً"""
+        symbols, matrix = self.correlation(lookback)
+        upper = np.triu(np.abs(matrix) >= threshold, k=1)
+        rows, cols = np.nonzero(upper)
+        order = np.argsort(-np.abs(matrix[rows, cols]))[:limit]
+        return [(symbols[rows[i]], symbols[cols[i]], float(matrix[rows[i], cols[i]])) for i in order]
+
+    def clusters(self, threshold: float = 0.7, lookback: int = 63, min_size: int = 2) -> List[List[str]]:
+        """مجموعات الرموز المترابطة: مكونات متصلة لرسم الارتباطات الأقوى من الحد"""
+        symbols, matrix = self.correlation(lookback)
+        parent = list(range(len(symbols)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        rows, cols = np.nonzero(np.triu(np.abs(matrix) >= threshold, k=1))
+        for i, j in zip(rows, cols):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[root_j] = root_i
+
+        groups = {}
+        for i, symbol in enumerate(symbols):
+            groups.setdefault(find(i), []).append(symbol)
+
+        result = [group for group in groups.values() if len(group) >= min_size]
+        return sorted(result, key=len, reverse=True)
+
+
+# مصفوفة الارتباط المشتركة لأوامر البوت والتقارير
+correlation_cache = ReturnMatrixCache()
@@ -4,39 +4,56 @@
 
 import json
 import os
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from correlation_engine import LOOKBACK_BARS, correlation_cache
 from data_collector import DataCollector
+from trade_store import TradeStore
 
 class DailyReports:
     def __init__(self):
         self.trades_file = "trading_history.json"
         self.reports_file = "daily_reports.json"
         self.data_collector = DataCollector()
-        self.trading_history = self.load_trading_history()
+        self.store = TradeStore("trading_history.db")
+        self.migrate_trading_history()
     
-    def load_trading_history(self):
-        """تحميل تاريخ الصفقات"""
+    def migrate_trading_history(self):
+        """نقل الصفقات من ملف JSON القديم إلى قاعدة البيانات مرة واحدة"""
+        if self.store.count() > 0 or not os.path.exists(self.trades_file):
+            return
+        
         try:
             with open(self.trades_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {
-                "trades": [],
-                "daily_stats": {}
-            }
+                trades = json.load(f).get("trades", [])
+        except Exception as e:
+            print(f"خطأ في قراءة تاريخ الصفقات القديم: {e}")
+            return
+        
+        if not trades:
+            return
+        
+        rollups = self.empty_rollups()
+        for trade in trades:
+            self.add_to_rollups(rollups, trade)
+        
+        with self.store.transaction():
+            self.store.append_many(trades)
+            for kind, buckets in rollups.items():
+                for key, bucket in buckets.items():
+                    self.store.put_rollup(kind, key, bucket)
+        
+        print(f"✅ تم نقل {len(trades)} صفقة من {self.trades_file} إلى قاعدة البيانات")
     
-    def save_trading_history(self):
-        """حفظ تاريخ الصفقات"""
-        with open(self.trades_file, 'w', encoding='utf-8') as f:
-            json.dump(self.trading_history, f, ensure_ascii=False, indent=2)
+    @staticmethod
+    def empty_rollups():
+        """تجميعات الأداء حسب اليوم والأسبوع والشهر والرمز والفريم"""
+        return {"day": {}, "week": {}, "month": {}, "symbol": {}, "timeframe": {}}
     
     def add_trade_result(self, symbol, recommendation_type, entry_price, exit_price, 
                         pips_gained, success, timeframe, analysis_time):
         """إضافة نتيجة صفقة"""
         trade = {
-            "id": len(self.trading_history["trades"]) + 1,
             "symbol": symbol,
             "type": recommendation_type,
             "entry_price": entry_price,
@@ -49,99 +66,147 @@ class DailyReports:
             "trade_time": datetime.now().strftime('%H:%M:%S')
         }
         
-        self.trading_history["trades"].append(trade)
-        self.update_daily_stats(trade)
-        self.save_trading_history()
+        # الصفقة وتجميعاتها في معاملة واحدة
+        with self.store.transaction():
+            trade["id"] = self.store.append(trade)
+            self.update_rollups(trade)
+        
+        return trade["id"]
+    
+    @staticmethod
+    def period_keys(trade_date):
+        """مفاتيح اليوم والأسبوع (ISO) والشهر لتاريخ الصفقة"""
+        date = datetime.strptime(trade_date, '%Y-%m-%d')
+        year, week, _ = date.isocalendar()
+        return {
+            "day": trade_date,
+            "week": f"{year}-W{week:02d}",
+            "month": trade_date[:7]
+        }
     
-    def update_daily_stats(self, trade):
-        """تحديث الإحصائيات اليومية"""
-        today = trade["trade_date"]
-        
-        if today not in self.trading_history["daily_stats"]:
-            self.trading_history["daily_stats"][today] = {
-                "total_trades": 0,
-                "successful_trades": 0,
-                "failed_trades": 0,
-                "total_pips": 0,
-                "success_rate": 0,
-                "symbols_traded": set(),
-                "timeframes_used": set(),
-                "best_trade": {"pips": 0, "symbol": "", "type": ""},
-                "worst_trade": {"pips": 0, "symbol": "", "type": ""}
-            }
-        
-        stats = self.trading_history["daily_stats"][today]
-        
-        # تحديث الإحصائيات
-        stats["total_trades"] += 1
-        stats["total_pips"] += trade["pips_gained"]
-        stats["symbols_traded"].add(trade["symbol"])
-        stats["timeframes_used"].add(trade["timeframe"])
+    @staticmethod
+    def empty_bucket(breakdown=True):
+        """مجمع أداء فارغ"""
+        bucket = {
+            "total_trades": 0,
+            "successful_trades": 0,
+            "failed_trades": 0,
+            "total_pips": 0,
+            "success_rate": 0,
+            "buy_trades": 0,
+            "buy_successful": 0,
+            "sell_trades": 0,
+            "sell_successful": 0,
+            "best_trade": None,
+            "worst_trade": None
+        }
+        if breakdown:
+            bucket["symbols"] = {}
+            bucket["timeframes"] = {}
+        return bucket
+    
+    @staticmethod
+    def add_to_bucket(bucket, trade):
+        """إضافة صفقة لمجمع أداء"""
+        pips = trade["pips_gained"]
         
+        bucket["total_trades"] += 1
+        bucket["total_pips"] += pips
         if trade["success"]:
-            stats["successful_trades"] += 1
+            bucket["successful_trades"] += 1
         else:
-            stats["failed_trades"] += 1
+            bucket["failed_trades"] += 1
+        bucket["success_rate"] = (bucket["successful_trades"] / bucket["total_trades"]) * 100
         
-        # حساب نسبة النجاح
-        stats["success_rate"] = (stats["successful_trades"] / stats["total_trades"]) * 100
+        if trade["type"] == "شراء":
+            bucket["buy_trades"] += 1
+            bucket["buy_successful"] += 1 if trade["success"] else 0
+        elif trade["type"] == "بيع":
+            bucket["sell_trades"] += 1
+            bucket["sell_successful"] += 1 if trade["success"] else 0
         
         # أفضل وأسوأ صفقة
-        if trade["pips_gained"] > stats["best_trade"]["pips"]:
-            stats["best_trade"] = {
-                "pips": trade["pips_gained"],
-                "symbol": trade["symbol"],
-                "type": trade["type"]
-            }
-        
-        if trade["pips_gained"] < stats["worst_trade"]["pips"]:
-            stats["worst_trade"] = {
-                "pips": trade["pips_gained"],
-                "symbol": trade["symbol"],
-                "type": trade["type"]
-            }
-        
-        # تحويل sets إلى lists للتخزين
-        stats["symbols_traded"] = list(stats["symbols_traded"])
-        stats["timeframes_used"] = list(stats["timeframes_used"])
+        summary = {"pips": pips, "symbol": trade["symbol"], "type": trade["type"]}
+        if bucket["best_trade"] is None or pips > bucket["best_trade"]["pips"]:
+            bucket["best_trade"] = summary
+        if bucket["worst_trade"] is None or pips < bucket["worst_trade"]["pips"]:
+            bucket["worst_trade"] = summary
+        
+        # تفصيل الأداء حسب الرمز والفريم الزمني
+        for field, key in (("symbols", trade["symbol"]), ("timeframes", trade["timeframe"])):
+            if field not in bucket:
+                continue
+            perf = bucket[field].setdefault(key, {"trades": 0, "successful": 0, "pips": 0})
+            perf["trades"] += 1
+            perf["pips"] += pips
+            if trade["success"]:
+                perf["successful"] += 1
+    
+    def rollup_keys(self, trade):
+        """كل مفاتيح التجميع التي تدخل فيها الصفقة"""
+        keys = list(self.period_keys(trade["trade_date"]).items())
+        keys.append(("symbol", trade["symbol"]))
+        keys.append(("timeframe", trade["timeframe"]))
+        return keys
+    
+    def add_to_rollups(self, rollups, trade):
+        """إضافة صفقة لتجميعات في الذاكرة"""
+        for kind, key in self.rollup_keys(trade):
+            if key not in rollups[kind]:
+                rollups[kind][key] = self.empty_bucket(breakdown=kind in ("day", "week", "month"))
+            self.add_to_bucket(rollups[kind][key], trade)
+    
+    def update_rollups(self, trade):
+        """تحديث التجميعات المحفوظة بصفقة جديدة (قراءة وكتابة خمس مجمعات فقط)"""
+        for kind, key in self.rollup_keys(trade):
+            bucket = self.store.get_rollup(kind, key)
+            if bucket is None:
+                bucket = self.empty_bucket(breakdown=kind in ("day", "week", "month"))
+            self.add_to_bucket(bucket, trade)
+            self.store.put_rollup(kind, key, bucket)
+    
+    def get_rollup(self, kind, key):
+        """مجمع الأداء لفترة أو رمز أو فريم (None إذا لم توجد صفقات)"""
+        return self.store.get_rollup(kind, key)
+    
+    def recent_day_rollups(self, days):
+        """مجمعات الأيام الأخيرة بالترتيب الزمني (تكلفة بعدد الأيام لا بعدد الصفقات)"""
+        today = datetime.now().date()
+        result = []
+        for offset in range(days - 1, -1, -1):
+            date = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+            bucket = self.get_rollup("day", date)
+            if bucket is not None:
+                result.append((date, bucket))
+        return result
+    
+    def merge_buckets(self, buckets):
+        """دمج عدة مجمعات أداء في مجمع واحد"""
+        buckets = list(buckets)
+        merged = self.empty_bucket(breakdown=False)
+        for bucket in buckets:
+            for field in ("total_trades", "successful_trades", "failed_trades", "total_pips",
+                          "buy_trades", "buy_successful", "sell_trades", "sell_successful"):
+                merged[field] += bucket[field]
+        
+        best_trades = [bucket["best_trade"] for bucket in buckets if bucket["best_trade"] is not None]
+        worst_trades = [bucket["worst_trade"] for bucket in buckets if bucket["worst_trade"] is not None]
+        merged["best_trade"] = max(best_trades, key=lambda trade: trade["pips"], default=None)
+        merged["worst_trade"] = min(worst_trades, key=lambda trade: trade["pips"], default=None)
+        
+        if merged["total_trades"]:
+            merged["success_rate"] = (merged["successful_trades"] / merged["total_trades"]) * 100
+        return merged
     
     def generate_daily_report(self, date=None):
         """إنشاء التقرير اليومي"""
         if date is None:
             date = datetime.now().strftime('%Y-%m-%d')
         
-        if date not in self.trading_history["daily_stats"]:
+        stats = self.get_rollup("day", date)
+        if stats is None:
             return self.generate_empty_report(date)
         
-        stats = self.trading_history["daily_stats"][date]
-        
-        # حساب إحصائيات إضافية
-        day_trades = [t for t in self.trading_history["trades"] if t["trade_date"] == date]
-        
-        # تحليل الأداء حسب الرمز
-        symbol_performance = {}
-        for trade in day_trades:
-            symbol = trade["symbol"]
-            if symbol not in symbol_performance:
-                symbol_performance[symbol] = {"trades": 0, "successful": 0, "pips": 0}
-            
-            symbol_performance[symbol]["trades"] += 1
-            symbol_performance[symbol]["pips"] += trade["pips_gained"]
-            if trade["success"]:
-                symbol_performance[symbol]["successful"] += 1
-        
-        # تحليل الأداء حسب الفريم الزمني
-        timeframe_performance = {}
-        for trade in day_trades:
-            tf = trade["timeframe"]
-            if tf not in timeframe_performance:
-                timeframe_performance[tf] = {"trades": 0, "successful": 0, "pips": 0}
-            
-            timeframe_performance[tf]["trades"] += 1
-            timeframe_performance[tf]["pips"] += trade["pips_gained"]
-            if trade["success"]:
-                timeframe_performance[tf]["successful"] += 1
-        
         # تنسيق التقرير
         report = f"""
 📊 **التقرير اليومي - {date}** 📊
@@ -156,7 +221,7 @@ class DailyReports:
 🏆 **أفضل صفقة:**
 • الرمز: `{stats['best_trade']['symbol']}`
 • النوع: {stats['best_trade']['type']}
-• النقاط: `+{stats['best_trade']['pips']:.1f}`
+• النقاط: `{stats['best_trade']['pips']:+.1f}`
 
 📉 **أسوأ صفقة:**
 • الرمز: `{stats['worst_trade']['symbol']}`
@@ -165,22 +230,31 @@ class DailyReports:
 
 💹 **الأداء حسب الرمز:**"""
         
-        for symbol, perf in symbol_performance.items():
-            success_rate = (perf["successful"] / perf["trades"]) * 100 if perf["trades"] > 0 else 0
-            report += f"""
-• **{symbol}:** {perf['trades']} صفقة | {success_rate:.1f}% | {perf['pips']:+.1f} نقطة"""
+        report += self.format_breakdown(stats["symbols"])
         
         report += f"""
 
 ⏰ **الأداء حسب الفريم الزمني:**"""
         
-        for tf, perf in timeframe_performance.items():
-            success_rate = (perf["successful"] / perf["trades"]) * 100 if perf["trades"] > 0 else 0
-            report += f"""
-• **{tf}:** {perf['trades']} صفقة | {success_rate:.1f}% | {perf['pips']:+.1f} نقطة"""
+        report += self.format_breakdown(stats["timeframes"])
         
         return report
     
+    @staticmethod
+    def format_breakdown(performance):
+        """أسطر الأداء حسب الرمز أو الفريم"""
+        lines = ""
+        for name, perf in performance.items():
+            success_rate = (perf["successful"] / perf["trades"]) * 100 if perf["trades"] > 0 else 0
+            lines += f"""
+• **{name}:** {perf['trades']} صفقة | {success_rate:.1f}% | {perf['pips']:+.1f} نقطة"""
+        return lines
+    
+    @staticmethod
+    def format_trade(trade):
+        """سطر صفقة واحدة (أفضل أو أسوأ صفقة)"""
+        return f"{trade['symbol']} | {trade['type']} | `{trade['pips']:+.1f}` نقطة"
+    
     def generate_empty_report(self, date):
         """إنشاء تقرير فارغ"""
         return f"""
@@ -194,34 +268,21 @@ class DailyReports:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=7)
         
-        week_trades = []
-        total_pips = 0
-        successful_trades = 0
-        total_trades = 0
-        
-        # جمع صفقات الأسبوع
-        for trade in self.trading_history["trades"]:
-            trade_date = datetime.strptime(trade["trade_date"], '%Y-%m-%d')
-            if start_date <= trade_date <= end_date:
-                week_trades.append(trade)
-                total_pips += trade["pips_gained"]
-                total_trades += 1
-                if trade["success"]:
-                    successful_trades += 1
+        # مجمعات الأيام السبعة الأخيرة بدل المرور على كل الصفقات
+        week_days = self.recent_day_rollups(7)
+        week = self.merge_buckets(bucket for _, bucket in week_days)
+        
+        total_trades = week["total_trades"]
+        successful_trades = week["successful_trades"]
+        total_pips = week["total_pips"]
         
         if total_trades == 0:
             return "📭 لا توجد صفقات للأسبوع الماضي."
         
-        success_rate = (successful_trades / total_trades) * 100
+        success_rate = week["success_rate"]
         
         # أفضل وأسوأ يوم
-        daily_pips = {}
-        for trade in week_trades:
-            date = trade["trade_date"]
-            if date not in daily_pips:
-                daily_pips[date] = 0
-            daily_pips[date] += trade["pips_gained"]
-        
+        daily_pips = {date: bucket["total_pips"] for date, bucket in week_days}
         best_day = max(daily_pips.items(), key=lambda x: x[1])
         worst_day = min(daily_pips.items(), key=lambda x: x[1])
         
@@ -245,32 +306,62 @@ class DailyReports:
 • التاريخ: {worst_day[0]}
 • النقاط: `{worst_day[1]:+.1f}`
         """
-        
+
         return report
-    
+
+    def generate_monthly_report(self, month=None):
+        """إنشاء تقرير شهري من مجمع الشهر"""
+        if month is None:
+            month = datetime.now().strftime('%Y-%m')
+
+        stats = self.get_rollup("month", month)
+        if stats is None:
+            return f"📭 لا توجد صفقات لشهر {month}."
+
+        report = f"""
+📊 **التقرير الشهري - {month}** 📊
+
+📈 **الإحصائيات العامة:**
+• إجمالي الصفقات: `{stats['total_trades']}`
+• الصفقات الناجحة: `{stats['successful_trades']}` ✅
+• الصفقات الخاسرة: `{stats['failed_trades']}` ❌
+• نسبة النجاح: `{stats['success_rate']:.1f}%`
+• إجمالي النقاط: `{stats['total_pips']:+.1f}` نقطة
+
+🏆 **أفضل صفقة:**
+• {stats['best_trade']['symbol']} | {stats['best_trade']['type']} | `{stats['best_trade']['pips']:+.1f}` نقطة
+
+📉 **أسوأ صفقة:**
+• {stats['worst_trade']['symbol']} | {stats['worst_trade']['type']} | `{stats['worst_trade']['pips']:+.1f}` نقطة
+
+💹 **الأداء حسب الرمز:**"""
+
+        report += self.format_breakdown(stats["symbols"])
+
+        report += f"""
+
+⏰ **الأداء حسب الفريم الزمني:**"""
+
+        report += self.format_breakdown(stats["timeframes"])
+
+        return report
+
     def analyze_pair_correlation(self, pairs=None, period="1mo"):
-        """تحليل الارتباط بين أزواج العملات"""
+        """تحليل الارتباط بين أزواج العملات من مصفوفة العوائد المخزنة"""
         if pairs is None:
             pairs = ["EURUSD", "GBPUSD", "USDJPY", "USDCHF", "AUDUSD", "USDCAD", "NZDUSD"]
         
-        correlation_data = {}
+        # التحميل دائماً في الخلفية؛ قبل أول تحميل يُطلب من المستخدم المحاولة لاحقاً
+        correlation_cache.ensure_fresh(block_if_empty=False)
+        lookback = LOOKBACK_BARS.get(period, 21)
         
-        # جمع البيانات لكل زوج
-        for pair in pairs:
-            try:
-                data = self.data_collector.get_data_by_type(pair, period=period, interval="1d")
-                if data is not None and not data.empty:
-                    correlation_data[pair] = data['Close'].pct_change().dropna()
-            except Exception as e:
-                print(f"خطأ في جمع بيانات {pair}: {e}")
+        correlation_matrix = correlation_cache.sub_matrix(pairs, lookback=lookback)
         
-        if len(correlation_data) < 2:
+        if len(correlation_matrix.columns) < 2:
+            if correlation_cache.prices.empty:
+                return "⏳ جاري تحميل بيانات الارتباط لأول مرة، يرجى المحاولة بعد دقيقة."
             return "❌ لا توجد بيانات كافية لتحليل الارتباط."
         
-        # إنشاء DataFrame للارتباط
-        df = pd.DataFrame(correlation_data)
-        correlation_matrix = df.corr()
-        
         # تنسيق التقرير
         report = """
 🔗 **تحليل الارتباط بين أزواج العملات** 🔗
@@ -309,6 +400,15 @@ class DailyReports:
         else:
             report += "📊 لا توجد ارتباطات قوية حالياً.\n"
         
+        # مجموعات مترابطة عبر كامل قائمة الرموز
+        clusters = correlation_cache.clusters(threshold=0.8, lookback=lookback)
+        if clusters:
+            report += "\n🧩 **مجموعات مترابطة (أكثر من 0.8):**\n"
+            for group in clusters[:5]:
+                names = ", ".join(self.display_symbol(symbol) for symbol in group[:8])
+                more = f" (+{len(group) - 8})" if len(group) > 8 else ""
+                report += f"• {names}{more}\n"
+        
         report += f"""
 
 📈 **تفسير الارتباط:**
@@ -322,36 +422,37 @@ class DailyReports:
         
         return report
     
+    @staticmethod
+    def display_symbol(ticker):
+        """اسم مختصر للرمز في التقارير"""
+        return ticker.replace('=X', '').replace('=F', '')
+    
     def generate_performance_summary(self, days=30):
         """إنشاء ملخص الأداء لفترة معينة"""
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
         
-        period_trades = []
-        for trade in self.trading_history["trades"]:
-            trade_date = datetime.strptime(trade["trade_date"], '%Y-%m-%d')
-            if start_date <= trade_date <= end_date:
-                period_trades.append(trade)
+        # دمج المجمعات اليومية للفترة
+        period = self.merge_buckets(bucket for _, bucket in self.recent_day_rollups(days))
         
-        if not period_trades:
+        if period["total_trades"] == 0:
             return f"📭 لا توجد صفقات في آخر {days} يوم."
         
         # حساب الإحصائيات
-        total_trades = len(period_trades)
-        successful_trades = sum(1 for t in period_trades if t["success"])
-        total_pips = sum(t["pips_gained"] for t in period_trades)
-        success_rate = (successful_trades / total_trades) * 100
+        total_trades = period["total_trades"]
+        total_pips = period["total_pips"]
+        success_rate = period["success_rate"]
         
         # أفضل وأسوأ صفقة
-        best_trade = max(period_trades, key=lambda x: x["pips_gained"])
-        worst_trade = min(period_trades, key=lambda x: x["pips_gained"])
+        best_trade = period["best_trade"]
+        worst_trade = period["worst_trade"]
         
         # الأداء حسب نوع التوصية
-        buy_trades = [t for t in period_trades if t["type"] == "شراء"]
-        sell_trades = [t for t in period_trades if t["type"] == "بيع"]
+        buy_success = period["buy_successful"] / period["buy_trades"] * 100 if period["buy_trades"] else 0
+        sell_success = period["sell_successful"] / period["sell_trades"] * 100 if period["sell_trades"] else 0
         
-        buy_success = sum(1 for t in buy_trades if t["success"]) / len(buy_trades) * 100 if buy_trades else 0
-        sell_success = sum(1 for t in sell_trades if t["success"]) / len(sell_trades) * 100 if sell_trades else 0
+        # التوقع الرياضي والتراجع من نتائج الفترة بترتيب حدوثها
+        first_day = (end_date.date() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        analytics = self.store.analytics(start_date=first_day)
         
         return f"""
 📊 **ملخص الأداء - آخر {days} يوم** 📊
@@ -361,14 +462,16 @@ class DailyReports:
 • نسبة النجاح: `{success_rate:.1f}%`
 • إجمالي النقاط: `{total_pips:+.1f}`
 • متوسط النقاط للصفقة: `{total_pips/total_trades:+.1f}`
+• متوسط الربح / الخسارة: `{analytics['avg_win']:.1f}` / `{analytics['avg_loss']:.1f}`
+• أقصى تراجع: `{analytics['max_drawdown']:.1f}` نقطة
 
 🎯 **الأداء حسب نوع التوصية:**
-• صفقات الشراء: `{len(buy_trades)}` | نجاح `{buy_success:.1f}%`
-• صفقات البيع: `{len(sell_trades)}` | نجاح `{sell_success:.1f}%`
+• صفقات الشراء: `{period['buy_trades']}` | نجاح `{buy_success:.1f}%`
+• صفقات البيع: `{period['sell_trades']}` | نجاح `{sell_success:.1f}%`
 
 🏆 **أفضل صفقة:**
-• {best_trade['symbol']} | {best_trade['type']} | `+{best_trade['pips_gained']:.1f}` نقطة
+• {self.format_trade(best_trade)}
 
 📉 **أسوأ صفقة:**
-• {worst_trade['symbol']} | {worst_trade['type']} | `{worst_trade['pips_gained']:+.1f}` نقطة
+• {self.format_trade(worst_trade)}
         """
\ No newline at end of file
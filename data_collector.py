@@ -7,6 +7,32 @@ from datetime import datetime, timedelta
 import time
 from symbol_mapper import get_correct_symbol, determine_market_type
 
+# قواعد إعادة التجميع المقابلة لفواصل yfinance
+RESAMPLE_RULES = {
+    '1m': '1min',
+    '2m': '2min',
+    '5m': '5min',
+    '15m': '15min',
+    '30m': '30min',
+    '60m': '60min',
+    '1h': '60min',
+    '90m': '90min',
+    '4h': '240min'
+}
+
+def resample_ohlcv(data, interval):
+    """اشتقاق شموع فريم أكبر من سلسلة أدق (Open/High/Low/Close/Volume)"""
+    if data is None or data.empty:
+        return data
+    
+    rule = RESAMPLE_RULES.get(interval, interval)
+    aggregation = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last'}
+    if 'Volume' in data.columns:
+        aggregation['Volume'] = 'sum'
+    
+    resampled = data.resample(rule).agg(aggregation)
+    return resampled.dropna(subset=['Close'])
+
 class DataCollector:
     def __init__(self):
         self.alpha_vantage_key = os.getenv("ALPHA_VANTAGE_API_KEY")
@@ -34,6 +60,64 @@ class DataCollector:
             print(f"خطأ في جمع البيانات للرمز {symbol}: {e}")
             return None
     
+    def get_batch_history(self, symbols, period="1d", interval="1m"):
+        """تحميل بيانات عدة رموز بطلب واحد"""
+        tickers = {symbol: get_correct_symbol(symbol) for symbol in symbols}
+        unique_tickers = list(dict.fromkeys(tickers.values()))
+        
+        if not unique_tickers:
+            return {}
+        
+        try:
+            raw = yf.download(
+                unique_tickers, period=period, interval=interval,
+                group_by='ticker', auto_adjust=False, threads=True, progress=False
+            )
+        except Exception as e:
+            print(f"خطأ في التحميل المجمع للرموز: {e}")
+            return {}
+        
+        if raw is None or raw.empty:
+            return {}
+        
+        history = {}
+        for symbol, ticker in tickers.items():
+            try:
+                if isinstance(raw.columns, pd.MultiIndex):
+                    if ticker not in raw.columns.get_level_values(0):
+                        continue
+                    frame = raw[ticker]
+                else:
+                    frame = raw
+                
+                frame = frame.dropna(subset=['Close'])
+                if not frame.empty:
+                    history[symbol] = frame
+            except Exception as e:
+                print(f"خطأ في استخراج بيانات الرمز {symbol}: {e}")
+        
+        return history
+    
+    def get_quote_snapshot(self, symbols, interval="1m"):
+        """لقطة أسعار حالية لعدة رموز بطلب واحد"""
+        history = self.get_batch_history(symbols, period="1d", interval=interval)
+        return {symbol: float(data['Close'].iloc[-1]) for symbol, data in history.items()}
+    
+    def get_current_price(self, symbol, market_type=None):
+        """الحصول على السعر الحالي فقط"""
+        try:
+            data = self.get_data_by_type(symbol, market_type, period="1d", interval="1m")
+            if data is not None and not data.empty:
+                return {
+                    'price': float(data['Close'].iloc[-1]),
+                    'time': data.index[-1],
+                    'volume': data['Volume'].iloc[-1] if 'Volume' in data.columns else 0
+                }
+            return None
+        except Exception as e:
+            print(f"خطأ في الحصول على السعر الحالي: {e}")
+            return None
+    
     def get_forex_data(self, symbol="EURUSD", period="1d", interval="1h"):
         """جمع بيانات الفوركس"""
         return self.get_data_by_type(symbol, 'forex', period, interval)
@@ -0,0 +1,234 @@
+"""
+نوى الحسابات التسلسلية (البارابوليك SAR، تنعيم Wilder، محاكاة الوقف المتحرك)
+تُترجم بـ numba عند توفرها وإلا تعمل بـ Python العادي بنفس النتائج تماماً
+
+الاختيار من KERNEL_BACKEND في config.py: "auto" (numba إن وجدت) أو "numba" أو "python"
+"""
+
+import numpy as np
+
+from config import KERNEL_BACKEND
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+def _parabolic_sar(high, low, af, max_af):
+    """البارابوليك SAR واتجاهه لكل شمعة (1 صاعد، -1 هابط)"""
+    length = len(high)
+    psar = np.zeros(length)
+    trend = np.zeros(length)
+    af_values = np.zeros(length)
+    ep = np.zeros(length)
+
+    psar[0] = low[0]
+    trend[0] = 1
+    af_values[0] = af
+    ep[0] = high[0]
+
+    for i in range(1, length):
+        if trend[i-1] == 1:  # اتجاه صاعد
+            psar[i] = psar[i-1] + af_values[i-1] * (ep[i-1] - psar[i-1])
+
+            if low[i] <= psar[i]:
+                trend[i] = -1
+                psar[i] = ep[i-1]
+                ep[i] = low[i]
+                af_values[i] = af
+            else:
+                trend[i] = 1
+                if high[i] > ep[i-1]:
+                    ep[i] = high[i]
+                    af_values[i] = min(af_values[i-1] + af, max_af)
+                else:
+                    ep[i] = ep[i-1]
+                    af_values[i] = af_values[i-1]
+
+        else:  # اتجاه هابط
+            psar[i] = psar[i-1] - af_values[i-1] * (psar[i-1] - ep[i-1])
+
+            if high[i] >= psar[i]:
+                trend[i] = 1
+                psar[i] = ep[i-1]
+                ep[i] = high[i]
+                af_values[i] = af
+            else:
+                trend[i] = -1
+                if low[i] < ep[i-1]:
+                    ep[i] = low[i]
+                    af_values[i] = min(af_values[i-1] + af, max_af)
+                else:
+                    ep[i] = ep[i-1]
+                    af_values[i] = af_values[i-1]
+
+    return psar, trend
+
+
+def _wilder_smoothing(values, period):
+    """تنعيم Wilder: البذرة متوسط أول period قيمة ثم s = s + (x - s) / period
+
+    القيم NaN لا تدخل في الحساب (تُبقي آخر قيمة منعمة بعد اكتمال البذرة).
+    """
+    length = len(values)
+    smoothed = np.full(length, np.nan)
+    total = 0.0
+    count = 0
+    previous = np.nan
+
+    for i in range(length):
+        value = values[i]
+        if value != value:  # NaN
+            if count >= period:
+                smoothed[i] = previous
+            continue
+
+        if count < period:
+            total += value
+            count += 1
+            if count == period:
+                previous = total / period
+                smoothed[i] = previous
+        else:
+            previous = previous + (value - previous) / period
+            smoothed[i] = previous
+
+    return smoothed
+
+
+def _scan_crossing(values, level, start, above):
+    """أول شمعة من start يصل فيها السعر للمستوى، أو -1 (مسح شمعة بشمعة للنسخة المترجمة)"""
+    for i in range(start, len(values)):
+        if values[i] >= level if above else values[i] <= level:
+            return i
+    return -1
+
+
+def first_crossing(values: np.ndarray, level: float, start: int, above: bool) -> int:
+    """أول شمعة من start يصل فيها السعر للمستوى، أو -1
+
+    البحث على دفعات متضاعفة حتى لا تُنسخ بقية السلسلة عند كل صفقة.
+    """
+    n = len(values)
+    chunk = 64
+    while start < n:
+        end = min(n, start + chunk)
+        segment = values[start:end]
+        hits = segment >= level if above else segment <= level
+        if hits.any():
+            return start + int(np.argmax(hits))
+        start = end
+        chunk *= 2
+    return -1
+
+
+# رموز سبب الخروج من simulate_position
+REASON_OPEN = 0
+REASON_STOP_LOSS = 1
+REASON_TAKE_PROFIT = 2
+
+
+def _make_simulate_position(crossing):
+    """محاكاة صفقة واحدة حتى الخروج؛ crossing هي دالة البحث عن أول وصول للمستوى"""
+
+    def simulate_position(open_, high, low, side, entry_price, stop_price, levels, weights, start, trailing):
+        """إرجاع (المحقق، المتبقي، الأهداف المحققة، سبب الخروج، شمعة الخروج)
+
+        داخل الشمعة الواحدة يُفحص الوقف قبل الأهداف، والفجوة خلف الوقف تخرج بسعر الافتتاح.
+        الهدف الأول يحرك الوقف للتعادل والثاني لمنتصف المسافة.
+        """
+        n = len(high)
+        remaining = 1.0
+        realized = 0.0
+        hit = 0
+        reason = REASON_OPEN
+        exit_index = n - 1
+
+        while start < n:
+            if side > 0:
+                stop_at = crossing(low, stop_price, start, False)
+                target_at = crossing(high, levels[hit], start, True)
+            else:
+                stop_at = crossing(high, stop_price, start, True)
+                target_at = crossing(low, levels[hit], start, False)
+
+            if stop_at < 0 and target_at < 0:
+                break
+
+            if stop_at >= 0 and (target_at < 0 or stop_at <= target_at):
+                # فجوة خلف الوقف: الخروج بسعر الافتتاح
+                fill = stop_price
+                if side * (open_[stop_at] - stop_price) < 0:
+                    fill = float(open_[stop_at])
+                realized += remaining * fill
+                remaining = 0.0
+                reason = REASON_STOP_LOSS
+                exit_index = stop_at
+                break
+
+            # قد تتحقق عدة أهداف في نفس الشمعة
+            j = target_at
+            extreme = high[j] if side > 0 else low[j]
+            while hit < len(levels) and side * (extreme - levels[hit]) >= 0:
+                portion = remaining if hit == len(levels) - 1 else min(weights[hit], remaining)
+                realized += portion * levels[hit]
+                remaining -= portion
+                hit += 1
+
+                if trailing and hit == 1:
+                    stop_price = entry_price
+                elif trailing and hit == 2:
+                    midpoint = (entry_price + levels[0]) / 2
+                    stop_price = max(stop_price, midpoint) if side > 0 else min(stop_price, midpoint)
+
+            if hit == len(levels) or remaining <= 1e-12:
+                remaining = 0.0
+                reason = REASON_TAKE_PROFIT
+                exit_index = j
+                break
+
+            start = j + 1
+
+        return realized, remaining, hit, reason, exit_index
+
+    return simulate_position
+
+
+def resolve_backend(backend: str = KERNEL_BACKEND) -> str:
+    """الواجهة الفعلية حسب الإعداد وتوفر numba"""
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        print("⚠️ numba غير مثبتة، سيتم استخدام نوى Python")
+        return "python"
+    if backend == "auto":
+        return "numba" if NUMBA_AVAILABLE else "python"
+    return backend
+
+
+def get_kernels(backend: str = KERNEL_BACKEND) -> dict:
+    """دوال النوى لواجهة معينة (تُستخدم في القياس للمقارنة بين الواجهتين)"""
+    backend = resolve_backend(backend)
+    if backend == "numba":
+        jit = numba.njit(cache=True)
+        scan = jit(_scan_crossing)
+        return {
+            'parabolic_sar': jit(_parabolic_sar),
+            'wilder_smoothing': jit(_wilder_smoothing),
+            # دالة مغلقة على scan لا تقبل التخزين المؤقت على القرص
+            'simulate_position': numba.njit(_make_simulate_position(scan)),
+        }
+    return {
+        'parabolic_sar': _parabolic_sar,
+        'wilder_smoothing': _wilder_smoothing,
+        # بدون ترجمة يبقى البحث على دفعات NumPy أسرع من المسح شمعة بشمعة
+        'simulate_position': _make_simulate_position(first_crossing),
+    }
+
+
+BACKEND = resolve_backend()
+_kernels = get_kernels(BACKEND)
+parabolic_sar = _kernels['parabolic_sar']
+wilder_smoothing = _kernels['wilder_smoothing']
+simulate_position = _kernels['simulate_position']
@@ -0,0 +1,144 @@
+"""
+محرك كشف كسر المستويات مع نطاق تخلف (Hysteresis)
+"""
+
+import numpy as np
+
+
+class LevelBook:
+    """فهرس مستويات رمز واحد على فريم واحد مرتب للبحث بالمجالات"""
+
+    def __init__(self, hysteresis_pct):
+        self.hysteresis_pct = hysteresis_pct
+        self.levels = np.empty(0, dtype=np.float64)
+        self.alert_ids = np.empty(0, dtype=np.int64)
+        # +1 فوق المستوى، -1 تحته، 0 غير معروف بعد
+        self.sides = np.empty(0, dtype=np.int8)
+        self.last_bar_time = None
+
+    def __len__(self):
+        return len(self.levels)
+
+    def rebuild(self, alerts):
+        """إعادة بناء الفهرس مع الاحتفاظ بحالة المستويات الموجودة مسبقاً"""
+        previous = dict(zip(self.alert_ids.tolist(), self.sides.tolist()))
+
+        levels = np.array([alert["level"] for alert in alerts], dtype=np.float64)
+        alert_ids = np.array([alert["id"] for alert in alerts], dtype=np.int64)
+        order = np.argsort(levels, kind="mergesort")
+
+        self.levels = levels[order]
+        self.alert_ids = alert_ids[order]
+        self.sides = np.array(
+            [previous.get(alert_id, 0) for alert_id in self.alert_ids.tolist()],
+            dtype=np.int8
+        )
+
+    def band(self, levels):
+        """عرض نطاق التخلف لكل مستوى"""
+        return np.abs(levels) * (self.hysteresis_pct / 100)
+
+    def candidates(self, low, high):
+        """المستويات الواقعة في المجال [low, high] بعد توسيعه بنطاق التخلف"""
+        margin = max(abs(low), abs(high)) * (self.hysteresis_pct / 100)
+        start = np.searchsorted(self.levels, low - margin, side="left")
+        end = np.searchsorted(self.levels, high + margin, side="right")
+        return start, end
+
+    def process_bar(self, prev_close, bar_low, bar_high, bar_close):
+        """معالجة شمعة جديدة مقارنة بالشمعة السابقة وإرجاع الكسور المؤكدة"""
+        # مسار السعر بين الإغلاق السابق والشمعة الحالية يغطي الفجوات أيضاً
+        path_low = min(prev_close, bar_low)
+        path_high = max(prev_close, bar_high)
+
+        start, end = self.candidates(path_low, path_high)
+        if start >= end:
+            return []
+
+        levels = self.levels[start:end]
+        sides = self.sides[start:end]
+        band = self.band(levels)
+
+        # المستويات الجديدة تأخذ جهتها من الإغلاق السابق
+        unknown = sides == 0
+        if unknown.any():
+            sides[unknown] = np.where(prev_close >= levels[unknown], 1, -1)
+
+        # الإغلاق داخل نطاق التخلف لا يغير الجهة
+        new_sides = sides.copy()
+        new_sides[bar_close > levels + band] = 1
+        new_sides[bar_close < levels - band] = -1
+
+        flipped = np.nonzero(new_sides != sides)[0]
+        self.sides[start:end] = new_sides
+
+        breaks = []
+        for offset in flipped.tolist():
+            breaks.append({
+                "alert_id": int(self.alert_ids[start + offset]),
+                "level": float(levels[offset]),
+                "direction": "up" if new_sides[offset] > 0 else "down",
+                "gap": bool(
+                    (new_sides[offset] > 0 and bar_low > levels[offset]) or
+                    (new_sides[offset] < 0 and bar_high < levels[offset])
+                )
+            })
+
+        return breaks
+
+
+class LevelBreakEngine:
+    """محرك كسر المستويات: يكشف العبور الفعلي بين الشموع المتتالية"""
+
+    def __init__(self, hysteresis_pct=0.05):
+        # نسبة نطاق التخلف من قيمة المستوى (0.05 = 0.05%)
+        self.hysteresis_pct = hysteresis_pct
+        self.books = {}
+
+    def sync(self, alerts):
+        """مزامنة الفهارس مع قائمة تنبيهات كسر المستويات النشطة"""
+        grouped = {}
+        for alert in alerts:
+            if alert.get("status") != "active":
+                continue
+            key = (alert["symbol"], alert["timeframe"])
+            grouped.setdefault(key, []).append(alert)
+
+        for key in list(self.books):
+            if key not in grouped:
+                del self.books[key]
+
+        for key, key_alerts in grouped.items():
+            book = self.books.get(key)
+            if book is None:
+                book = LevelBook(self.hysteresis_pct)
+                self.books[key] = book
+            book.rebuild(key_alerts)
+
+    def process(self, symbol, timeframe, data):
+        """فحص الشموع الجديدة في البيانات وإرجاع الكسور المكتشفة"""
+        book = self.books.get((symbol, timeframe))
+        if book is None or len(book) == 0 or data is None or len(data) < 2:
+            return []
+
+        low = data['Low'].values
+        high = data['High'].values
+        close = data['Close'].values
+        times = data.index
+
+        # تحديد أول شمعة للمعالجة، مع إعادة فحص آخر شمعة لأنها قد تكون غير مكتملة
+        if book.last_bar_time is None:
+            first = len(data) - 1
+        else:
+            first = int(times.searchsorted(book.last_bar_time, side="left"))
+            first = max(first, 1)
+
+        breaks = []
+        for i in range(first, len(data)):
+            for level_break in book.process_bar(close[i - 1], low[i], high[i], close[i]):
+                level_break["bar_time"] = times[i]
+                level_break["price"] = float(close[i])
+                breaks.append(level_break)
+
+        book.last_bar_time = times[-1]
+        return breaks
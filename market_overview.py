@@ -0,0 +1,199 @@
+"""
+خدمة النظرة العامة على السوق: لقطة محسوبة مسبقاً في الخلفية تُعرض فوراً للمستخدمين
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+from data_collector import DataCollector, RESAMPLE_RULES
+from recommendation_system import analyze_preloaded
+from symbol_mapper import determine_market_type, get_correct_symbol, get_timeframe_config
+from task_offload import offloader
+
+# أسماء الأسواق في الرسائل
+MARKET_LABELS = {
+    'forex': 'الفوركس',
+    'commodity': 'السلع',
+    'index': 'المؤشرات',
+    'crypto': 'العملات الرقمية',
+    'stock': 'الأسهم'
+}
+
+
+class MarketOverviewService:
+    """تحديث النظرة العامة حسب جدول زمني وعند إغلاق كل شمعة للفريم المستخدم"""
+
+    def __init__(self, config_file: str = "market_overview_config.json"):
+        self.config_file = config_file
+        self.config = self.load_config()
+        self.data_collector = DataCollector()
+        self.snapshot = None
+        self.last_refresh = 0.0
+        self.last_bar = None  # بداية الشمعة الجارية عند آخر تحديث
+        self.refresh_count = 0
+
+    def load_config(self) -> Dict:
+        """تحميل إعدادات النظرة العامة"""
+        try:
+            with open(self.config_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            default_config = {
+                "symbols": [
+                    "EURUSD", "GBPUSD", "USDJPY", "USDCHF", "AUDUSD", "USDCAD", "NZDUSD",
+                    "EURGBP", "EURJPY", "GBPJPY", "AUDJPY", "EURCHF",
+                    "XAUUSD", "XAGUSD", "WTI", "BRENT",
+                    "US30", "US500", "NAS100", "DAX", "FTSE", "NIKKEI",
+                    "BTC-USD", "ETH-USD", "BNB-USD", "SOL-USD", "XRP-USD", "ADA-USD",
+                    "AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "GOOGL"
+                ],
+                "timeframe": "1h",
+                "refresh_interval": 1800,   # تحديث دوري (ثانية) حتى بدون شمعة جديدة
+                "check_interval": 60,       # فحص إغلاق الشمعة (ثانية)
+                "top_recommendations": 5
+            }
+
+            with open(self.config_file, "w") as f:
+                json.dump(default_config, f, indent=2)
+
+            return default_config
+
+    def current_bar(self) -> pd.Timestamp:
+        """بداية الشمعة الجارية للفريم المستخدم"""
+        interval = get_timeframe_config(self.config.get('timeframe', '1h'))['interval']
+        rule = RESAMPLE_RULES.get(interval, '1D')
+        return pd.Timestamp.now(tz='UTC').floor(rule)
+
+    def needs_refresh(self) -> bool:
+        """التحديث مطلوب عند إغلاق شمعة أو مرور فترة التحديث"""
+        if self.snapshot is None:
+            return True
+        if self.current_bar() != self.last_bar:
+            return True
+        return time.time() - self.last_refresh >= self.config.get('refresh_interval', 1800)
+
+    async def refresh(self) -> Dict:
+        """تحميل مجمع لكل الرموز ثم تحليلها بالتوازي وبناء لقطة جديدة"""
+        started = time.monotonic()
+        bar = self.current_bar()
+        symbols = self.config.get('symbols', [])
+        timeframe = self.config.get('timeframe', '1h')
+        timeframe_config = get_timeframe_config(timeframe)
+
+        history = await offloader.run_io(
+            self.data_collector.get_batch_history, symbols,
+            period=timeframe_config['period'], interval=timeframe_config['interval']
+        )
+
+        symbols = [symbol for symbol in symbols if symbol in history]
+        results = await asyncio.gather(
+            *(offloader.run_cpu(analyze_preloaded, symbol, timeframe, history[symbol], profile='fast') for symbol in symbols),
+            return_exceptions=True
+        )
+
+        overview = {
+            'bullish': 0,
+            'bearish': 0,
+            'neutral': 0,
+            'recommendations': [],
+            'markets': {}
+        }
+
+        for symbol, rec in zip(symbols, results):
+            if isinstance(rec, Exception) or not rec:
+                continue
+
+            rec.setdefault('symbol', symbol)
+            overview['recommendations'].append(rec)
+
+            key = {'شراء': 'bullish', 'بيع': 'bearish'}.get(rec['type'], 'neutral')
+            overview[key] += 1
+
+            market = determine_market_type(get_correct_symbol(symbol))
+            counts = overview['markets'].setdefault(market, {'bullish': 0, 'bearish': 0, 'neutral': 0})
+            counts[key] += 1
+
+        overview['recommendations'].sort(key=lambda rec: rec.get('confidence', 0), reverse=True)
+        overview['symbols_analyzed'] = len(overview['recommendations'])
+        overview['symbols_requested'] = len(self.config.get('symbols', []))
+        overview['updated_at'] = datetime.now()
+        overview['duration'] = round(time.monotonic() - started, 1)
+
+        self.snapshot = overview
+        self.last_refresh = time.time()
+        self.last_bar = bar
+        self.refresh_count += 1
+        print(f"📊 تم تحديث النظرة العامة: {overview['symbols_analyzed']} رمز في {overview['duration']} ثانية")
+        return overview
+
+    async def run_forever(self):
+        """الحلقة الخلفية للتحديث"""
+        while True:
+            try:
+                if self.needs_refresh():
+                    await self.refresh()
+            except Exception as e:
+                print(f"❌ خطأ في تحديث النظرة العامة: {e}")
+
+            await asyncio.sleep(self.config.get('check_interval', 60))
+
+    def get_snapshot(self) -> Optional[Dict]:
+        """آخر لقطة محسوبة (None قبل أول تحديث)"""
+        return self.snapshot
+
+    @staticmethod
+    def format_age(updated_at: datetime) -> str:
+        """عمر اللقطة بصيغة مقروءة"""
+        minutes = int((datetime.now() - updated_at).total_seconds() // 60)
+        if minutes < 1:
+            return "الآن"
+        if minutes < 60:
+            return f"منذ {minutes} دقيقة"
+        return f"منذ {minutes // 60} ساعة و {minutes % 60} دقيقة"
+
+    def format_message(self) -> str:
+        """رسالة النظرة العامة من آخر لقطة"""
+        overview = self.snapshot
+        if overview is None:
+            return "⏳ يتم إعداد النظرة العامة على السوق لأول مرة، يرجى المحاولة بعد قليل."
+
+        message = f"""
+📊 **نظرة عامة على الأسواق** 📊
+
+**إحصائيات عامة ({overview['symbols_analyzed']} رمز):**
+🟢 إشارات شراء: {overview['bullish']}
+🔴 إشارات بيع: {overview['bearish']}
+🟡 إشارات محايدة: {overview['neutral']}
+"""
+
+        if overview['markets']:
+            message += "\n**حسب السوق:**"
+            for market, counts in overview['markets'].items():
+                message += f"\n• {MARKET_LABELS.get(market, market)}: 🟢 {counts['bullish']} | 🔴 {counts['bearish']} | 🟡 {counts['neutral']}"
+            message += "\n"
+
+        message += "\n**أقوى التوصيات:**"
+
+        top = [rec for rec in overview['recommendations'] if rec.get('type') in ('شراء', 'بيع')]
+        for rec in top[:self.config.get('top_recommendations', 5)]:
+            icon = "🟢" if rec['type'] == "شراء" else "🔴"
+            message += f"\n{icon} {rec.get('symbol', 'غير محدد')}: {rec['type']} ({rec.get('confidence', 0):.0f}%)"
+
+        if not top:
+            message += "\n🟡 لا توجد إشارات واضحة حالياً"
+
+        message += (
+            f"\n\n━━━━━━━━━━━━━━━━━━━━━━━\n"
+            f"🕐 *آخر تحديث: {self.format_age(overview['updated_at'])} "
+            f"({overview['updated_at'].strftime('%H:%M')})*"
+        )
+        return message
+
+
+# خدمة النظرة العامة المشتركة لأوامر البوت
+market_overview_service = MarketOverviewService()
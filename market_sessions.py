@@ -0,0 +1,153 @@
+"""
+تقويم جلسات التداول: تخطي الرموز التي سوقها مغلق في الفحص والتنبيهات، وإيقاظها قبل الافتتاح بقليل
+"""
+
+import json
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+from symbol_mapper import get_symbol_info
+
+# جلسات كل تقويم بالتوقيت المحلي للبورصة. الأيام: 0 الاثنين ... 6 الأحد (يوم بداية الجلسة)
+# إذا كان الإغلاق <= الافتتاح فالجلسة تمتد لليوم التالي (الفوركس وعقود CME)
+SESSION_CALENDARS = {
+    'forex': {'tz': 'America/New_York', 'days': [6, 0, 1, 2, 3], 'open': '17:00', 'close': '17:00'},
+    'cme': {'tz': 'America/New_York', 'days': [6, 0, 1, 2, 3], 'open': '18:00', 'close': '17:00'},
+    'us': {'tz': 'America/New_York', 'days': [0, 1, 2, 3, 4], 'open': '09:30', 'close': '16:00'},
+    'lse': {'tz': 'Europe/London', 'days': [0, 1, 2, 3, 4], 'open': '08:00', 'close': '16:30'},
+    'xetra': {'tz': 'Europe/Berlin', 'days': [0, 1, 2, 3, 4], 'open': '09:00', 'close': '17:30'},
+    'euronext': {'tz': 'Europe/Paris', 'days': [0, 1, 2, 3, 4], 'open': '09:00', 'close': '17:30'},
+    'tse': {'tz': 'Asia/Tokyo', 'days': [0, 1, 2, 3, 4], 'open': '09:00', 'close': '15:00'},
+    'hkex': {'tz': 'Asia/Hong_Kong', 'days': [0, 1, 2, 3, 4], 'open': '09:30', 'close': '16:00'},
+}
+
+# تقاويم تعمل دائماً
+ALWAYS_OPEN = {'crypto'}
+
+
+class MarketSessionCalendar:
+    """حالة السوق لكل رمز عبر تقويم الجلسات المسجل له في سجل الرموز"""
+
+    def __init__(self, config_file: str = "market_sessions_config.json"):
+        self.config_file = config_file
+        self.config = self.load_config()
+        self.calendars = {}
+        for name, spec in SESSION_CALENDARS.items():
+            self.calendars[name] = {
+                'tz': ZoneInfo(spec['tz']),
+                'days': set(spec['days']),
+                'open': dtime.fromisoformat(spec['open']),
+                'close': dtime.fromisoformat(spec['close']),
+                'overnight': spec['close'] <= spec['open']
+            }
+
+    def load_config(self) -> Dict:
+        """تحميل إعدادات التقويم"""
+        try:
+            with open(self.config_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            default_config = {
+                "enabled": True,
+                "wake_before_minutes": 5,    # إيقاظ الرمز قبل الافتتاح بهذه المدة
+                "holidays": {                # أيام العطل لكل تقويم (YYYY-MM-DD)
+                    "us": [],
+                    "lse": [],
+                    "xetra": [],
+                    "euronext": [],
+                    "tse": [],
+                    "hkex": []
+                }
+            }
+
+            with open(self.config_file, "w") as f:
+                json.dump(default_config, f, indent=2)
+
+            return default_config
+
+    def _is_holiday(self, calendar: str, day) -> bool:
+        return day.isoformat() in self.config.get('holidays', {}).get(calendar, [])
+
+    def _sessions_around(self, calendar: str, now: datetime, days_ahead: int = 8):
+        """الجلسات (بداية، نهاية) التي تبدأ من أمس حتى days_ahead يوماً"""
+        spec = self.calendars[calendar]
+        today = now.astimezone(spec['tz']).date()
+        for offset in range(-1, days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if day.weekday() not in spec['days'] or self._is_holiday(calendar, day):
+                continue
+            start = datetime.combine(day, spec['open'], tzinfo=spec['tz'])
+            end_day = day + timedelta(days=1) if spec['overnight'] else day
+            end = datetime.combine(end_day, spec['close'], tzinfo=spec['tz'])
+            yield start, end
+
+    @staticmethod
+    def _now(now: Optional[datetime]) -> datetime:
+        return now if now is not None else datetime.now(timezone.utc)
+
+    def calendar_of(self, symbol: str) -> str:
+        """اسم تقويم الرمز من سجل الرموز"""
+        return get_symbol_info(symbol)['session']
+
+    def is_open(self, symbol: str, now: Optional[datetime] = None) -> bool:
+        """هل سوق الرمز مفتوح الآن"""
+        calendar = self.calendar_of(symbol)
+        if calendar in ALWAYS_OPEN or calendar not in self.calendars:
+            return True
+        now = self._now(now)
+        return any(start <= now < end for start, end in self._sessions_around(calendar, now, days_ahead=0))
+
+    def next_open(self, symbol: str, now: Optional[datetime] = None) -> Optional[datetime]:
+        """موعد الافتتاح القادم (الآن إذا كان مفتوحاً، None إذا لم يُعثر عليه)"""
+        calendar = self.calendar_of(symbol)
+        now = self._now(now)
+        if calendar in ALWAYS_OPEN or calendar not in self.calendars:
+            return now
+        for start, end in self._sessions_around(calendar, now):
+            if start <= now < end:
+                return now
+            if start > now:
+                return start
+        return None
+
+    def is_active(self, symbol: str, now: Optional[datetime] = None) -> bool:
+        """مفتوح أو يفتح خلال مدة الإيقاظ"""
+        if not self.config.get('enabled', True):
+            return True
+        now = self._now(now)
+        opens_at = self.next_open(symbol, now)
+        if opens_at is None:
+            return False
+        return opens_at - now <= timedelta(minutes=self.config.get('wake_before_minutes', 5))
+
+    def filter_active(self, symbols: Iterable[str], now: Optional[datetime] = None, label: str = "",
+                      verbose: bool = True) -> List[str]:
+        """الرموز التي يجب فحصها الآن؛ الحالة تُحسب مرة لكل تقويم"""
+        symbols = list(symbols)
+        if not self.config.get('enabled', True):
+            return symbols
+
+        now = self._now(now)
+        status = {}
+        active = []
+        for symbol in symbols:
+            calendar = self.calendar_of(symbol)
+            if calendar not in status:
+                status[calendar] = self.is_active(symbol, now)
+            if status[calendar]:
+                active.append(symbol)
+
+        skipped = len(symbols) - len(active)
+        if skipped and verbose:
+            closed = ', '.join(sorted(calendar for calendar, is_active in status.items() if not is_active))
+            print(f"🌙 {label}تخطي {skipped} رمز أسواقها مغلقة ({closed})")
+        return active
+
+
+# التقويم المشترك لكل حلقات الفحص والتنبيهات
+market_sessions = MarketSessionCalendar()
@@ -0,0 +1,305 @@
+"""
+محسّن إعدادات التداول: بحث شبكي أو عشوائي على البيانات التاريخية بمجموعة عمليات
+الإشارات تُحسب مرة واحدة وتُشارك مع كل العمليات، وكل تجربة تعيد المحاكاة فقط
+"""
+
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtester import Backtester, HISTORY_DIR, load_history, summarize_trades
+
+# القيم المرشحة لإعدادات trading_config.json
+AUTO_PARAMETER_SPACE = {
+    'min_confidence': [55, 60, 65, 70, 75, 80, 85],
+    'stop_loss_pips': [10, 15, 20, 30, 40, 50],
+    'take_profit_pips': [15, 20, 30, 45, 60, 90, 120],
+    'risk_per_trade': [0.5, 1, 1.5, 2, 3],
+    'max_daily_trades': [1, 2, 3, 5, 10]
+}
+
+# النظام المتقدم يحسب المستويات من التحليل، فتُحسّن شروط الدخول والإدارة فقط
+ADVANCED_PARAMETER_SPACE = {
+    'min_confidence': [70, 75, 80, 85, 90, 95],
+    'risk_per_trade': [0.5, 1, 1.5, 2],
+    'max_daily_trades': [1, 2, 3, 5],
+    'trailing_stop': [True, False],
+    'partial_close': [True, False]
+}
+
+# حالة العملية العاملة: تُملأ مرة واحدة عند بدء كل عملية
+_worker_state = {}
+
+
+def grid_configs(space: Dict[str, List]) -> List[Dict]:
+    """كل تركيبات الإعدادات في فضاء البحث"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def random_configs(space: Dict[str, List], n_samples: int, seed: Optional[int] = None) -> List[Dict]:
+    """عينة عشوائية بدون تكرار من تركيبات الإعدادات"""
+    keys = list(space)
+    total = int(np.prod([len(space[key]) for key in keys]))
+    rng = random.Random(seed)
+
+    if n_samples >= total:
+        return grid_configs(space)
+
+    # اختيار أرقام التركيبات ثم فكها دون بناء الشبكة كاملة
+    configs = []
+    for number in rng.sample(range(total), n_samples):
+        config = {}
+        for key in reversed(keys):
+            number, position = divmod(number, len(space[key]))
+            config[key] = space[key][position]
+        configs.append({key: config[key] for key in keys})
+    return configs
+
+
+def slice_arrays(arrays: Dict, start: int, end: int) -> Dict:
+    """جزء من مصفوفات الرمز بين شمعتين (الإشارات لا تعتمد على المستقبل)"""
+    return {
+        key: (value[start:end] if isinstance(value, (np.ndarray, pd.Index)) else value)
+        for key, value in arrays.items()
+    }
+
+
+def _init_worker(mode: str, base_config: Dict, interval: str, arrays_by_symbol: Dict):
+    """تهيئة العملية العاملة بالمصفوفات المحسوبة مسبقاً"""
+    _worker_state['backtester'] = Backtester(mode=mode, config=base_config, interval=interval)
+    _worker_state['arrays'] = arrays_by_symbol
+
+
+def _evaluate(task: Tuple[int, Dict, List[Tuple]]) -> Tuple[int, List[Dict]]:
+    """تقييم إعدادات واحدة على كل النوافذ الزمنية المطلوبة"""
+    config_id, config, windows = task
+    backtester = _worker_state['backtester']
+    arrays_by_symbol = _worker_state['arrays']
+    n_targets = 1 if backtester.mode == "auto" else 3
+
+    results = []
+    for window_start, window_end in windows:
+        trades = []
+        for arrays in arrays_by_symbol.values():
+            index = arrays['index']
+            start = 0 if window_start is None else int(index.searchsorted(window_start))
+            end = len(index) if window_end is None else int(index.searchsorted(window_end))
+            if end - start < 2:
+                continue
+            trades.append(backtester.simulate(slice_arrays(arrays, start, end), config))
+
+        trades = [frame for frame in trades if not frame.empty]
+        if trades:
+            combined = pd.concat(trades, ignore_index=True).sort_values('exit_time', kind='mergesort')
+        else:
+            combined = pd.DataFrame()
+        results.append(summarize_trades(combined, config.get('risk_per_trade', backtester.config['risk_per_trade']), n_targets))
+
+    return config_id, results
+
+
+class ParameterOptimizer:
+    """بحث عن أفضل إعدادات التداول مع اختبار أمامي متدحرج (Walk-Forward)"""
+
+    def __init__(self, mode: str = "auto", symbols: Optional[List[str]] = None, interval: Optional[str] = None,
+                 data_dir: str = HISTORY_DIR, max_workers: Optional[int] = None,
+                 objective: str = "return_pct", min_trades: int = 20):
+        self.backtester = Backtester(mode=mode, interval=interval, data_dir=data_dir)
+        self.mode = mode
+        self.symbols = symbols or list(self.backtester.config.get('symbols_to_monitor', []))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.objective = objective
+        # الإعدادات التي تنتج صفقات قليلة جداً لا يُعتمد على نتائجها
+        self.min_trades = min_trades
+        self.arrays = {}
+
+    @property
+    def parameter_space(self) -> Dict[str, List]:
+        return AUTO_PARAMETER_SPACE if self.mode == "auto" else ADVANCED_PARAMETER_SPACE
+
+    def prepare(self, histories: Optional[Dict[str, pd.DataFrame]] = None):
+        """حساب الإشارات لكل رمز مرة واحدة قبل البحث"""
+        started = time.time()
+        self.arrays = {}
+
+        for symbol in self.symbols:
+            data = histories.get(symbol) if histories else load_history(
+                symbol, self.backtester.interval, self.backtester.data_dir
+            )
+            if data is None or len(data) < 60:
+                print(f"⚠️ بيانات غير كافية للرمز {symbol}")
+                continue
+
+            try:
+                self.arrays[symbol] = self.backtester.precompute(symbol, data)
+            except Exception as e:
+                print(f"❌ خطأ في حساب إشارات الرمز {symbol}: {e}")
+
+        print(f"📦 تم حساب إشارات {len(self.arrays)} رمز خلال {time.time() - started:.1f} ثانية")
+
+    def walk_forward_splits(self, n_splits: int = 4, train_segments: int = 2) -> List[Dict]:
+        """تقسيم الفترة الزمنية إلى نوافذ تدريب متدحرجة تليها نافذة اختبار"""
+        starts = [arrays['index'][0] for arrays in self.arrays.values()]
+        ends = [arrays['index'][-1] for arrays in self.arrays.values()]
+        if not starts:
+            return []
+
+        boundaries = pd.date_range(min(starts), max(ends), periods=n_splits + train_segments + 1)
+        # آخر حد يجب أن يشمل الشمعة الأخيرة
+        boundaries = list(boundaries[:-1]) + [None]
+
+        splits = []
+        for fold in range(n_splits):
+            splits.append({
+                'fold': fold + 1,
+                'train': (boundaries[fold], boundaries[fold + train_segments]),
+                'test': (boundaries[fold + train_segments], boundaries[fold + train_segments + 1])
+            })
+        return splits
+
+    def _score(self, metrics: Dict) -> float:
+        """قيمة الهدف لترتيب الإعدادات"""
+        if metrics['trades'] < self.min_trades:
+            return float('-inf')
+        value = metrics.get(self.objective, 0.0)
+        return float(value) if np.isfinite(value) else float('-inf')
+
+    def evaluate_configs(self, configs: List[Dict], windows: List[Tuple]) -> List[List[Dict]]:
+        """تقييم مجموعة إعدادات على عدة نوافذ بمجموعة عمليات"""
+        if not self.arrays:
+            self.prepare()
+
+        tasks = [(config_id, config, windows) for config_id, config in enumerate(configs)]
+        results = [None] * len(configs)
+        chunksize = max(1, len(tasks) // (self.max_workers * 8))
+
+        started = time.time()
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.mode, self.backtester.config, self.backtester.interval, self.arrays)
+        ) as executor:
+            for done, (config_id, metrics) in enumerate(executor.map(_evaluate, tasks, chunksize=chunksize), 1):
+                results[config_id] = metrics
+                if done % 500 == 0:
+                    print(f"⏳ {done}/{len(tasks)} إعداد خلال {time.time() - started:.0f} ثانية")
+
+        print(f"✅ تم تقييم {len(tasks)} إعداد على {len(windows)} نافذة خلال {time.time() - started:.1f} ثانية")
+        return results
+
+    def optimize(self, method: str = "random", n_samples: int = 1000, n_splits: int = 4,
+                 train_segments: int = 2, seed: Optional[int] = None) -> Dict:
+        """تشغيل البحث مع الاختبار الأمامي وإرجاع أفضل الإعدادات لكل نافذة"""
+        if not self.arrays:
+            self.prepare()
+
+        space = self.parameter_space
+        configs = grid_configs(space) if method == "grid" else random_configs(space, n_samples, seed)
+        splits = self.walk_forward_splits(n_splits, train_segments)
+
+        # كل الإعدادات تُقيّم على كامل التاريخ وعلى كل نوافذ التدريب والاختبار في مهمة واحدة
+        windows = [(None, None)]
+        for split in splits:
+            windows.extend([split['train'], split['test']])
+
+        results = self.evaluate_configs(configs, windows)
+
+        folds = []
+        for position, split in enumerate(splits):
+            train_column = 1 + position * 2
+            scores = [self._score(metrics[train_column]) for metrics in results]
+            best = int(np.argmax(scores))
+
+            folds.append({
+                'fold': split['fold'],
+                'train': [str(value) for value in split['train']],
+                'test': [str(value) for value in split['test']],
+                'config': configs[best],
+                'in_sample': results[best][train_column],
+                'out_of_sample': results[best][train_column + 1]
+            })
+
+        full_scores = [self._score(metrics[0]) for metrics in results]
+        ranking = np.argsort(full_scores)[::-1][:10]
+        leaderboard = [
+            {'config': configs[i], 'metrics': results[i][0]}
+            for i in ranking if np.isfinite(full_scores[i])
+        ]
+
+        out_of_sample = [fold['out_of_sample'][self.objective] for fold in folds if fold['out_of_sample']['trades']]
+
+        return {
+            'mode': self.mode,
+            'method': method,
+            'objective': self.objective,
+            'configs_tested': len(configs),
+            'symbols': list(self.arrays),
+            'walk_forward': folds,
+            'walk_forward_avg': round(float(np.mean(out_of_sample)), 2) if out_of_sample else 0.0,
+            'leaderboard': leaderboard
+        }
+
+    def save_results(self, report: Dict, path: str = "optimization_results.json"):
+        """حفظ نتائج التحسين"""
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+    def format_report(self, report: Dict) -> str:
+        """تنسيق ملخص التحسين"""
+        message = f"""
+🧪 **نتائج تحسين الإعدادات**
+
+⚙️ **النظام:** {'المتقدم' if report['mode'] == 'advanced' else 'التلقائي'}
+🔢 **الإعدادات المختبرة:** {report['configs_tested']} ({report['method']})
+🎯 **الهدف:** {report['objective']}
+
+📅 **الاختبار الأمامي:**"""
+
+        for fold in report['walk_forward']:
+            message += (
+                f"\n• النافذة {fold['fold']}: داخل العينة {fold['in_sample'][self.objective]} | "
+                f"خارج العينة {fold['out_of_sample'][self.objective]} "
+                f"({fold['out_of_sample']['trades']} صفقة)"
+            )
+
+        message += f"\n📊 متوسط خارج العينة: {report['walk_forward_avg']}"
+
+        if report['leaderboard']:
+            best = report['leaderboard'][0]
+            message += "\n\n🏆 **أفضل إعدادات على كامل الفترة:**"
+            for key, value in best['config'].items():
+                message += f"\n• {key}: {value}"
+
+        return message
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="تحسين إعدادات التداول على بيانات محلية")
+    parser.add_argument("symbols", nargs="*")
+    parser.add_argument("--mode", default="auto", choices=["auto", "advanced"])
+    parser.add_argument("--method", default="random", choices=["grid", "random"])
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--splits", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--interval", default=None)
+    parser.add_argument("--objective", default="return_pct")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    optimizer = ParameterOptimizer(
+        mode=args.mode, symbols=args.symbols or None, interval=args.interval,
+        max_workers=args.workers, objective=args.objective
+    )
+    report = optimizer.optimize(method=args.method, n_samples=args.samples, n_splits=args.splits, seed=args.seed)
+    optimizer.save_results(report)
+    print(optimizer.format_report(report))
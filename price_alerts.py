@@ -6,13 +6,19 @@ import json
 import os
 from datetime import datetime, timedelta
 import asyncio
+from adaptive_polling import adaptive_poller
 from data_collector import DataCollector
+from level_break_engine import LevelBreakEngine
+from market_sessions import market_sessions
+from technical_analysis_simple import TechnicalAnalysisSimple
 
 class PriceAlerts:
-    def __init__(self):
+    def __init__(self, hysteresis_pct=0.05):
         self.alerts_file = "price_alerts.json"
         self.data_collector = DataCollector()
         self.alerts = self.load_alerts()
+        self.alerts.setdefault("level_break_alerts", [])
+        self.level_engine = LevelBreakEngine(hysteresis_pct)
     
     def load_alerts(self):
         """تحميل التنبيهات المحفوظة"""
@@ -66,7 +72,7 @@ class PriceAlerts:
         self.save_alerts()
         return alert["id"]
     
-    def add_level_break_alert(self, user_id, symbol, level, level_type, timeframe="1h"):
+    def add_level_break_alert(self, user_id, symbol, level, level_type, timeframe="1h", repeat=False):
         """إضافة تنبيه كسر المستويات"""
         alert = {
             "id": len(self.alerts["level_break_alerts"]) + 1,
@@ -75,6 +81,7 @@ class PriceAlerts:
             "level": float(level),
             "level_type": level_type,  # "support", "resistance"
             "timeframe": timeframe,
+            "repeat": repeat,  # البقاء نشطاً بعد الكسر (نطاق التخلف يمنع التكرار بسبب الضجيج)
             "created_at": datetime.now().isoformat(),
             "status": "active"
         }
@@ -83,21 +90,74 @@ class PriceAlerts:
         self.save_alerts()
         return alert["id"]
     
-    def check_price_alerts(self):
+    def active_alert_symbols(self):
+        """رموز كل التنبيهات النشطة"""
+        return list(dict.fromkeys(
+            alert["symbol"]
+            for alert_list in ("price_alerts", "level_break_alerts", "indicator_alerts")
+            for alert in self.alerts.get(alert_list, [])
+            if alert["status"] == "active"
+        ))
+    
+    def alert_levels(self):
+        """الأسعار التي تراقبها التنبيهات النشطة لكل رمز (أهداف الأسعار ومستويات الكسر)"""
+        levels = {}
+        for alert in self.alerts.get("price_alerts", []):
+            if alert["status"] == "active":
+                levels.setdefault(alert["symbol"], []).append(alert["target_price"])
+        for alert in self.alerts.get("level_break_alerts", []):
+            if alert["status"] == "active":
+                levels.setdefault(alert["symbol"], []).append(alert["level"])
+        return levels
+    
+    def collect_market_data(self, period="1d", symbols=None):
+        """جمع بيانات كل (رمز، فريم) مرة واحدة لتنبيهات الأسعار وكسر المستويات
+
+        الرموز التي سوقها مغلق لا تُجلب بياناتها فتتخطاها التنبيهات حتى قبيل الافتتاح.
+        symbols: تقييد الجمع برموز معينة (التي حان تحديثها)
+        """
+        market_data = {}
+        active_alerts = [
+            alert
+            for alert_list in ("price_alerts", "level_break_alerts")
+            for alert in self.alerts.get(alert_list, [])
+            if alert["status"] == "active" and (symbols is None or alert["symbol"] in symbols)
+        ]
+        open_symbols = set(market_sessions.filter_active(
+            dict.fromkeys(alert["symbol"] for alert in active_alerts), label="التنبيهات: "
+        ))
+        
+        for alert in active_alerts:
+            key = (alert["symbol"], alert["timeframe"])
+            if key in market_data or alert["symbol"] not in open_symbols:
+                continue
+            
+            try:
+                market_data[key] = self.data_collector.get_data_by_type(
+                    alert["symbol"],
+                    period=period,
+                    interval=alert["timeframe"]
+                )
+            except Exception as e:
+                print(f"خطأ في جمع بيانات التنبيهات للرمز {alert['symbol']}: {e}")
+                market_data[key] = None
+        
+        return market_data
+    
+    def check_price_alerts(self, market_data=None):
         """فحص تنبيهات الأسعار"""
         triggered_alerts = []
         
+        if market_data is None:
+            market_data = self.collect_market_data()
+        
         for alert in self.alerts["price_alerts"]:
             if alert["status"] != "active":
                 continue
             
             try:
-                # جمع السعر الحالي
-                data = self.data_collector.get_data_by_type(
-                    alert["symbol"], 
-                    period="1d", 
-                    interval=alert["timeframe"]
-                )
+                # السعر الحالي من البيانات المشتركة
+                data = market_data.get((alert["symbol"], alert["timeframe"]))
                 
                 if data is None or data.empty:
                     continue
@@ -131,27 +191,86 @@ class PriceAlerts:
         
         return triggered_alerts
     
-    def check_indicator_alerts(self):
-        """فحص تنبيهات المؤشرات"""
+    def check_level_break_alerts(self, market_data=None):
+        """فحص تنبيهات كسر المستويات"""
+        triggered_alerts = []
+        
+        if market_data is None:
+            market_data = self.collect_market_data()
+        
+        level_alerts = self.alerts.get("level_break_alerts", [])
+        self.level_engine.sync(level_alerts)
+        alerts_by_id = {alert["id"]: alert for alert in level_alerts}
+        
+        for (symbol, timeframe), data in market_data.items():
+            if data is None or data.empty:
+                continue
+            
+            try:
+                breaks = self.level_engine.process(symbol, timeframe, data)
+            except Exception as e:
+                print(f"خطأ في فحص كسر المستويات للرمز {symbol}: {e}")
+                continue
+            
+            for level_break in breaks:
+                alert = alerts_by_id.get(level_break["alert_id"])
+                if alert is None or alert["status"] != "active":
+                    continue
+                
+                # المقاومة تُكسر صعوداً والدعم يُكسر هبوطاً
+                expected = {"resistance": "up", "support": "down"}.get(alert["level_type"])
+                if expected is not None and level_break["direction"] != expected:
+                    continue
+                
+                triggered_alerts.append({
+                    "alert": alert,
+                    "current_price": level_break["price"],
+                    "message": self.format_level_break_message(alert, level_break)
+                })
+                
+                alert["triggered_at"] = datetime.now().isoformat()
+                alert["triggered_price"] = level_break["price"]
+                if not alert.get("repeat"):
+                    alert["status"] = "triggered"
+        
+        if triggered_alerts:
+            self.save_alerts()
+        
+        return triggered_alerts
+    
+    def check_indicator_alerts(self, symbols=None):
+        """فحص تنبيهات المؤشرات (symbols: تقييد الفحص برموز معينة)"""
         triggered_alerts = []
+        # محلل واحد لكل رمز وفريم: التنبيهات المتعددة تتشارك البيانات والمؤشرات المحسوبة
+        analyzers = {}
+        open_symbols = set(market_sessions.filter_active(
+            dict.fromkeys(
+                alert["symbol"] for alert in self.alerts["indicator_alerts"]
+                if alert["status"] == "active" and (symbols is None or alert["symbol"] in symbols)
+            ),
+            label="تنبيهات المؤشرات: "
+        ))
         
         for alert in self.alerts["indicator_alerts"]:
-            if alert["status"] != "active":
+            if alert["status"] != "active" or alert["symbol"] not in open_symbols:
                 continue
             
             try:
-                # جمع البيانات وحساب المؤشر
-                data = self.data_collector.get_data_by_type(
-                    alert["symbol"], 
-                    period="5d", 
-                    interval=alert["timeframe"]
-                )
+                key = (alert["symbol"], alert["timeframe"])
+                if key not in analyzers:
+                    # جمع البيانات
+                    data = self.data_collector.get_data_by_type(
+                        alert["symbol"], 
+                        period="5d", 
+                        interval=alert["timeframe"]
+                    )
+                    analyzers[key] = TechnicalAnalysisSimple(data) if data is not None and not data.empty else None
                 
-                if data is None or data.empty:
+                if analyzers[key] is None:
                     continue
                 
-                # حساب المؤشر المطلوب
-                indicator_value = self.calculate_indicator_value(data, alert["indicator"])
+                # حساب المؤشر المطلوب فقط
+                indicator_value = self.calculate_indicator_value(analyzers[key], alert["indicator"])
                 
                 if indicator_value is None:
                     continue
@@ -185,28 +304,19 @@ class PriceAlerts:
     def calculate_indicator_value(self, data, indicator):
         """حساب قيمة المؤشر"""
         try:
+            # data: DataFrame أو محلل جاهز؛ تُحسب عقدة المؤشر وحدها من رسم التحليل
+            analyzer = data if isinstance(data, TechnicalAnalysisSimple) else TechnicalAnalysisSimple(data)
+            
             if indicator == "RSI":
-                # حساب RSI مبسط
-                delta = data['Close'].diff()
-                gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                rs = gain / loss
-                rsi = 100 - (100 / (1 + rs))
-                return rsi.iloc[-1]
+                return analyzer.get('rsi')[-1]
             
             elif indicator == "MACD":
-                # حساب MACD
-                exp1 = data['Close'].ewm(span=12).mean()
-                exp2 = data['Close'].ewm(span=26).mean()
-                macd = exp1 - exp2
-                return macd.iloc[-1]
+                macd_line, _, _ = analyzer.get('macd')
+                return macd_line[-1]
             
             elif indicator == "Stochastic":
-                # حساب Stochastic %K
-                low_14 = data['Low'].rolling(window=14).min()
-                high_14 = data['High'].rolling(window=14).max()
-                k_percent = 100 * ((data['Close'] - low_14) / (high_14 - low_14))
-                return k_percent.iloc[-1]
+                # Stochastic %K
+                return analyzer.get('stochastic')[-1]
             
         except Exception as e:
             print(f"خطأ في حساب المؤشر {indicator}: {e}")
@@ -255,6 +365,29 @@ class PriceAlerts:
         """
         return message
     
+    def format_level_break_message(self, alert, level_break):
+        """تنسيق رسالة تنبيه كسر المستوى"""
+        level_type = "المقاومة" if alert["level_type"] == "resistance" else "الدعم"
+        direction = "صعوداً" if level_break["direction"] == "up" else "هبوطاً"
+        gap_note = "\n⚡ **تم الكسر بفجوة سعرية**" if level_break["gap"] else ""
+        
+        message = f"""
+🧱 **تنبيه كسر مستوى** 🧱
+
+**الرمز:** `{alert['symbol']}`
+**مستوى {level_type}:** `{alert['level']:.4f}`
+**السعر الحالي:** `{level_break['price']:.4f}`
+**اتجاه الكسر:** {direction}{gap_note}
+
+📊 **تفاصيل التنبيه:**
+• **الفريم الزمني:** {alert['timeframe']}
+• **تاريخ الإنشاء:** {alert['created_at'][:19]}
+• **وقت التفعيل:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+✅ تم تأكيد كسر المستوى!
+        """
+        return message
+    
     def get_user_alerts(self, user_id):
         """الحصول على تنبيهات المستخدم"""
         user_alerts = {
@@ -289,12 +422,34 @@ class PriceAlerts:
         
         return False
     
+    def schedule_alert_polls(self, symbols, market_data):
+        """جدولة التحديث التالي لكل رمز حسب تذبذب بياناته وقرب سعره من مستويات تنبيهاته"""
+        levels = self.alert_levels()
+        frames = {}
+        for (symbol, timeframe), data in market_data.items():
+            if data is not None and not data.empty:
+                frames.setdefault(symbol, (data, timeframe))
+        
+        for symbol in symbols:
+            data, timeframe = frames.get(symbol, (None, None))
+            adaptive_poller.observe('alerts', symbol, data, timeframe, levels=levels.get(symbol, ()))
+    
     async def monitor_alerts(self, bot, check_interval=60):
-        """مراقبة التنبيهات بشكل مستمر"""
+        """مراقبة التنبيهات بشكل مستمر
+
+        كل رمز يُحدّث حسب فاصله المتكيف: الرموز الهادئة البعيدة عن تنبيهاتها أقل تحديثاً،
+        والحلقة تستيقظ كل check_interval على الأكثر لالتقاط التنبيهات الجديدة
+        """
         while True:
             try:
-                # فحص تنبيهات الأسعار
-                price_alerts = self.check_price_alerts()
+                symbols = adaptive_poller.due('alerts', self.active_alert_symbols())
+                
+                # جمع البيانات مرة واحدة لتنبيهات الأسعار وكسر المستويات
+                market_data = self.collect_market_data(symbols=symbols) if symbols else {}
+                
+                # فحص تنبيهات الأسعار وكسر المستويات
+                price_alerts = self.check_price_alerts(market_data)
+                price_alerts += self.check_level_break_alerts(market_data)
                 for triggered in price_alerts:
                     try:
                         await bot.send_message(
@@ -306,7 +461,7 @@ class PriceAlerts:
                         print(f"خطأ في إرسال تنبيه السعر: {e}")
                 
                 # فحص تنبيهات المؤشرات
-                indicator_alerts = self.check_indicator_alerts()
+                indicator_alerts = self.check_indicator_alerts(symbols=symbols) if symbols else []
                 for triggered in indicator_alerts:
                     try:
                         await bot.send_message(
@@ -317,8 +472,11 @@ class PriceAlerts:
                     except Exception as e:
                         print(f"خطأ في إرسال تنبيه المؤشر: {e}")
                 
-                # انتظار قبل الفحص التالي
-                await asyncio.sleep(check_interval)
+                # انتظار حتى أقرب رمز حان تحديثه
+                self.schedule_alert_polls(symbols, market_data)
+                await asyncio.sleep(adaptive_poller.seconds_until_due(
+                    'alerts', self.active_alert_symbols(), check_interval
+                ))
                 
             except Exception as e:
                 print(f"خطأ في مراقبة التنبيهات: {e}")
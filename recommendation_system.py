@@ -3,10 +3,51 @@ from technical_analysis_simple import TechnicalAnalysisSimple
 from advanced_patterns import AdvancedPatterns
 from candlestick_patterns import CandlestickPatterns
 from additional_indicators import AdditionalIndicators
+from bar_data import BarData
 from symbol_mapper import get_correct_symbol, determine_market_type, get_timeframe_config
 import pandas as pd
 from datetime import datetime
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# ملفات التحليل: المراحل المنفذة بالترتيب لكل ملف
+ANALYSIS_PROFILES = {
+    # للفحص والتنبيهات: التحليل الفني فقط بدون كشف النماذج
+    'fast': ['fetch', 'technical', 'recommendation'],
+    # لأمر /analyze: كل المراحل
+    'full': ['fetch', 'technical', 'advanced_patterns', 'candlestick_patterns',
+             'additional_indicators', 'recommendation']
+}
+
+# مراحل لا يمكن بناء توصية بدونها
+REQUIRED_STAGES = {'fetch', 'technical', 'recommendation'}
+
+# مجموعة خيوط لتشغيل المراحل بمهلة عند تحديد موعد نهائي
+STAGE_WORKERS = 4
+_stage_executor = None
+
+# مراحل تجاوزت مهلتها وما زالت تشغل خيطاً (المرحلة التي بدأت لا يمكن إيقافها)
+_stuck_lock = threading.Lock()
+_stuck_stages = {}  # future -> (المرحلة، وقت البدء time.monotonic)
+
+def _get_stage_executor():
+    global _stage_executor
+    if _stage_executor is None:
+        _stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="analysis-stage")
+    return _stage_executor
+
+def _stage_pool_saturated():
+    """كل خيوط المراحل مشغولة بمراحل عالقة؛ أي مرحلة جديدة ستنتظر في الطابور"""
+    with _stuck_lock:
+        return len(_stuck_stages) >= STAGE_WORKERS
+
+def _stuck_seconds(stage):
+    """أطول مدة تشغيل حالية لنسخة عالقة من المرحلة (0 إذا لم تكن عالقة)"""
+    now = time.monotonic()
+    with _stuck_lock:
+        return max((now - started for name, started in _stuck_stages.values() if name == stage), default=0.0)
 
 class RecommendationSystem:
     """نظام التوصيات المتكامل"""
@@ -14,63 +55,224 @@ class RecommendationSystem:
     def __init__(self):
         self.data_collector = DataCollector()
         
-    def analyze_symbol(self, symbol, market_type=None, timeframe="1h"):
-        """تحليل رمز معين وإخراج توصية شاملة"""
+        # مراحل التحليل المسماة؛ كل مرحلة تقرأ وتكتب في حالة التحليل
+        self.stages = {
+            'fetch': self._stage_fetch,
+            'technical': self._stage_technical,
+            'advanced_patterns': self._stage_advanced_patterns,
+            'candlestick_patterns': self._stage_candlestick_patterns,
+            'additional_indicators': self._stage_additional_indicators,
+            'recommendation': self._stage_recommendation
+        }
+        self.stage_stats = {}
+        self._stats_lock = threading.Lock()
+        
+    def analyze_symbol(self, symbol, market_type=None, timeframe="1h", data=None,
+                       profile="full", min_confidence=None, deadline=None, timeout=None):
+        """تحليل رمز معين وإخراج توصية شاملة
+        
+        data: بيانات محملة مسبقاً بدلاً من التحميل
+        profile: ملف المراحل ('fast' للفحص، 'full' للتحليل الكامل)
+        min_confidence: إذا كانت ثقة التحليل الفني أقل منها تُتخطى المراحل المكلفة
+        deadline / timeout: موعد نهائي (time.monotonic) أو مهلة بالثواني؛ المراحل الاختيارية
+            التي لا يتسع لها الوقت تُلغى وتُرجع توصية جزئية من المراحل المكتملة
+        """
+        if deadline is None and timeout is not None:
+            deadline = time.monotonic() + timeout
+        
         try:
-            # الحصول على إعدادات الفريم الزمني
-            timeframe_config = get_timeframe_config(timeframe)
-            period = timeframe_config['period']
-            interval = timeframe_config['interval']
-            
-            # تحديد نوع السوق إذا لم يكن محدداً
-            if market_type is None:
-                correct_symbol = get_correct_symbol(symbol)
-                market_type = determine_market_type(correct_symbol)
-            
-            # جمع البيانات
-            data = self.data_collector.get_data_by_type(symbol, market_type, period, interval)
-            
-            if data is None or data.empty:
-                return None
-            
-            # إجراء التحليل الفني الشامل
-            analyzer = TechnicalAnalysisSimple(data)
-            analysis_result = analyzer.comprehensive_analysis()
+            state = {
+                'symbol': symbol,
+                'market_type': market_type,
+                'timeframe': timeframe,
+                'data': data,
+                'bars': None,
+                'analysis': {},
+                'recommendation': {},
+                'timings': {},
+                'early_exit': False,
+                'skipped_stages': []
+            }
             
-            # إضافة التحليلات المتقدمة
-            try:
-                advanced_patterns = AdvancedPatterns(data)
-                patterns_result = advanced_patterns.analyze_all_patterns()
-                analysis_result['advanced_patterns'] = patterns_result
-            except Exception as e:
-                print(f"خطأ في تحليل النماذج المتقدمة: {e}")
-                analysis_result['advanced_patterns'] = {}
-            
-            try:
-                candlestick_analyzer = CandlestickPatterns(data)
-                candlestick_result = candlestick_analyzer.analyze_all_candlestick_patterns()
-                analysis_result['candlestick_patterns'] = candlestick_result
-            except Exception as e:
-                print(f"خطأ في تحليل الشموع اليابانية: {e}")
-                analysis_result['candlestick_patterns'] = {}
-            
-            try:
-                additional_indicators = AdditionalIndicators(data)
-                indicators_result = additional_indicators.analyze_all_additional_indicators()
-                analysis_result['additional_indicators'] = indicators_result
-            except Exception as e:
-                print(f"خطأ في المؤشرات الإضافية: {e}")
-                analysis_result['additional_indicators'] = {}
-            
-            # تحسين التوصية
-            recommendation = self.enhance_recommendation(analysis_result, symbol, market_type, timeframe)
+            for stage in ANALYSIS_PROFILES[profile]:
+                # الخروج المبكر: لا حاجة لكشف النماذج لرمز سيُستبعد
+                if state['early_exit'] and stage != 'recommendation':
+                    continue
+                
+                # مرحلة اختيارية يُتوقع أن تتجاوز الموعد النهائي، أو لن تجد خيطاً متاحاً، لا تبدأ أصلاً
+                if (deadline is not None and stage not in REQUIRED_STAGES
+                        and (_stage_pool_saturated()
+                             or self._expected_stage_seconds(stage) > deadline - time.monotonic())):
+                    state['skipped_stages'].append(stage)
+                    continue
+                
+                started = time.perf_counter()
+                try:
+                    proceed = self._run_stage(stage, state, deadline)
+                except FutureTimeoutError:
+                    if stage in REQUIRED_STAGES:
+                        print(f"⏱️ انتهت مهلة تحليل الرمز {symbol} في مرحلة {stage}")
+                        return None
+                    # زمنها الكامل يُسجل في الإحصائيات عند انتهائها فعلياً (_track_overrun)
+                    state['timings'][stage] = round((time.perf_counter() - started) * 1000, 1)
+                    state['skipped_stages'].append(stage)
+                    continue
+                self._record_stage_time(state, stage, time.perf_counter() - started)
+                
+                if proceed is False:
+                    return None
+                
+                if (stage == 'technical' and min_confidence is not None
+                        and state['analysis']['recommendation']['confidence'] < min_confidence):
+                    state['early_exit'] = True
             
+            recommendation = state['recommendation']
+            recommendation['profile'] = profile
+            recommendation['early_exit'] = state['early_exit']
+            recommendation['stage_timings'] = state['timings']
+            recommendation['partial'] = bool(state['skipped_stages'])
+            recommendation['skipped_stages'] = state['skipped_stages']
             return recommendation
             
         except Exception as e:
             print(f"خطأ في تحليل الرمز {symbol}: {e}")
             return None
     
+    def _run_stage(self, stage, state, deadline):
+        """تشغيل مرحلة؛ مع موعد نهائي تعمل في خيط منفصل وتُلغى نتيجتها عند تجاوزه"""
+        if deadline is None or stage == 'recommendation':
+            return self.stages[stage](state)
+        
+        # المرحلة تعمل على نسخة حتى لا تكتب مرحلة ملغاة في حالة التحليل بعد انتهاء المهلة
+        stage_state = dict(state)
+        if state['analysis']:
+            stage_state['analysis'] = dict(state['analysis'])
+        
+        started = {}
+        
+        def run():
+            started['at'] = time.monotonic()
+            return self.stages[stage](stage_state)
+        
+        future = _get_stage_executor().submit(run)
+        try:
+            proceed = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # مرحلة لم تبدأ تُلغى؛ مرحلة بدأت تبقى تعمل فتُتابع حتى تنتهي
+            if not future.cancel():
+                self._track_overrun(stage, future, started.get('at', time.monotonic()))
+            raise
+        
+        state.update({key: stage_state[key] for key in ('market_type', 'data', 'bars', 'analysis')})
+        return proceed
+    
+    def _track_overrun(self, stage, future, started):
+        """متابعة مرحلة تجاوزت مهلتها: تُحسب ضمن الخيوط العالقة حتى تنتهي ثم يُسجل زمنها الكامل"""
+        with _stuck_lock:
+            _stuck_stages[future] = (stage, started)
+        print(f"⏱️ المرحلة {stage} تجاوزت مهلتها وما زالت تعمل")
+        
+        def finished(_):
+            with _stuck_lock:
+                _stuck_stages.pop(future, None)
+            self._record_stage_stats(stage, round((time.monotonic() - started) * 1000, 1))
+        
+        future.add_done_callback(finished)
+    
+    def _expected_stage_seconds(self, stage):
+        """الزمن المتوقع للمرحلة من متوسط تشغيلاتها السابقة، ولا يقل عن مدة نسخة عالقة منها"""
+        stats = self.stage_stats.get(stage)
+        average = stats['total_ms'] / stats['runs'] / 1000 if stats else 0.0
+        return max(average, _stuck_seconds(stage))
+    
+    def _record_stage_time(self, state, stage, seconds):
+        """تسجيل زمن المرحلة في التحليل الحالي وفي الإحصائيات التراكمية"""
+        milliseconds = round(seconds * 1000, 1)
+        state['timings'][stage] = milliseconds
+        self._record_stage_stats(stage, milliseconds)
+    
+    def _record_stage_stats(self, stage, milliseconds):
+        """إضافة زمن تشغيل للإحصائيات التراكمية للمرحلة"""
+        with self._stats_lock:
+            stats = self.stage_stats.setdefault(stage, {'runs': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['runs'] += 1
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+    
+    def get_stage_stats(self):
+        """متوسط وأقصى زمن لكل مرحلة تحليل"""
+        return {
+            stage: {
+                'runs': stats['runs'],
+                'avg_ms': round(stats['total_ms'] / stats['runs'], 1),
+                'max_ms': stats['max_ms']
+            }
+            for stage, stats in self.stage_stats.items()
+        }
+    
+    def _stage_fetch(self, state):
+        """مرحلة جمع البيانات"""
+        # الحصول على إعدادات الفريم الزمني
+        timeframe_config = get_timeframe_config(state['timeframe'])
+        period = timeframe_config['period']
+        interval = timeframe_config['interval']
+        
+        # تحديد نوع السوق إذا لم يكن محدداً
+        if state['market_type'] is None:
+            correct_symbol = get_correct_symbol(state['symbol'])
+            state['market_type'] = determine_market_type(correct_symbol)
+        
+        # جمع البيانات
+        if state['data'] is None:
+            state['data'] = self.data_collector.get_data_by_type(
+                state['symbol'], state['market_type'], period, interval
+            )
+        
+        if state['data'] is None or state['data'].empty:
+            return False
+        
+        # حاوية شموع واحدة تتشاركها كل المحللات في المراحل التالية
+        state['bars'] = BarData.from_frame(state['data'])
+        return True
+    
+    def _stage_technical(self, state):
+        """مرحلة التحليل الفني الشامل"""
+        analyzer = TechnicalAnalysisSimple(state['bars'])
+        state['analysis'] = analyzer.comprehensive_analysis()
+    
+    def _stage_advanced_patterns(self, state):
+        """مرحلة النماذج الفنية المتقدمة"""
+        try:
+            advanced_patterns = AdvancedPatterns(state['bars'])
+            state['analysis']['advanced_patterns'] = advanced_patterns.analyze_all_patterns()
+        except Exception as e:
+            print(f"خطأ في تحليل النماذج المتقدمة: {e}")
+            state['analysis']['advanced_patterns'] = {}
+    
+    def _stage_candlestick_patterns(self, state):
+        """مرحلة الشموع اليابانية"""
+        try:
+            candlestick_analyzer = CandlestickPatterns(state['bars'])
+            state['analysis']['candlestick_patterns'] = candlestick_analyzer.analyze_all_candlestick_patterns()
+        except Exception as e:
+            print(f"خطأ في تحليل الشموع اليابانية: {e}")
+            state['analysis']['candlestick_patterns'] = {}
+    
+    def _stage_additional_indicators(self, state):
+        """مرحلة المؤشرات الإضافية"""
+        try:
+            additional_indicators = AdditionalIndicators(state['bars'])
+            state['analysis']['additional_indicators'] = additional_indicators.analyze_all_additional_indicators()
+        except Exception as e:
+            print(f"خطأ في المؤشرات الإضافية: {e}")
+            state['analysis']['additional_indicators'] = {}
+    
+    def _stage_recommendation(self, state):
+        """مرحلة تحسين التوصية"""
+        state['recommendation'] = self.enhance_recommendation(
+            state['analysis'], state['symbol'], state['market_type'], state['timeframe']
+        )
+    
     def enhance_recommendation(self, analysis_result, symbol, market_type, timeframe):
         """تحسين التوصية بإضافة معلومات إضافية"""
         recommendation = analysis_result['recommendation']
@@ -144,6 +346,11 @@ class RecommendationSystem:
         market_type = recommendation.get('market_type', 'غير محدد')
         timeframe = recommendation.get('timeframe', '1h')
         
+        # تنبيه التحليل الجزئي عند تجاوز المهلة
+        partial_info = ""
+        if recommendation.get('partial'):
+            partial_info = "\n⚠️ *تحليل جزئي: تم تخطي بعض التحليلات المتقدمة لتجاوز المهلة*\n"
+        
         # تحديد نوع السوق بالعربية
         market_types_ar = {
             'forex': 'فوركس',
@@ -212,7 +419,7 @@ class RecommendationSystem:
 • نسبة النجاح المتوقعة: {success_rate}%
 • نسبة المخاطر/المكافأة: 1:{risk_reward:.1f}
 • الزمن المتوقع: {expected_time}{patterns_info}{candlestick_info}
-
+{partial_info}
 **⏰ وقت التحليل:** {recommendation.get('timestamp', 'غير محدد')}
 
 ━━━━━━━━━━━━━━━━━━━━━━━
@@ -230,7 +437,7 @@ class RecommendationSystem:
             symbol = config.get('symbol')
             market_type = config.get('market_type', 'forex')
             
-            rec = self.analyze_symbol(symbol, market_type)
+            rec = self.analyze_symbol(symbol, market_type, profile="fast")
             if rec:
                 recommendations.append(rec)
         
@@ -254,7 +461,7 @@ class RecommendationSystem:
         }
         
         for pair in major_pairs:
-            rec = self.analyze_symbol(pair['symbol'], pair['market_type'])
+            rec = self.analyze_symbol(pair['symbol'], pair['market_type'], profile="fast")
             if rec:
                 overview['recommendations'].append(rec)
                 
@@ -265,4 +472,17 @@ class RecommendationSystem:
                 else:
                     overview['neutral'] += 1
         
-        return overview
\ No newline at end of file
+        return overview
+
+
+# نظام توصيات خاص بكل عملية عاملة عند تشغيل التحليل في مجموعة عمليات
+_process_recommendation_system = None
+
+def analyze_preloaded(symbol, timeframe, data, market_type=None, profile="full", min_confidence=None):
+    """تحليل بيانات محملة مسبقاً؛ دالة على مستوى الوحدة لتُرسل لمجموعة العمليات"""
+    global _process_recommendation_system
+    if _process_recommendation_system is None:
+        _process_recommendation_system = RecommendationSystem()
+    return _process_recommendation_system.analyze_symbol(
+        symbol, market_type, timeframe, data=data, profile=profile, min_confidence=min_confidence
+    )
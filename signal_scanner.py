@@ -0,0 +1,149 @@
+"""
+ماسح الإشارات لكامل قائمة الرموز بمجموعة عمال وميزانية زمنية لكل دورة
+"""
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class SignalScanner:
+    """يفحص جميع الرموز في كل دورة، والرموز التي لا تتسع لها الميزانية تتقدم للدورة التالية"""
+
+    def __init__(self, scan_function: Callable, max_workers: int = 8, cycle_budget: float = 120,
+                 history_size: int = 50):
+        self.scan_function = scan_function
+        self.max_workers = max_workers
+        self.cycle_budget = cycle_budget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="signal-scan")
+        self.pending = deque()  # رموز لم تُفحص في الدورة السابقة
+        self.in_flight = {}     # رمز -> فحص تجاوز ميزانية دورته وما زال يعمل (لا يُعاد إرساله)
+        self.cycle_count = 0
+        self.last_stats = {}
+        self.stats_history = deque(maxlen=history_size)
+
+    def _cycle_order(self, universe: List[str]) -> List[str]:
+        """ترتيب الدورة: الرموز المؤجلة أولاً ثم باقي القائمة"""
+        universe_set = set(universe)
+        order = [symbol for symbol in self.pending if symbol in universe_set]
+        seen = set(order)
+        order.extend(symbol for symbol in universe if symbol not in seen)
+        return order
+
+    def run_cycle(self, universe: List[str], budget: Optional[float] = None,
+                  scan_function: Optional[Callable] = None) -> List[Dict]:
+        """تشغيل دورة فحص واحدة وإرجاع الإشارات المكتشفة"""
+        budget = self.cycle_budget if budget is None else budget
+        scan_function = scan_function or self.scan_function
+        order = self._cycle_order(list(dict.fromkeys(universe)))
+        self.cycle_count += 1
+
+        started = time.monotonic()
+        deadline = started + budget
+
+        signals = []
+        latencies = []
+        errors = 0
+        scanned = set()
+
+        def collect(future, symbol):
+            nonlocal errors
+            try:
+                signal, latency = future.result()
+                latencies.append(latency)
+                if signal:
+                    signals.append(signal)
+            except Exception as e:
+                errors += 1
+                print(f"خطأ في فحص الرمز {symbol}: {e}")
+
+        # نتائج الفحوص المتأخرة من الدورة السابقة تُجمع بدلاً من إعادة فحص رموزها
+        for symbol, future in list(self.in_flight.items()):
+            if future.done():
+                del self.in_flight[symbol]
+                scanned.add(symbol)
+                collect(future, symbol)
+
+        futures = {}
+        for symbol in order:
+            if symbol not in scanned and symbol not in self.in_flight:
+                futures[self.executor.submit(self._timed_scan, scan_function, symbol)] = symbol
+
+        not_done = set(futures)
+        while not_done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            done, not_done = wait(not_done, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol = futures[future]
+                scanned.add(symbol)
+                collect(future, symbol)
+
+        # إلغاء ما لم يبدأ؛ ما بدأ لا يمكن إيقافه فيبقى قيد التنفيذ وتُجمع نتيجته في الدورة التالية
+        for future in not_done:
+            if not future.cancel():
+                self.in_flight[futures[future]] = future
+        self.pending = deque(symbol for symbol in order if symbol not in scanned)
+
+        duration = time.monotonic() - started
+        self.last_stats = self._build_stats(order, scanned, signals, errors, latencies, duration, budget)
+        self.stats_history.append(self.last_stats)
+
+        print(f"🔎 دورة الفحص {self.cycle_count}: {len(scanned)}/{len(order)} رمز "
+              f"({self.last_stats['coverage']}%) خلال {duration:.1f} ثانية - "
+              f"{len(signals)} إشارة، {len(self.pending)} مؤجل")
+
+        return signals
+
+    def _timed_scan(self, scan_function: Callable, symbol: str):
+        """فحص رمز واحد مع قياس زمن الاستجابة"""
+        started = time.monotonic()
+        signal = scan_function(symbol)
+        return signal, time.monotonic() - started
+
+    def _build_stats(self, order, scanned, signals, errors, latencies, duration, budget) -> Dict:
+        """بناء إحصائيات التغطية وزمن الاستجابة للدورة"""
+        latency_array = np.array(latencies) if latencies else np.zeros(1)
+
+        return {
+            'cycle': self.cycle_count,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'universe_size': len(order),
+            'scanned': len(scanned),
+            'coverage': round(len(scanned) / len(order) * 100, 1) if order else 100.0,
+            'deferred': len(self.pending),
+            'signals': len(signals),
+            'errors': errors,
+            'duration': round(duration, 2),
+            'budget': budget,
+            'latency_avg': round(float(latency_array.mean()), 3),
+            'latency_p50': round(float(np.percentile(latency_array, 50)), 3),
+            'latency_p95': round(float(np.percentile(latency_array, 95)), 3),
+            'latency_max': round(float(latency_array.max()), 3)
+        }
+
+    def get_stats(self) -> Dict:
+        """إحصائيات آخر دورة مع متوسط التغطية عبر الدورات المحفوظة"""
+        if not self.stats_history:
+            return {}
+
+        stats = dict(self.last_stats)
+        stats['avg_coverage'] = round(
+            sum(s['coverage'] for s in self.stats_history) / len(self.stats_history), 1
+        )
+        stats['cycles_tracked'] = len(self.stats_history)
+        return stats
+
+    def shutdown(self):
+        """إيقاف مجموعة العمال"""
+        # cancel_futures غير متوفر في Python 3.8، والدورات تلغي ما لم يبدأ بنفسها
+        for future in self.in_flight.values():
+            future.cancel()
+        self.in_flight.clear()
+        self.executor.shutdown(wait=False)
@@ -2,6 +2,8 @@
 خريطة رموز التداول المدعومة في yfinance
 """
 
+from functools import lru_cache
+
 # خريطة الرموز المالية
 SYMBOL_MAPPING = {
     # الذهب
@@ -282,25 +284,13 @@ SYMBOL_MAPPING = {
     'PEG-PA': 'PEG-PA',  # Public Service Enterprise Group Preferred A
 }
 
-def get_correct_symbol(symbol):
-    """
-    تحويل الرمز إلى الرمز الصحيح المدعوم في yfinance
-    """
-    symbol = symbol.upper().strip()
-    
-    # إزالة العلامات الخاصة
-    symbol = symbol.replace('$', '')
-    
-    # البحث في خريطة الرموز
-    if symbol in SYMBOL_MAPPING:
-        return SYMBOL_MAPPING[symbol]
-    
-    # إذا لم يجد الرمز، إرجاع الرمز الأصلي
-    return symbol
+def _normalize_symbol(symbol):
+    """توحيد كتابة الرمز: أحرف كبيرة بدون مسافات أو علامة $"""
+    return symbol.upper().strip().replace('$', '')
 
-def determine_market_type(symbol):
+def _classify_market_type(symbol):
     """
-    تحديد نوع السوق بناءً على الرمز
+    تحديد نوع السوق بفحص أجزاء الرمز (للرموز غير الموجودة في السجل)
     """
     symbol = symbol.upper()
     
@@ -324,6 +314,130 @@ def determine_market_type(symbol):
     else:
         return 'stock'
 
+def _classify_pip_size(symbol):
+    """
+    حجم النقطة حسب الرمز (نفس قواعد calculate_pip_value في نظام التداول)
+    """
+    symbol_upper = symbol.upper()
+    
+    # أزواج الين اليابانية
+    if 'JPY' in symbol_upper:
+        return 0.01
+    # أزواج العملات العادية
+    elif any(curr in symbol_upper for curr in ['USD', 'EUR', 'GBP', 'CHF', 'AUD', 'CAD', 'NZD']):
+        return 0.0001
+    # المعادن
+    elif symbol_upper in ['GC=F', 'GOLD', 'XAUUSD']:  # الذهب
+        return 0.1
+    elif symbol_upper in ['SI=F', 'SILVER', 'XAGUSD']:  # الفضة
+        return 0.001
+    # النفط
+    elif symbol_upper in ['CL=F', 'BZ=F']:
+        return 0.01
+    # المؤشرات
+    elif symbol_upper.startswith('^') or 'INDEX' in symbol_upper:
+        return 1.0
+    # العملات الرقمية
+    elif '-USD' in symbol_upper or 'USDT' in symbol_upper:
+        if 'BTC' in symbol_upper:
+            return 1.0
+        elif 'ETH' in symbol_upper:
+            return 0.1
+        else:
+            return 0.0001
+    else:
+        return 0.0001  # افتراضي
+
+# منازل الأسعار العشرية حسب حجم النقطة
+PRICE_DECIMALS = {0.0001: 5, 0.001: 4, 0.01: 3, 0.1: 2, 1.0: 2}
+
+# تقويم الجلسات للمؤشرات حسب البورصة
+INDEX_SESSIONS = {
+    '^DJI': 'us', '^GSPC': 'us', '^IXIC': 'us',
+    '^GDAXI': 'xetra', '^FTSE': 'lse', '^FCHI': 'euronext',
+    '^N225': 'tse', '^HSI': 'hkex'
+}
+
+# تقويم الجلسات للأسهم حسب لاحقة البورصة في yfinance
+STOCK_SUFFIX_SESSIONS = {
+    '.L': 'lse', '.DE': 'xetra', '.PA': 'euronext', '.AS': 'euronext',
+    '.T': 'tse', '.HK': 'hkex'
+}
+
+def _session_calendar(ticker, market_type):
+    """اسم تقويم جلسات التداول للرمز"""
+    if market_type in ('crypto', 'forex'):
+        return market_type
+    if market_type == 'commodity':
+        return 'cme'
+    if market_type == 'index':
+        return INDEX_SESSIONS.get(ticker, 'us')
+    for suffix, calendar in STOCK_SUFFIX_SESSIONS.items():
+        if ticker.endswith(suffix):
+            return calendar
+    return 'us'
+
+def _symbol_info(ticker):
+    """بيانات الرمز الكاملة من رمز المزود"""
+    market_type = _classify_market_type(ticker)
+    pip_size = _classify_pip_size(ticker)
+    return {
+        'ticker': ticker,
+        'market_type': market_type,
+        'pip_size': pip_size,
+        'decimals': PRICE_DECIMALS.get(pip_size, 5),
+        'session': _session_calendar(ticker, market_type)
+    }
+
+def _build_registry():
+    """سجل الرموز: كل رمز معروف (الاسم المختصر ورمز المزود) -> بياناته"""
+    by_ticker = {ticker: _symbol_info(ticker) for ticker in dict.fromkeys(SYMBOL_MAPPING.values())}
+    registry = dict(by_ticker)
+    for alias, ticker in SYMBOL_MAPPING.items():
+        registry[_normalize_symbol(alias)] = by_ticker[ticker]
+    return registry
+
+# يُبنى مرة واحدة عند الاستيراد
+SYMBOL_REGISTRY = _build_registry()
+
+@lru_cache(maxsize=4096)
+def _unknown_symbol_info(symbol):
+    """تصنيف الرموز غير المعروفة مرة واحدة لكل رمز"""
+    return _symbol_info(symbol)
+
+def get_symbol_info(symbol):
+    """
+    بيانات الرمز (رمز المزود، نوع السوق، حجم النقطة، المنازل العشرية، تقويم الجلسات) ببحث واحد
+    """
+    info = SYMBOL_REGISTRY.get(symbol)
+    if info is not None:
+        return info
+    
+    symbol = _normalize_symbol(symbol)
+    info = SYMBOL_REGISTRY.get(symbol)
+    if info is not None:
+        return info
+    return _unknown_symbol_info(symbol)
+
+def get_correct_symbol(symbol):
+    """
+    تحويل الرمز إلى الرمز الصحيح المدعوم في yfinance
+    """
+    # الرموز غير الموجودة في الخريطة تُرجع كما هي بعد التوحيد
+    return get_symbol_info(symbol)['ticker']
+
+def determine_market_type(symbol):
+    """
+    تحديد نوع السوق بناءً على الرمز
+    """
+    return get_symbol_info(symbol)['market_type']
+
+def get_pip_size(symbol):
+    """
+    حجم النقطة للرمز
+    """
+    return get_symbol_info(symbol)['pip_size']
+
 # الفريمات الزمنية المدعومة
 TIMEFRAMES = {
     '1m': {'period': '1d', 'interval': '1m', 'name': 'دقيقة واحدة'},
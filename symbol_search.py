@@ -0,0 +1,162 @@
+"""
+بحث الرموز المتسامح مع الأخطاء: فهرس حذف أحرف (SymSpell) فوق خريطة الرموز للتصحيح والاقتراح قبل أي طلب شبكة
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from symbol_mapper import SYMBOL_MAPPING
+
+# أسماء شائعة يكتبها المستخدمون بدل الرمز
+SYMBOL_NAMES = {
+    'BITCOIN': 'BTC', 'ETHEREUM': 'ETH', 'SOLANA': 'SOL', 'RIPPLE': 'XRP',
+    'CARDANO': 'ADA', 'DOGECOIN': 'DOGE', 'LITECOIN': 'LTC', 'POLKADOT': 'DOT',
+    'APPLE': 'AAPL', 'MICROSOFT': 'MSFT', 'GOOGLE': 'GOOGL', 'AMAZON': 'AMZN',
+    'TESLA': 'TSLA', 'NVIDIA': 'NVDA', 'NETFLIX': 'NFLX', 'DOWJONES': 'US30',
+    'ذهب': 'GOLD', 'الذهب': 'GOLD', 'فضة': 'SILVER', 'الفضة': 'SILVER',
+    'نفط': 'OIL', 'النفط': 'OIL', 'بيتكوين': 'BTC', 'البيتكوين': 'BTC',
+    'ايثريوم': 'ETH', 'إيثريوم': 'ETH', 'داكس': 'DAX', 'ناسداك': 'NASDAQ'
+}
+
+
+def normalize_query(text: str) -> str:
+    """توحيد النص للمطابقة: أحرف كبيرة وأرقام فقط (EUR/USD و eurusd متطابقان)"""
+    return ''.join(ch for ch in text.upper() if ch.isalnum())
+
+
+def _deletes(text: str, max_distance: int) -> set:
+    """كل النصوص الناتجة عن حذف حتى max_distance حرف (بما فيها النص نفسه)"""
+    variants = {text}
+    frontier = {text}
+    for _ in range(max_distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier if len(word) > 1 for i in range(len(word))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """مسافة التحرير مع تبديل حرفين متجاورين؛ تتوقف مبكراً إذا تجاوزت limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = []  # الصف قبل السابق، يُستخدم من الصف الثاني فصاعداً
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymbolSearchIndex:
+    """فهرس الحذف: نصان بينهما مسافة تحرير <= d يشتركان في نص ناتج عن حذف d حرف على الأكثر،
+    فالمرشحون يُجمعون ببحث في قاموس ثم تُحسب المسافة الدقيقة لهم فقط"""
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self.entries: Dict[str, str] = {}           # النص الموحد -> الرمز المعروض
+        self.postings: Dict[str, List[str]] = defaultdict(list)
+        self._build()
+
+    def _build(self):
+        """بناء الفهرس مرة واحدة من خريطة الرموز والأسماء الشائعة"""
+        # رموز المزود أولاً ثم الأسماء المختصرة حتى تُفضل عند التطابق
+        for ticker in dict.fromkeys(SYMBOL_MAPPING.values()):
+            self.entries.setdefault(normalize_query(ticker), ticker)
+        for alias in SYMBOL_MAPPING:
+            self.entries[normalize_query(alias)] = alias
+        for name, alias in SYMBOL_NAMES.items():
+            if alias in SYMBOL_MAPPING:
+                self.entries.setdefault(normalize_query(name), alias)
+
+        for key in self.entries:
+            for variant in _deletes(key, self.max_distance):
+                self.postings[variant].append(key)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """أقرب الرموز للنص: قائمة (الرمز، المسافة) مرتبة"""
+        key = normalize_query(query)
+        if not key:
+            return []
+        if key in self.entries:
+            return [(self.entries[key], 0)]
+
+        # الرموز القصيرة تتحمل خطأ حرف واحد فقط وإلا تشابهت مع رموز كثيرة
+        max_distance = 1 if len(key) <= 4 else self.max_distance
+
+        candidates = set()
+        for variant in _deletes(key, max_distance):
+            candidates.update(self.postings.get(variant, ()))
+
+        scored = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                # عند تساوي المسافة يُفضل الاسم المختصر ثم الأقرب طولاً ثم الترتيب الأبجدي
+                is_ticker = self.entries[candidate] not in SYMBOL_MAPPING
+                scored.append((distance, is_ticker, abs(len(candidate) - len(key)), candidate))
+
+        scored.sort()
+        results = []
+        seen = set()
+        for distance, _, _, candidate in scored:
+            symbol = self.entries[candidate]
+            # الاسم المختصر ورمز المزود لنفس الأداة اقتراح واحد
+            ticker = SYMBOL_MAPPING.get(symbol, symbol)
+            if ticker not in seen:
+                seen.add(ticker)
+                results.append((symbol, distance))
+            if len(results) >= limit:
+                break
+        return results
+
+    def resolve(self, query: str) -> Dict:
+        """تحديد الرمز المقصود:
+        symbol: الرمز المستخدم
+        corrected: تم التصحيح تلقائياً
+        suggestions: اقتراحات تُعرض إذا لم تتوفر بيانات للرمز كما كُتب
+
+        البادئة = تفرض الرمز كما كُتب بدون تصحيح (مثلاً =BA).
+        """
+        query = query.strip()
+        if query.startswith('='):
+            return {'symbol': query[1:].strip().upper(), 'corrected': False, 'suggestions': []}
+
+        matches = self.search(query)
+
+        if matches and matches[0][1] == 0:
+            return {'symbol': matches[0][0], 'corrected': normalize_query(query) != normalize_query(matches[0][0]),
+                    'suggestions': []}
+
+        # تصحيح تلقائي فقط لخطأ حرف واحد بمرشح وحيد في نص غير قصير
+        if (matches and matches[0][1] == 1 and len(normalize_query(query)) >= 4
+                and (len(matches) == 1 or matches[1][1] > 1)):
+            return {'symbol': matches[0][0], 'corrected': True, 'suggestions': []}
+
+        # رمز غير موجود في الخريطة قد يكون رمزاً حقيقياً لدى المزود (BA، GE، SPY):
+        # يُمرر كما هو والاقتراحات تُعرض فقط إذا لم تتوفر بياناته
+        return {'symbol': query.upper(), 'corrected': False, 'suggestions': [symbol for symbol, _ in matches]}
+
+
+# الفهرس المشترك (يُبنى عند الاستيراد)
+symbol_index = SymbolSearchIndex()
+
+
+@lru_cache(maxsize=2048)
+def _cached_resolve(query: str) -> Tuple[Optional[str], bool, Tuple[str, ...]]:
+    result = symbol_index.resolve(query)
+    return result['symbol'], result['corrected'], tuple(result['suggestions'])
+
+
+def resolve_symbol(query: str) -> Dict:
+    """تحديد الرمز المقصود مع حفظ النتيجة للاستعلامات المتكررة"""
+    symbol, corrected, suggestions = _cached_resolve(query)
+    return {'symbol': symbol, 'corrected': corrected, 'suggestions': list(suggestions)}
@@ -0,0 +1,146 @@
+"""
+طبقة تفريغ المهام: تشغيل التحليل والتحميل المتزامن خارج حلقة الأحداث
+بمجموعات عمال محدودة ومهلة لكل مهمة وإمكانية الإلغاء
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class TaskOffloader:
+    """مجموعة خيوط لمهام الشبكة والإدخال/الإخراج، ومجموعة عمليات لمهام المعالجة الثقيلة"""
+
+    def __init__(self, io_workers: int = 8, cpu_workers: Optional[int] = None, default_timeout: float = 60):
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or min(4, os.cpu_count() or 1)
+        self.default_timeout = default_timeout
+
+        self.thread_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="offload-io")
+        self.process_pool = None  # تُنشأ عند أول استخدام
+        self._process_pool_failed = False
+        self._lock = threading.Lock()
+        # حد المهام الجارية لكل حلقة أحداث حتى لا تتكدس الطوابير
+        self._semaphores = {}
+        # المهام المرسلة للمنفذين ولم تنته بعد (لإلغاء المنتظر منها عند الإيقاف)
+        self._pending = set()
+
+        self.stats = {'submitted': 0, 'completed': 0, 'timeouts': 0, 'errors': 0, 'cancelled': 0}
+
+    def _semaphore(self, kind: str) -> asyncio.Semaphore:
+        """إشارة الحد لكل حلقة أحداث ونوع مهمة"""
+        key = (id(asyncio.get_running_loop()), kind)
+        with self._lock:
+            if key not in self._semaphores:
+                limit = self.io_workers if kind == 'io' else self.cpu_workers
+                self._semaphores[key] = asyncio.Semaphore(limit)
+            return self._semaphores[key]
+
+    def _get_process_pool(self) -> Optional[ProcessPoolExecutor]:
+        """مجموعة العمليات، أو None إذا تعذر إنشاؤها"""
+        if self._process_pool_failed:
+            return None
+        with self._lock:
+            if self.process_pool is None:
+                try:
+                    # spawn: العمليات لا ترث خيوط وأقفال العملية الأم (fork مع الخيوط قد يعلق)
+                    self.process_pool = ProcessPoolExecutor(
+                        max_workers=self.cpu_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                except Exception as e:
+                    print(f"⚠️ تعذر إنشاء مجموعة العمليات، سيتم استخدام الخيوط: {e}")
+                    self._process_pool_failed = True
+                    return None
+            return self.process_pool
+
+    async def _run(self, kind: str, executor, fn: Callable, args, kwargs, timeout: Optional[float]):
+        """تشغيل دالة في المنفذ مع المهلة والإلغاء"""
+        timeout = self.default_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+
+        semaphore = self._semaphore(kind)
+        await semaphore.acquire()
+        try:
+            task = executor.submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            semaphore.release()
+            raise
+        self.stats['submitted'] += 1
+        self._pending.add(task)
+
+        def finished(_):
+            # الخانة تُحرر عند انتهاء العامل فعلياً لا عند انتهاء المهلة،
+            # فالمهام المتأخرة التي ما زالت تعمل تبقى محسوبة ضمن الحد
+            self._pending.discard(task)
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                pass  # الحلقة أُغلقت
+
+        task.add_done_callback(finished)
+
+        future = asyncio.wrap_future(task, loop=loop)
+        try:
+            result = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # مهمة بدأت لا يمكن إيقافها، لكن النتيجة تُهمل ولا تعطل الحلقة
+            self.stats['timeouts'] += 1
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            self.stats['cancelled'] += 1
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+        self.stats['completed'] += 1
+        return result
+
+    async def run_io(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """تشغيل دالة متزامنة (شبكة/ملفات) في مجموعة الخيوط"""
+        return await self._run('io', self.thread_pool, fn, args, kwargs, timeout)
+
+    async def run_cpu(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """تشغيل دالة معالجة ثقيلة في مجموعة العمليات (الدالة والوسائط يجب أن تكون قابلة للتسلسل)"""
+        pool = self._get_process_pool()
+        if pool is None:
+            return await self.run_io(fn, *args, timeout=timeout, **kwargs)
+
+        try:
+            return await self._run('cpu', pool, fn, args, kwargs, timeout)
+        except BrokenProcessPool as e:
+            print(f"⚠️ توقفت مجموعة العمليات، التحويل إلى الخيوط: {e}")
+            self._process_pool_failed = True
+            return await self.run_io(fn, *args, timeout=timeout, **kwargs)
+
+    async def map(self, fn: Callable, items: Iterable, kind: str = 'io',
+                  timeout: Optional[float] = None) -> List:
+        """تشغيل الدالة على عدة عناصر بالتوازي؛ العنصر الفاشل أو المتأخر نتيجته استثناء"""
+        runner = self.run_io if kind == 'io' else self.run_cpu
+        return await asyncio.gather(
+            *(runner(fn, item, timeout=timeout) for item in items),
+            return_exceptions=True
+        )
+
+    def get_stats(self) -> Dict:
+        """إحصائيات المهام المفرغة"""
+        return dict(self.stats)
+
+    def shutdown(self):
+        """إيقاف مجموعات العمال وإلغاء المهام التي لم تبدأ (cancel_futures غير متاح في Python 3.8)"""
+        for task in list(self._pending):
+            task.cancel()
+        self.thread_pool.shutdown(wait=False)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False)
+
+
+# طبقة التفريغ المشتركة لحلقات التداول
+offloader = TaskOffloader()
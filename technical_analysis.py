@@ -2,16 +2,21 @@ import numpy as np
 import pandas as pd
 # import talib  # سنستخدم حسابات مخصصة بدلاً منها
 
+from bar_data import as_bars
+
 class TechnicalAnalysis:
     """محرك التحليل الفني المتكامل - يغطي المحاور السبعة"""
     
     def __init__(self, data):
-        self.data = data
-        self.high = data['High'].values
-        self.low = data['Low'].values
-        self.close = data['Close'].values
-        self.open = data['Open'].values
-        self.volume = data['Volume'].values if 'Volume' in data.columns else None
+        # data: حاوية BarData مشتركة أو DataFrame
+        bars = as_bars(data)
+        self.bars = bars
+        self.data = bars.frame
+        self.high = bars.high
+        self.low = bars.low
+        self.close = bars.close
+        self.open = bars.open
+        self.volume = bars.volume
         
     # المحور الأول: مدارس الاتجاه والسلوك السعري
     def trend_and_price_action_analysis(self):
@@ -78,27 +83,37 @@ class TechnicalAnalysis:
         except:
             return {"signal": "محايد", "strength": 50, "description": "بيانات غير كافية"}
     
+    def swing_levels(self):
+        """مستويات المقاومة والدعم: الشمعة تقارن بالعشر قبلها والتسع بعدها عبر نوافذ منزلقة"""
+        if len(self.close) <= 20:
+            return np.empty(0), np.empty(0)
+        
+        windows = np.lib.stride_tricks.sliding_window_view
+        candidates = np.arange(10, len(self.close) - 10)
+        
+        # مستويات المقاومة
+        high = self.high[candidates]
+        is_resistance = (high > windows(self.high, 10).max(axis=1)[candidates - 10]) & \
+                        (high > windows(self.high, 9).max(axis=1)[candidates + 1])
+        
+        # مستويات الدعم
+        low = self.low[candidates]
+        is_support = (low < windows(self.low, 10).min(axis=1)[candidates - 10]) & \
+                     (low < windows(self.low, 9).min(axis=1)[candidates + 1])
+        
+        return high[is_resistance], low[is_support]
+    
     def supply_demand_zones(self):
         """تحليل مناطق العرض والطلب"""
         try:
             # تحديد مناطق الدعم والمقاومة
-            resistance_levels = []
-            support_levels = []
-            
-            for i in range(10, len(self.close) - 10):
-                # مستوى مقاومة
-                if (self.high[i] > max(self.high[i-10:i]) and 
-                    self.high[i] > max(self.high[i+1:i+10])):
-                    resistance_levels.append(self.high[i])
-                
-                # مستوى دعم
-                if (self.low[i] < min(self.low[i-10:i]) and 
-                    self.low[i] < min(self.low[i+1:i+10])):
-                    support_levels.append(self.low[i])
+            resistance_levels, support_levels = self.swing_levels()
             
             current_price = self.close[-1]
-            nearest_resistance = min([r for r in resistance_levels if r > current_price], default=None)
-            nearest_support = max([s for s in support_levels if s < current_price], default=None)
+            above = resistance_levels[resistance_levels > current_price]
+            below = support_levels[support_levels < current_price]
+            nearest_resistance = above.min() if len(above) else None
+            nearest_support = below.max() if len(below) else None
             
             if nearest_resistance and (nearest_resistance - current_price) / current_price < 0.01:
                 return {"signal": "بيع", "strength": 65, "description": f"اقتراب من مقاومة {nearest_resistance:.4f}"}
@@ -2,16 +2,95 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Any
 
+from bar_data import as_bars
+
 class TechnicalAnalysisSimple:
     """محرك التحليل الفني المبسط - يغطي المحاور السبعة بدون مكتبات معقدة"""
     
+    # رسم اعتماديات التحليل: اسم العقدة -> (العقد التي تعتمد عليها، دالة الحساب)
+    # كل عقدة تُحسب عند طلبها فقط ومرة واحدة لكل محلل
+    ANALYSIS_GRAPH = {
+        # المؤشرات
+        'sma_10': ((), lambda self: self.simple_moving_average(self.close, 10)),
+        'sma_20': ((), lambda self: self.simple_moving_average(self.close, 20)),
+        'sma_50': ((), lambda self: self.simple_moving_average(self.close, 50)),
+        'rsi': ((), lambda self: self.rsi()),
+        'macd': ((), lambda self: self.macd()),
+        'bollinger': ((), lambda self: self.bollinger_bands()),
+        'stochastic': ((), lambda self: self.stochastic()),
+        'obv': ((), lambda self: self.calculate_obv() if self.volume is not None else None),
+        'mfi': ((), lambda self: self.money_flow_index()),
+        'fibonacci_levels': ((), lambda self: self.fibonacci_levels()),
+        'pivot_points': ((), lambda self: self.pivot_points()),
+        'atr': ((), lambda self: self.average_true_range()),
+        
+        # المحاور السبعة
+        'trend_analysis': (('sma_10', 'sma_20', 'sma_50'), lambda self: self.trend_analysis()),
+        'fibonacci_analysis': (('fibonacci_levels',), lambda self: self.fibonacci_analysis()),
+        'volume_analysis': (('obv',), lambda self: self.volume_analysis()),
+        'patterns_analysis': ((), lambda self: self.patterns_analysis()),
+        'indicators_analysis': (('rsi', 'macd', 'bollinger'), lambda self: self.indicators_analysis()),
+        'money_flow_analysis': (('mfi',), lambda self: self.money_flow_analysis()),
+        'professional_tools': (('pivot_points', 'atr'), lambda self: self.professional_tools_analysis()),
+        
+        # التجميع والتوصية
+        'analysis': (
+            ('trend_analysis', 'fibonacci_analysis', 'volume_analysis', 'patterns_analysis',
+             'indicators_analysis', 'money_flow_analysis', 'professional_tools'),
+            lambda self: {
+                name: self.get(name) for name in TechnicalAnalysisSimple.ANALYSIS_GRAPH['analysis'][0]
+            }
+        ),
+        'recommendation': (('analysis',), lambda self: self.calculate_final_recommendation(self.get('analysis'))),
+    }
+    
     def __init__(self, data):
-        self.data = data
-        self.high = data['High'].values
-        self.low = data['Low'].values
-        self.close = data['Close'].values
-        self.open = data['Open'].values
-        self.volume = data['Volume'].values if 'Volume' in data.columns else None
+        # data: حاوية BarData مشتركة أو DataFrame
+        bars = as_bars(data)
+        self.bars = bars
+        self.data = bars.frame
+        self.high = bars.high
+        self.low = bars.low
+        self.close = bars.close
+        self.open = bars.open
+        self.volume = bars.volume
+        self._results = {}
+        self._resolving = set()
+    
+    def get(self, name):
+        """قيمة عقدة من رسم التحليل (تُحسب اعتمادياتها أولاً ثم تُحفظ)"""
+        if name in self._results:
+            return self._results[name]
+        if name not in self.ANALYSIS_GRAPH:
+            raise KeyError(f"عقدة تحليل غير معروفة: {name}")
+        if name in self._resolving:
+            raise ValueError(f"اعتمادية دائرية في رسم التحليل عند {name}")
+        
+        dependencies, compute = self.ANALYSIS_GRAPH[name]
+        self._resolving.add(name)
+        try:
+            for dependency in dependencies:
+                self.get(dependency)
+            self._results[name] = compute(self)
+        finally:
+            self._resolving.discard(name)
+        return self._results[name]
+    
+    def evaluate(self, *names):
+        """حساب العقد المطلوبة فقط: evaluate('rsi') لا يحسب فيبوناتشي أو Pivot أو MFI"""
+        return {name: self.get(name) for name in names}
+    
+    @classmethod
+    def required_nodes(cls, *names):
+        """كل العقد التي يحتاجها حساب العقد المطلوبة"""
+        required = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(cls.ANALYSIS_GRAPH[name][0])
+        return required
         
     def simple_moving_average(self, values, period):
         """حساب المتوسط المتحرك البسيط"""
@@ -43,49 +122,28 @@ class TechnicalAnalysisSimple:
         lower_band = sma - (std * std_dev)
         return upper_band.values, sma.values, lower_band.values
     
+    def stochastic(self, period=14):
+        """حساب Stochastic %K"""
+        low_min = pd.Series(self.low).rolling(window=period).min()
+        high_max = pd.Series(self.high).rolling(window=period).max()
+        k_percent = 100 * ((pd.Series(self.close) - low_min) / (high_max - low_min))
+        return k_percent.values
+    
     def calculate_obv(self):
         """حساب On Balance Volume"""
-        obv = [0]
-        for i in range(1, len(self.close)):
-            if self.close[i] > self.close[i-1]:
-                obv.append(obv[-1] + self.volume[i])
-            elif self.close[i] < self.close[i-1]:
-                obv.append(obv[-1] - self.volume[i])
-            else:
-                obv.append(obv[-1])
-        return np.array(obv)
+        # الحجم بإشارة اتجاه الإغلاق ثم مجموع تراكمي (الشمعة الأولى صفر)
+        direction = np.sign(np.diff(self.close))
+        signed_volume = np.zeros(len(self.close))
+        signed_volume[1:] = np.where(direction > 0, self.volume[1:], np.where(direction < 0, -self.volume[1:], 0.0))
+        return np.cumsum(signed_volume)
     
     def comprehensive_analysis(self):
         """التحليل الشامل للمحاور السبعة"""
-        analysis = {}
-        
-        # المحور الأول: الاتجاه والسلوك السعري
-        analysis['trend_analysis'] = self.trend_analysis()
-        
-        # المحور الثاني: التحليل الرقمي والزمني
-        analysis['fibonacci_analysis'] = self.fibonacci_analysis()
-        
-        # المحور الثالث: تحليل الحجم
-        analysis['volume_analysis'] = self.volume_analysis()
-        
-        # المحور الرابع: النماذج الفنية
-        analysis['patterns_analysis'] = self.patterns_analysis()
-        
-        # المحور الخامس: المؤشرات الديناميكية
-        analysis['indicators_analysis'] = self.indicators_analysis()
-        
-        # المحور السادس: تدفق المال
-        analysis['money_flow_analysis'] = self.money_flow_analysis()
-        
-        # المحور السابع: الأدوات الاحترافية
-        analysis['professional_tools'] = self.professional_tools_analysis()
-        
-        # حساب التوصية النهائية
-        final_recommendation = self.calculate_final_recommendation(analysis)
+        results = self.evaluate('analysis', 'recommendation')
         
         return {
-            'analysis': analysis,
-            'recommendation': final_recommendation
+            'analysis': results['analysis'],
+            'recommendation': results['recommendation']
         }
     
     def trend_analysis(self):
@@ -93,9 +151,9 @@ class TechnicalAnalysisSimple:
         signals = []
         
         # المتوسطات المتحركة
-        ma_10 = self.simple_moving_average(self.close, 10)
-        ma_20 = self.simple_moving_average(self.close, 20)
-        ma_50 = self.simple_moving_average(self.close, 50)
+        ma_10 = self.get('sma_10')
+        ma_20 = self.get('sma_20')
+        ma_50 = self.get('sma_50')
         
         current_price = self.close[-1]
         
@@ -121,22 +179,26 @@ class TechnicalAnalysisSimple:
         
         return signals
     
-    def fibonacci_analysis(self):
-        """المحور الثاني: تحليل فيبوناتشي"""
-        signals = []
-        
+    def fibonacci_levels(self):
+        """مستويات فيبوناتشي لآخر 50 شمعة"""
         # العثور على أعلى وأقل نقطة
         high_point = max(self.high[-50:])
         low_point = min(self.low[-50:])
         diff = high_point - low_point
         
-        # مستويات فيبوناتشي
-        fib_levels = {
+        return {
             '23.6%': high_point - 0.236 * diff,
             '38.2%': high_point - 0.382 * diff,
             '50%': high_point - 0.5 * diff,
             '61.8%': high_point - 0.618 * diff
         }
+    
+    def fibonacci_analysis(self):
+        """المحور الثاني: تحليل فيبوناتشي"""
+        signals = []
+        
+        # مستويات فيبوناتشي
+        fib_levels = self.get('fibonacci_levels')
         
         current_price = self.close[-1]
         
@@ -162,7 +224,7 @@ class TechnicalAnalysisSimple:
         current_volume = self.volume[-1]
         
         # OBV
-        obv = self.calculate_obv()
+        obv = self.get('obv')
         obv_trend = obv[-1] - obv[-10]
         
         if current_volume > avg_volume * 1.5 and obv_trend > 0:
@@ -172,16 +234,22 @@ class TechnicalAnalysisSimple:
         
         return signals
     
+    def local_peaks(self, window=10):
+        """القمم المحلية (الموقع، السعر): أعلى من الشموع العشر قبلها وبعدها عبر نوافذ منزلقة"""
+        if len(self.high) <= 2 * window:
+            return []
+        window_max = np.lib.stride_tricks.sliding_window_view(self.high, window).max(axis=1)
+        candidates = np.arange(window, len(self.high) - window)
+        is_peak = (self.high[candidates] > window_max[candidates - window]) & \
+                  (self.high[candidates] > window_max[candidates + 1])
+        return [(int(i), self.high[i]) for i in candidates[is_peak]]
+    
     def patterns_analysis(self):
         """المحور الرابع: النماذج الفنية"""
         signals = []
         
         # نموذج الرأس والكتفين المبسط
-        recent_highs = []
-        for i in range(10, len(self.high) - 10):
-            if (self.high[i] > max(self.high[i-10:i]) and 
-                self.high[i] > max(self.high[i+1:i+11])):
-                recent_highs.append((i, self.high[i]))
+        recent_highs = self.local_peaks()
         
         if len(recent_highs) >= 3:
             # تحليل مبسط للرأس والكتفين
@@ -206,7 +274,7 @@ class TechnicalAnalysisSimple:
         signals = []
         
         # RSI
-        rsi = self.rsi()
+        rsi = self.get('rsi')
         current_rsi = rsi[-1]
         
         if current_rsi > 70:
@@ -215,7 +283,7 @@ class TechnicalAnalysisSimple:
             signals.append({"signal": "شراء", "strength": 65, "reason": f"RSI منخفض {current_rsi:.1f}"})
         
         # MACD
-        macd_line, signal_line, histogram = self.macd()
+        macd_line, signal_line, histogram = self.get('macd')
         
         if macd_line[-1] > signal_line[-1] and macd_line[-2] <= signal_line[-2]:
             signals.append({"signal": "شراء", "strength": 70, "reason": "إشارة MACD صاعدة"})
@@ -223,7 +291,7 @@ class TechnicalAnalysisSimple:
             signals.append({"signal": "بيع", "strength": 70, "reason": "إشارة MACD هابطة"})
         
         # البولنجر باندز
-        upper_band, middle_band, lower_band = self.bollinger_bands()
+        upper_band, middle_band, lower_band = self.get('bollinger')
         current_price = self.close[-1]
         
         if current_price > upper_band[-1]:
@@ -233,27 +301,19 @@ class TechnicalAnalysisSimple:
         
         return signals
     
-    def money_flow_analysis(self):
-        """المحور السادس: تدفق المال"""
-        signals = []
-        
-        if self.volume is None:
-            return [{"signal": "محايد", "strength": 50, "reason": "بيانات الحجم غير متوفرة"}]
-        
-        # Money Flow Index مبسط
-        typical_price = (self.high + self.low + self.close) / 3
+    def money_flows(self):
+        """التدفق الموجب والسالب لكل شمعة بعد الأولى حسب اتجاه السعر النموذجي"""
+        typical_price = self.bars.typical_price
         money_flow = typical_price * self.volume
+        rising = typical_price[1:] > typical_price[:-1]
+        return np.where(rising, money_flow[1:], 0.0), np.where(rising, 0.0, money_flow[1:])
+    
+    def money_flow_index(self):
+        """Money Flow Index مبسط لآخر 14 شمعة (None بدون بيانات حجم)"""
+        if self.volume is None:
+            return None
         
-        positive_flow = []
-        negative_flow = []
-        
-        for i in range(1, len(typical_price)):
-            if typical_price[i] > typical_price[i-1]:
-                positive_flow.append(money_flow[i])
-                negative_flow.append(0)
-            else:
-                positive_flow.append(0)
-                negative_flow.append(money_flow[i])
+        positive_flow, negative_flow = self.money_flows()
         
         # تجنب القسمة على صفر
         negative_sum = sum(negative_flow[-14:])
@@ -264,6 +324,16 @@ class TechnicalAnalysisSimple:
         else:
             mfi = 100 - (100 / (1 + (positive_sum / negative_sum)))
         
+        return mfi
+    
+    def money_flow_analysis(self):
+        """المحور السادس: تدفق المال"""
+        signals = []
+        
+        mfi = self.get('mfi')
+        if mfi is None:
+            return [{"signal": "محايد", "strength": 50, "reason": "بيانات الحجم غير متوفرة"}]
+        
         if mfi > 80:
             signals.append({"signal": "بيع", "strength": 65, "reason": f"MFI مرتفع {mfi:.1f}"})
         elif mfi < 20:
@@ -271,11 +341,8 @@ class TechnicalAnalysisSimple:
         
         return signals
     
-    def professional_tools_analysis(self):
-        """المحور السابع: الأدوات الاحترافية"""
-        signals = []
-        
-        # Pivot Points
+    def pivot_points(self):
+        """نقاط Pivot من الشمعة السابقة"""
         yesterday_high = self.high[-2] if len(self.high) > 1 else self.high[-1]
         yesterday_low = self.low[-2] if len(self.low) > 1 else self.low[-1]
         yesterday_close = self.close[-2] if len(self.close) > 1 else self.close[-1]
@@ -284,6 +351,22 @@ class TechnicalAnalysisSimple:
         r1 = 2 * pivot - yesterday_low
         s1 = 2 * pivot - yesterday_high
         
+        return {'pivot': pivot, 'r1': r1, 's1': s1}
+    
+    def average_true_range(self, period=14):
+        """متوسط المدى الحقيقي لآخر الشموع"""
+        tr_values = self.bars.true_range[1:]
+        return np.mean(tr_values[-period:]) if len(tr_values) >= period else np.mean(tr_values)
+    
+    def professional_tools_analysis(self):
+        """المحور السابع: الأدوات الاحترافية"""
+        signals = []
+        
+        # Pivot Points
+        pivots = self.get('pivot_points')
+        r1 = pivots['r1']
+        s1 = pivots['s1']
+        
         current_price = self.close[-1]
         
         if current_price > r1:
@@ -292,16 +375,7 @@ class TechnicalAnalysisSimple:
             signals.append({"signal": "شراء", "strength": 60, "reason": f"تحت دعم Pivot S1 {s1:.4f}"})
         
         # ATR للتقلبات
-        tr_values = []
-        for i in range(1, len(self.close)):
-            tr = max(
-                self.high[i] - self.low[i],
-                abs(self.high[i] - self.close[i-1]),
-                abs(self.low[i] - self.close[i-1])
-            )
-            tr_values.append(tr)
-        
-        atr = np.mean(tr_values[-14:]) if len(tr_values) >= 14 else np.mean(tr_values)
+        atr = self.get('atr')
         volatility_ratio = atr / current_price * 100
         
         if volatility_ratio > 3:
@@ -309,6 +383,163 @@ class TechnicalAnalysisSimple:
         
         return signals
     
+    def recommendation_series(self, lookback=120, warmup=50):
+        """التوصية النهائية لكل شمعة في التاريخ دفعة واحدة (نفس قواعد المحاور السبعة)
+
+        كل شمعة تُقيَّم كما لو كانت آخر شمعة في نافذة طولها lookback، كما في التحليل الحي.
+        الاستثناء الوحيد هو MACD: المتوسط الأسي يُحسب على كامل التاريخ بدلاً من بداية النافذة.
+        """
+        close = pd.Series(self.close, dtype=np.float64)
+        high = pd.Series(self.high, dtype=np.float64)
+        low = pd.Series(self.low, dtype=np.float64)
+        n = len(close)
+        
+        buy = np.zeros(n)
+        sell = np.zeros(n)
+        neutral = np.zeros(n)
+        
+        def add(mask, kind, strength):
+            mask = np.asarray(mask, dtype=bool)
+            kind[mask] += strength
+        
+        c = close.values
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # المحور الأول: الاتجاه
+            ma_10 = close.rolling(10).mean().values
+            ma_20 = close.rolling(20).mean().values
+            ma_50 = close.rolling(50).mean().values
+            strong_up = (c > ma_10) & (ma_10 > ma_20) & (ma_20 > ma_50)
+            strong_down = (c < ma_10) & (ma_10 < ma_20) & (ma_20 < ma_50)
+            add(strong_up, buy, 80)
+            add(strong_down, sell, 80)
+            add(~strong_up & ~strong_down, neutral, 50)
+            
+            resistance = high.rolling(20, min_periods=1).max().values
+            support = low.rolling(20, min_periods=1).min().values
+            near_resistance = (resistance - c) / c * 100 < 1
+            near_support = (c - support) / c * 100 < 1
+            add(near_resistance, sell, 70)
+            add(~near_resistance & near_support, buy, 70)
+            
+            # المحور الثاني: فيبوناتشي
+            high_point = high.rolling(50, min_periods=1).max().values
+            low_point = low.rolling(50, min_periods=1).min().values
+            diff = high_point - low_point
+            for ratio in (0.236, 0.382, 0.5, 0.618):
+                level = high_point - ratio * diff
+                near = np.abs(c - level) / c * 100 < 0.5
+                add(near & (c > level), buy, 65)
+                add(near & ~(c > level), sell, 65)
+            
+            # المحور الثالث: الحجم
+            if self.volume is None:
+                add(np.ones(n), neutral, 50)
+            else:
+                volume = pd.Series(self.volume, dtype=np.float64)
+                avg_volume = volume.rolling(20, min_periods=1).mean().values
+                direction = np.sign(np.diff(c, prepend=c[0]))
+                obv_trend = pd.Series(direction * volume.values).rolling(9, min_periods=1).sum().values
+                high_volume = volume.values > avg_volume * 1.5
+                add(high_volume & (obv_trend > 0), buy, 75)
+                add(high_volume & (obv_trend < 0), sell, 75)
+            
+            # المحور الرابع: الرأس والكتفين ضمن نافذة التحليل
+            h = high.values
+            left_max = high.shift(1).rolling(10).max().values
+            right_max = high[::-1].rolling(10).max()[::-1].shift(-1).values
+            pivots = np.flatnonzero((h > left_max) & (h > right_max))
+            t = np.arange(n)
+            visible = np.searchsorted(pivots, t - 10, side='right')
+            window_start = np.maximum(t - lookback + 1, 0) + 10
+            has_three = visible >= 3
+            safe = np.where(has_three, visible, 3)
+            left_shoulder = pivots[safe - 3] if len(pivots) >= 3 else np.zeros(n, dtype=int)
+            head = pivots[safe - 2] if len(pivots) >= 3 else np.zeros(n, dtype=int)
+            right_shoulder = pivots[safe - 1] if len(pivots) >= 3 else np.zeros(n, dtype=int)
+            head_and_shoulders = (
+                has_three & (left_shoulder >= window_start)
+                & (h[head] > h[left_shoulder]) & (h[head] > h[right_shoulder])
+            )
+            add(head_and_shoulders, sell, 70)
+            
+            # نموذج المثلث: ميل الانحدار لآخر 20 شمعة
+            weights = np.arange(20) - 9.5
+            weights = weights / np.sum(weights ** 2)
+            high_slope = np.full(n, np.nan)
+            low_slope = np.full(n, np.nan)
+            if n >= 20:
+                high_slope[19:] = np.correlate(self.high.astype(np.float64), weights, mode='valid')
+                low_slope[19:] = np.correlate(self.low.astype(np.float64), weights, mode='valid')
+            add((np.abs(high_slope) < 0.001) & (np.abs(low_slope) < 0.001), neutral, 60)
+            
+            # المحور الخامس: المؤشرات الديناميكية
+            rsi = self.get('rsi')
+            add(rsi > 70, sell, 65)
+            add(rsi < 30, buy, 65)
+            
+            macd_line, signal_line, _ = self.get('macd')
+            prev_macd = np.roll(macd_line, 1)
+            prev_signal = np.roll(signal_line, 1)
+            add((macd_line > signal_line) & (prev_macd <= prev_signal), buy, 70)
+            add((macd_line < signal_line) & (prev_macd >= prev_signal), sell, 70)
+            
+            upper_band, _, lower_band = self.get('bollinger')
+            add(c > upper_band, sell, 60)
+            add(~(c > upper_band) & (c < lower_band), buy, 60)
+            
+            # المحور السادس: تدفق المال
+            if self.volume is None:
+                add(np.ones(n), neutral, 50)
+            else:
+                typical_price = self.bars.typical_price
+                money_flow = typical_price * self.volume
+                rising = np.diff(typical_price, prepend=np.nan) > 0
+                positive_sum = pd.Series(np.where(rising, money_flow, 0.0)).rolling(14, min_periods=1).sum().values
+                negative_sum = pd.Series(np.where(rising, 0.0, money_flow)).rolling(14, min_periods=1).sum().values
+                mfi = np.where(
+                    (negative_sum == 0) | (positive_sum == 0),
+                    50,
+                    100 - (100 / (1 + (positive_sum / negative_sum)))
+                )
+                add(mfi > 80, sell, 65)
+                add(mfi < 20, buy, 65)
+            
+            # المحور السابع: الأدوات الاحترافية
+            prev_high = np.roll(self.high, 1)
+            prev_low = np.roll(self.low, 1)
+            prev_close = np.roll(self.close, 1)
+            pivot = (prev_high + prev_low + prev_close) / 3
+            r1 = 2 * pivot - prev_low
+            s1 = 2 * pivot - prev_high
+            add(c > r1, sell, 60)
+            add(~(c > r1) & (c < s1), buy, 60)
+            
+            true_range = np.maximum.reduce([
+                self.high - self.low,
+                np.abs(self.high - prev_close),
+                np.abs(self.low - prev_close)
+            ])
+            atr = pd.Series(true_range).rolling(14).mean().values
+            add(atr / c * 100 > 3, neutral, 40)
+            
+            # التوصية النهائية
+            total = buy + sell + neutral
+            is_buy = (buy > sell) & (buy > neutral)
+            is_sell = (sell > buy) & (sell > neutral)
+            direction = np.where(is_buy, 1, np.where(is_sell, -1, 0)).astype(np.int8)
+            confidence = np.where(is_buy, buy / total * 100, np.where(is_sell, sell / total * 100, 50.0))
+        
+        # الشموع الأولى لا تكفي لحساب المتوسطات
+        direction[:warmup] = 0
+        volatility = close.rolling(20).std(ddof=0).values * 2
+        
+        return pd.DataFrame({
+            'direction': direction,
+            'confidence': confidence,
+            'volatility': volatility
+        }, index=self.data.index)
+    
     def calculate_final_recommendation(self, analysis):
         """حساب التوصية النهائية"""
         buy_signals = 0
@@ -0,0 +1,119 @@
+"""
+سجل أحداث الصفقات: إلحاق حدث واحد لكل تغيير مع ضغط دوري في لقطة كاملة
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class TradeJournal:
+    """سجل إلحاقي لأحداث الصفقات (فتح، تحقق هدف، تحريك وقف، إغلاق)
+
+    اللقطة بنفس صيغة ملف الصفقات السابق، والأحداث تُكتب سطراً JSON لكل حدث.
+    كل حدث يحمل القيم الكاملة للحقول المتغيرة، فإعادة تطبيقه مرتين لا تغير النتيجة.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None,
+                 compact_every: int = 500, fsync: bool = True):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.events_since_compaction = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        """تحميل اللقطة ثم إعادة تشغيل الأحداث التالية لها"""
+        with self._lock:
+            try:
+                with open(self.snapshot_path, "r") as f:
+                    trades = json.load(f)
+            except FileNotFoundError:
+                trades = {}
+
+            self.events_since_compaction = 0
+            valid_length = 0
+
+            try:
+                with open(self.journal_path, "rb") as f:
+                    for line in f:
+                        # سطر أخير ناقص بسبب انقطاع أثناء الكتابة يتم تجاهله
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            break
+                        self._apply(trades, event)
+                        valid_length += len(line)
+                        self.events_since_compaction += 1
+            except FileNotFoundError:
+                pass
+
+            # حذف الذيل التالف حتى لا يلتصق به الحدث التالي
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > valid_length:
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid_length)
+
+            return trades
+
+    @staticmethod
+    def _apply(trades: Dict[str, Dict], event: Dict):
+        """تطبيق حدث واحد على قاموس الصفقات"""
+        trade_id = event["trade_id"]
+        if event["event"] == "open":
+            trades[trade_id] = dict(event["fields"])
+        elif trade_id in trades:
+            trades[trade_id].update(event["fields"])
+
+    def record(self, event: str, trade_id: str, fields: Dict):
+        """إلحاق حدث بالسجل (تكلفة ثابتة مهما كان عدد الصفقات)"""
+        line = json.dumps({
+            "event": event,
+            "trade_id": trade_id,
+            "time": datetime.now().isoformat(),
+            "fields": fields
+        }, default=str, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.events_since_compaction += 1
+
+    def maybe_compact(self, trades: Dict[str, Dict]):
+        """ضغط السجل في لقطة عند تجاوز عدد الأحداث للحد المحدد"""
+        if self.events_since_compaction >= self.compact_every:
+            self.compact(trades)
+
+    def compact(self, trades: Dict[str, Dict]):
+        """كتابة لقطة كاملة بشكل ذري ثم تفريغ السجل"""
+        with self._lock:
+            temp_path = self.snapshot_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(trades, f, indent=2, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+
+            # انقطاع هنا يترك أحداثاً مطبقة مسبقاً في اللقطة، وإعادة تطبيقها آمنة
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.journal_path, "w", encoding="utf-8")
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.events_since_compaction = 0
+
+    def close(self):
+        """إغلاق ملف السجل"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,180 @@
+"""
+محرك مراقبة الصفقات: فحص أهداف ووقف خسارة جميع الصفقات المفتوحة دفعة واحدة
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class TradeLevelMonitor:
+    """يحتفظ بالصفقات المفتوحة كمصفوفات ويقيّمها مقابل لقطة أسعار واحدة لكل دورة"""
+
+    def __init__(self, target_keys: Sequence[str] = ('target_1', 'target_2', 'target_3'),
+                 stop_key: str = 'stop_loss', entry_key: str = 'entry_zone_1', capacity: int = 64):
+        self.target_keys = tuple(target_keys)
+        self.stop_key = stop_key
+        self.entry_key = entry_key
+
+        self.size = 0
+        self.trade_ids = []
+        self.symbols = []
+        self.index = {}  # معرف الصفقة -> رقم الصف
+
+        n_targets = len(self.target_keys)
+        self.direction = np.zeros(capacity, dtype=np.int8)  # +1 شراء، -1 بيع
+        self.entry = np.zeros(capacity, dtype=np.float64)
+        self.stop = np.zeros(capacity, dtype=np.float64)
+        self.targets = np.full((capacity, n_targets), np.nan, dtype=np.float64)
+        self.targets_hit = np.zeros((capacity, n_targets), dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, trade_id):
+        return trade_id in self.index
+
+    def _grow(self):
+        """مضاعفة سعة المصفوفات"""
+        capacity = max(1, len(self.direction)) * 2
+        self.direction = np.resize(self.direction, capacity)
+        self.entry = np.resize(self.entry, capacity)
+        self.stop = np.resize(self.stop, capacity)
+
+        targets = np.full((capacity, len(self.target_keys)), np.nan, dtype=np.float64)
+        targets[:self.size] = self.targets[:self.size]
+        self.targets = targets
+
+        targets_hit = np.zeros((capacity, len(self.target_keys)), dtype=bool)
+        targets_hit[:self.size] = self.targets_hit[:self.size]
+        self.targets_hit = targets_hit
+
+    def load(self, trades: Dict[str, Dict]):
+        """إعادة بناء المصفوفات من قاموس الصفقات (عند بدء التشغيل)"""
+        self.size = 0
+        self.trade_ids = []
+        self.symbols = []
+        self.index = {}
+
+        for trade_id, trade in trades.items():
+            if trade.get('status') in ['closed', 'cancelled']:
+                continue
+            self.add_trade(trade_id, trade)
+
+    def add_trade(self, trade_id: str, trade: Dict):
+        """إضافة صفقة مفتوحة"""
+        if trade_id in self.index:
+            self.remove_trade(trade_id)
+
+        if self.size == len(self.direction):
+            self._grow()
+
+        row = self.size
+        self.size += 1
+        self.index[trade_id] = row
+        self.trade_ids.append(trade_id)
+        self.symbols.append(trade['symbol'])
+
+        self.direction[row] = 1 if trade['type'] == 'شراء' else -1
+        self.entry[row] = float(trade.get(self.entry_key, np.nan))
+        self.stop[row] = float(trade[self.stop_key])
+
+        hit = trade.get('targets_hit', [])
+        for col, key in enumerate(self.target_keys):
+            value = trade.get(key)
+            self.targets[row, col] = np.nan if value is None else float(value)
+            self.targets_hit[row, col] = key in hit
+
+    def remove_trade(self, trade_id: str):
+        """حذف صفقة بنقل الصف الأخير مكانها"""
+        row = self.index.pop(trade_id, None)
+        if row is None:
+            return
+
+        last = self.size - 1
+        if row != last:
+            moved_id = self.trade_ids[last]
+            self.trade_ids[row] = moved_id
+            self.symbols[row] = self.symbols[last]
+            self.index[moved_id] = row
+
+            self.direction[row] = self.direction[last]
+            self.entry[row] = self.entry[last]
+            self.stop[row] = self.stop[last]
+            self.targets[row] = self.targets[last]
+            self.targets_hit[row] = self.targets_hit[last]
+
+        self.trade_ids.pop()
+        self.symbols.pop()
+        self.size -= 1
+
+    def mark_target_hit(self, trade_id: str, target_key: str):
+        """تسجيل تحقق هدف حتى لا يتكرر تنبيهه"""
+        row = self.index.get(trade_id)
+        if row is not None and target_key in self.target_keys:
+            self.targets_hit[row, self.target_keys.index(target_key)] = True
+
+    def update_stop(self, trade_id: str, stop_loss: float):
+        """تحديث وقف الخسارة بعد تحريكه"""
+        row = self.index.get(trade_id)
+        if row is not None:
+            self.stop[row] = float(stop_loss)
+
+    def get_symbols(self) -> List[str]:
+        """الرموز المطلوبة في لقطة الأسعار"""
+        return list(dict.fromkeys(self.symbols))
+
+    def levels_by_symbol(self) -> Dict[str, List[float]]:
+        """المستويات التي ما زالت تحت المراقبة لكل رمز: الوقف والأهداف غير المحققة"""
+        levels = {}
+        for row, symbol in enumerate(self.symbols):
+            pending = self.targets[row][~self.targets_hit[row] & ~np.isnan(self.targets[row])]
+            levels.setdefault(symbol, []).extend([float(self.stop[row])] + pending.tolist())
+        return levels
+
+    def evaluate(self, quotes: Dict[str, float]) -> List[Dict]:
+        """تقييم جميع الصفقات مقابل لقطة الأسعار وإرجاع الأهداف ووقف الخسارة المحققة"""
+        n = self.size
+        if n == 0 or not quotes:
+            return []
+
+        # تحويل لقطة الأسعار إلى مصفوفة بنفس ترتيب الصفقات
+        unique_symbols, codes = np.unique(np.array(self.symbols, dtype=object), return_inverse=True)
+        symbol_prices = np.array([quotes.get(symbol, np.nan) for symbol in unique_symbols], dtype=np.float64)
+        prices = symbol_prices[codes]
+
+        direction = self.direction[:n]
+        has_price = ~np.isnan(prices)
+
+        # المسافة الموجهة: موجبة في اتجاه الربح لكل من الشراء والبيع
+        with np.errstate(invalid='ignore'):
+            stop_hit = has_price & (direction * (prices - self.stop[:n]) <= 0)
+            target_hit = (
+                (direction[:, None] * (prices[:, None] - self.targets[:n]) >= 0)
+                & ~self.targets_hit[:n]
+                & ~np.isnan(self.targets[:n])
+                & (has_price & ~stop_hit)[:, None]
+            )
+
+        hits = []
+        for row in np.nonzero(stop_hit)[0].tolist():
+            hits.append({
+                'trade_id': self.trade_ids[row],
+                'event': 'stop_loss',
+                'price': float(prices[row])
+            })
+
+        rows, cols = np.nonzero(target_hit)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            hits.append({
+                'trade_id': self.trade_ids[row],
+                'event': 'target',
+                'target': self.target_keys[col],
+                'price': float(prices[row])
+            })
+
+        return hits
+
+    def prices_for(self, quotes: Dict[str, float]) -> Dict[str, Optional[float]]:
+        """السعر الحالي لكل صفقة من لقطة الأسعار"""
+        return {trade_id: quotes.get(symbol) for trade_id, symbol in zip(self.trade_ids, self.symbols)}
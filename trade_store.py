@@ -0,0 +1,222 @@
+"""
+مخزن تاريخ الصفقات: قاعدة SQLite بإضافة صف لكل صفقة وتحليلات متجهة بـ NumPy/pandas
+"""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+TRADE_COLUMNS = [
+    "symbol", "type", "entry_price", "exit_price", "pips_gained", "success",
+    "timeframe", "analysis_time", "trade_date", "trade_time"
+]
+
+
+class TradeStore:
+    """جدول صفقات بإضافة فقط، مع تجميعات الأداء محفوظة بجانبه"""
+
+    def __init__(self, db_path: str = "trading_history.db"):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._depth = 0  # عمق المعاملات المتداخلة؛ الالتزام عند خروج الخارجية فقط
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        """إنشاء الجداول والفهارس"""
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS trades (
+                    id INTEGER PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    type TEXT,
+                    entry_price REAL,
+                    exit_price REAL,
+                    pips_gained REAL NOT NULL,
+                    success INTEGER NOT NULL,
+                    timeframe TEXT,
+                    analysis_time TEXT,
+                    trade_date TEXT NOT NULL,
+                    trade_time TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_date ON trades (trade_date)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades (symbol, trade_date)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+
+    @contextmanager
+    def transaction(self):
+        """تنفيذ عدة عمليات كتابة في معاملة واحدة؛ المعاملة المتداخلة جزء من الخارجية"""
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self
+                finally:
+                    self._depth -= 1
+                return
+
+            self._depth = 1
+            try:
+                with self.conn:
+                    yield self
+            finally:
+                self._depth = 0
+
+    def append(self, trade: Dict) -> int:
+        """إضافة صفقة وإرجاع رقمها"""
+        with self.transaction():
+            cursor = self.conn.execute(
+                f"INSERT INTO trades ({', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * len(TRADE_COLUMNS))})",
+                [self._column_value(trade, column) for column in TRADE_COLUMNS]
+            )
+            return cursor.lastrowid
+
+    def append_many(self, trades: Iterable[Dict]):
+        """إضافة دفعة صفقات بأمر واحد"""
+        with self.transaction():
+            self.conn.executemany(
+                f"INSERT INTO trades ({', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * len(TRADE_COLUMNS))})",
+                ([self._column_value(trade, column) for column in TRADE_COLUMNS] for trade in trades)
+            )
+
+    @staticmethod
+    def _column_value(trade: Dict, column: str):
+        value = trade.get(column)
+        if column == "success":
+            return int(bool(value))
+        return value
+
+    def count(self) -> int:
+        """عدد الصفقات المخزنة"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    def get_rollup(self, kind: str, key: str) -> Optional[Dict]:
+        """مجمع أداء محفوظ (None إذا لم يوجد)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM rollups WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_rollup(self, kind: str, key: str, bucket: Dict):
+        """حفظ مجمع أداء"""
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rollups (kind, key, data) VALUES (?, ?, ?)",
+                (kind, key, json.dumps(bucket, ensure_ascii=False))
+            )
+
+    def get_rollups(self, kind: str) -> Dict[str, Dict]:
+        """كل المجمعات من نوع واحد"""
+        with self._lock:
+            rows = self.conn.execute("SELECT key, data FROM rollups WHERE kind = ?", (kind,)).fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def frame(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              symbol: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """الصفقات كـ DataFrame بترتيبها الزمني مع تصفية بالتاريخ والرمز في قاعدة البيانات"""
+        columns = columns or ["id"] + TRADE_COLUMNS
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("trade_date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("trade_date <= ?")
+            params.append(end_date)
+        if symbol is not None:
+            conditions.append("symbol = ?")
+            params.append(symbol)
+
+        query = f"SELECT {', '.join(columns)} FROM trades"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY trade_date, trade_time, id"
+
+        with self._lock:
+            return pd.read_sql_query(query, self.conn, params=params)
+
+    def analytics(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  symbol: Optional[str] = None) -> Dict:
+        """إحصائيات الأداء المحسوبة بشكل متجه"""
+        trades = self.frame(start_date, end_date, symbol,
+                            columns=["id", "symbol", "pips_gained", "success", "trade_date"])
+        pips = trades["pips_gained"].to_numpy(dtype=np.float64)
+        success = trades["success"].to_numpy(dtype=bool)
+
+        stats = {'total_trades': len(pips)}
+        stats.update(performance_stats(pips, success))
+        stats['equity_curve'] = np.cumsum(pips)
+        stats['drawdown_curve'] = drawdown_curve(stats['equity_curve'])
+        stats['symbol_stats'] = symbol_stats(trades)
+        return stats
+
+    def close(self):
+        """إغلاق الاتصال بقاعدة البيانات"""
+        with self._lock:
+            self.conn.close()
+
+
+def performance_stats(pips: np.ndarray, success: np.ndarray) -> Dict:
+    """نسبة النجاح والتوقع الرياضي وأقصى تراجع لمصفوفة نتائج الصفقات"""
+    if len(pips) == 0:
+        return {'win_rate': 0.0, 'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0,
+                'profit_factor': 0.0, 'total_pips': 0.0, 'max_drawdown': 0.0}
+
+    wins = pips[pips > 0]
+    losses = pips[pips <= 0]
+    win_rate = float(success.mean())
+    avg_win = float(wins.mean()) if len(wins) else 0.0
+    avg_loss = float(-losses.mean()) if len(losses) else 0.0
+    gross_loss = float(-losses.sum())
+
+    return {
+        'win_rate': win_rate * 100,
+        # متوسط الربح المتوقع لكل صفقة
+        'expectancy': float(pips.mean()),
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'profit_factor': float(wins.sum()) / gross_loss if gross_loss > 0 else float('inf'),
+        'total_pips': float(pips.sum()),
+        'max_drawdown': float(drawdown_curve(np.cumsum(pips)).max())
+    }
+
+
+def drawdown_curve(equity: np.ndarray) -> np.ndarray:
+    """التراجع عن أعلى قمة سابقة عند كل صفقة (القمة الابتدائية صفر)"""
+    if len(equity) == 0:
+        return np.zeros(0)
+    peaks = np.maximum.accumulate(np.maximum(equity, 0.0))
+    return peaks - equity
+
+
+def symbol_stats(trades: pd.DataFrame) -> pd.DataFrame:
+    """إحصائيات كل رمز بعملية تجميع واحدة"""
+    if trades.empty:
+        return pd.DataFrame(columns=['trades', 'win_rate', 'total_pips', 'expectancy', 'best', 'worst'])
+
+    grouped = trades.groupby('symbol')
+    return pd.DataFrame({
+        'trades': grouped['pips_gained'].size(),
+        'win_rate': grouped['success'].mean() * 100,
+        'total_pips': grouped['pips_gained'].sum(),
+        'expectancy': grouped['pips_gained'].mean(),
+        'best': grouped['pips_gained'].max(),
+        'worst': grouped['pips_gained'].min()
+    }).sort_values('total_pips', ascending=False)
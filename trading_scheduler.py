@@ -0,0 +1,276 @@
+"""
+مجدول التداول الموحد: لقطة سوق مشتركة لكل دورة يعمل عليها النظامان التلقائي والمتقدم
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from advanced_trading_system import advanced_trading
+from auto_trading_system import auto_trading
+from data_collector import DataCollector
+from symbol_mapper import get_correct_symbol
+from task_offload import offloader
+
+
+class MarketSnapshot:
+    """بيانات السوق لدورة واحدة: الشموع والأسعار ونتائج التحليل محفوظة مرة واحدة لكل رمز"""
+
+    def __init__(self, data_collector: DataCollector, deadline: Optional[float] = None):
+        self.data_collector = data_collector
+        self.created_at = datetime.now()
+        self.deadline = deadline  # time.monotonic()
+        self._bars = {}      # (الرمز الصحيح، المدة، الفاصل) -> DataFrame أو None
+        self._analyses = {}  # مفتاح التحليل -> النتيجة
+        self._lock = threading.Lock()
+
+        self.downloads = 0
+        self.download_seconds = 0.0
+        self.analysis_hits = 0
+        self.analysis_misses = 0
+
+    def time_left(self) -> Optional[float]:
+        """الوقت المتبقي حتى نهاية الدورة"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def prefetch(self, symbols: Iterable[str], period: str, interval: str):
+        """تحميل شموع عدة رموز بطلب واحد لما ليس في اللقطة"""
+        tickers = {}
+        for symbol in symbols:
+            ticker = get_correct_symbol(symbol)
+            if (ticker, period, interval) not in self._bars:
+                tickers.setdefault(ticker, symbol)
+
+        if not tickers:
+            return
+
+        started = time.monotonic()
+        history = self.data_collector.get_batch_history(list(tickers), period=period, interval=interval)
+
+        with self._lock:
+            self.downloads += 1
+            self.download_seconds += time.monotonic() - started
+            for ticker in tickers:
+                self._bars[(ticker, period, interval)] = history.get(ticker)
+
+    def bars(self, symbol: str, period: str, interval: str) -> Optional[pd.DataFrame]:
+        """شموع الرمز من اللقطة، مع تحميله منفرداً إذا لم يكن محملاً"""
+        key = (get_correct_symbol(symbol), period, interval)
+        if key in self._bars:
+            return self._bars[key]
+
+        started = time.monotonic()
+        data = self.data_collector.get_data_by_type(symbol, period=period, interval=interval)
+
+        with self._lock:
+            self.downloads += 1
+            self.download_seconds += time.monotonic() - started
+            self._bars[key] = data
+        return data
+
+    def cached_bars(self, symbol: str, period: str, interval: str) -> Optional[pd.DataFrame]:
+        """شموع الرمز إذا كانت محملة في اللقطة فقط (بدون تحميل)"""
+        return self._bars.get((get_correct_symbol(symbol), period, interval))
+
+    def quote(self, symbol: str) -> Optional[float]:
+        """آخر سعر للرمز من أي سلسلة دقيقة محملة في اللقطة"""
+        ticker = get_correct_symbol(symbol)
+        for (cached_ticker, _, interval), data in list(self._bars.items()):
+            if cached_ticker == ticker and interval == '1m' and data is not None and not data.empty:
+                return float(data['Close'].iloc[-1])
+        return None
+
+    def quotes(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """أسعار عدة رموز، والرموز الناقصة تُحمّل بطلب واحد"""
+        symbols = list(dict.fromkeys(symbols))
+        missing = [symbol for symbol in symbols if self.quote(symbol) is None]
+        if missing:
+            self.prefetch(missing, period="1d", interval="1m")
+
+        quotes = {}
+        for symbol in symbols:
+            price = self.quote(symbol)
+            if price is not None:
+                quotes[symbol] = price
+        return quotes
+
+    async def memo_async(self, key: Tuple, compute: Callable):
+        """مثل memo لكن الحساب دالة غير متزامنة (مثلاً تحليل مفرغ لمجموعة عمال)"""
+        if key in self._analyses:
+            self.analysis_hits += 1
+            return self._analyses[key]
+
+        result = await compute()
+        with self._lock:
+            self.analysis_misses += 1
+            self._analyses[key] = result
+        return result
+
+    def memo(self, key: Tuple, compute: Callable):
+        """نتيجة تحليل محفوظة في اللقطة؛ تُحسب مرة واحدة لكل مفتاح"""
+        if key in self._analyses:
+            self.analysis_hits += 1
+            return self._analyses[key]
+
+        result = compute()
+        with self._lock:
+            self.analysis_misses += 1
+            self._analyses[key] = result
+        return result
+
+
+class TradingScheduler:
+    """يبني لقطة سوق واحدة لكل دورة ثم يشغّل عليها كل أنظمة التداول المفعلة"""
+
+    def __init__(self, strategies: List[Tuple[str, object]], interval: float = 300,
+                 cycle_deadline: float = 240, history_size: int = 50):
+        # كل نظام يوفر: trading_config و snapshot_requirements() و run_cycle(snapshot)
+        # واختيارياً next_poll_seconds(default) لإيقاظ المجدول قبل موعده حسب جدولة الرموز
+        self.strategies = strategies
+        self.interval = interval
+        self.cycle_deadline = cycle_deadline
+        self.data_collector = DataCollector()
+        self.cycle_count = 0
+        self.last_stats = {}
+        self.stats_history = deque(maxlen=history_size)
+
+    def active_strategies(self) -> List[Tuple[str, object]]:
+        """الأنظمة المفعلة حالياً"""
+        return [
+            (name, system) for name, system in self.strategies
+            if system.trading_config.get('auto_trading_enabled', False)
+        ]
+
+    def build_snapshot(self, strategies: List[Tuple[str, object]], deadline: float) -> MarketSnapshot:
+        """تحميل احتياجات كل الأنظمة مجمعة حسب المدة والفاصل"""
+        snapshot = MarketSnapshot(self.data_collector, deadline=deadline)
+
+        grouped = {}
+        for name, system in strategies:
+            try:
+                for symbols, period, interval in system.snapshot_requirements():
+                    grouped.setdefault((period, interval), []).extend(symbols)
+            except Exception as e:
+                print(f"خطأ في تحديد بيانات النظام {name}: {e}")
+
+        for (period, interval), symbols in grouped.items():
+            if snapshot.time_left() == 0:
+                break
+            snapshot.prefetch(symbols, period, interval)
+
+        return snapshot
+
+    async def run_cycle(self) -> Dict:
+        """تشغيل دورة واحدة: بناء اللقطة ثم الأنظمة ضمن المهلة"""
+        strategies = self.active_strategies()
+        if not strategies:
+            return {}
+
+        self.cycle_count += 1
+        started = time.monotonic()
+        deadline = started + self.cycle_deadline
+
+        # بناء اللقطة (شبكة) خارج حلقة الأحداث
+        try:
+            snapshot = await offloader.run_io(
+                self.build_snapshot, strategies, deadline, timeout=self.cycle_deadline
+            )
+        except asyncio.TimeoutError:
+            print(f"⏱️ تجاوز بناء لقطة السوق مهلة الدورة ({self.cycle_deadline} ثانية)")
+            snapshot = MarketSnapshot(self.data_collector, deadline=deadline)
+        snapshot_seconds = time.monotonic() - started
+
+        strategy_seconds = {}
+        timed_out = []
+        for name, system in strategies:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out.append(name)
+                continue
+
+            strategy_started = time.monotonic()
+            try:
+                await asyncio.wait_for(system.run_cycle(snapshot), timeout=remaining)
+            except asyncio.TimeoutError:
+                timed_out.append(name)
+                print(f"⏱️ تجاوز النظام {name} مهلة الدورة")
+            except Exception as e:
+                print(f"❌ خطأ في دورة النظام {name}: {e}")
+            strategy_seconds[name] = round(time.monotonic() - strategy_started, 2)
+
+        self.last_stats = {
+            'cycle': self.cycle_count,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'strategies': [name for name, _ in strategies],
+            'snapshot_seconds': round(snapshot_seconds, 2),
+            'download_seconds': round(snapshot.download_seconds, 2),
+            'downloads': snapshot.downloads,
+            'strategy_seconds': strategy_seconds,
+            'total_seconds': round(time.monotonic() - started, 2),
+            'deadline': self.cycle_deadline,
+            'timed_out': timed_out,
+            'analysis_hits': snapshot.analysis_hits,
+            'analysis_misses': snapshot.analysis_misses
+        }
+        self.stats_history.append(self.last_stats)
+
+        print(f"🗓️ دورة التداول {self.cycle_count}: اللقطة {self.last_stats['snapshot_seconds']} ث "
+              f"({snapshot.downloads} تحميل)، الأنظمة {strategy_seconds}")
+        return self.last_stats
+
+    def next_wait(self) -> float:
+        """الانتظار حتى أقرب رمز حان تحديثه لدى الأنظمة المفعلة (بحد أقصى الفاصل الثابت)"""
+        waits = [self.interval]
+        for name, system in self.active_strategies():
+            try:
+                if hasattr(system, 'next_poll_seconds'):
+                    waits.append(system.next_poll_seconds(self.interval))
+            except Exception as e:
+                print(f"خطأ في جدولة النظام {name}: {e}")
+        return min(waits)
+
+    async def run_forever(self):
+        """الحلقة الرئيسية للمجدول"""
+        for name, system in self.strategies:
+            try:
+                system.load_active_trades()
+            except Exception as e:
+                print(f"خطأ في تحميل صفقات النظام {name}: {e}")
+
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                print(f"❌ خطأ في دورة المجدول: {e}")
+
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(5, min(self.interval - elapsed, self.next_wait())))
+
+    def get_stats(self) -> Dict:
+        """إحصائيات آخر دورة مع متوسط أزمنة اللقطة والأنظمة"""
+        if not self.stats_history:
+            return {}
+
+        stats = dict(self.last_stats)
+        history = list(self.stats_history)
+        stats['avg_snapshot_seconds'] = round(sum(s['snapshot_seconds'] for s in history) / len(history), 2)
+        stats['avg_total_seconds'] = round(sum(s['total_seconds'] for s in history) / len(history), 2)
+        return stats
+
+
+# المجدول الموحد للنظامين التلقائي والمتقدم
+trading_scheduler = TradingScheduler(
+    [('auto', auto_trading), ('advanced', advanced_trading)],
+    interval=min(
+        auto_trading.trading_config.get('monitoring_interval', 300),
+        advanced_trading.trading_config.get('monitoring_interval', 300)
+    )
+)
@@ -1,63 +1,210 @@
+import atexit
+import copy
 import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
 import requests
 
+PERMISSIONS_FILE = "permissions.json"
+AUTHORIZED_KEY = "1142810150"  # مفتاح قائمة المستخدمين المعتمدين في الملف
+
+
+def default_permissions():
+    """ملف الصلاحيات الافتراضي"""
+    return {
+        AUTHORIZED_KEY: [123456789, 1142810150],  # المستخدمين المعتمدين
+        "admins": [123456789, 1142810150],        # المشرفين
+        "groups": {},
+        "pending_requests": {},  # طلبات الانتظار
+        "rejected_users": []     # المستخدمين المرفوضين
+    }
+
+
+class PermissionStore:
+    """الصلاحيات في الذاكرة مع مجموعات للبحث بزمن ثابت
+
+    الملف لا يُقرأ إلا إذا تغير على القرص (يُفحص توقيته مرة كل check_interval ثانية على الأكثر)،
+    والتعديلات تُجمع وتُكتب بعد flush_delay ثانية دفعة واحدة بكتابة ذرية (ملف مؤقت ثم استبدال).
+    """
+
+    def __init__(self, path: str = PERMISSIONS_FILE, check_interval: float = 1.0, flush_delay: float = 0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._data = {}
+        self._loaded = False
+        self._signature = None
+        self._checked_at = 0.0
+        self._dirty = False
+        self._flush_timer = None
+
+        self.users = frozenset()
+        self.admins = frozenset()
+        self.enabled_groups = ()
+        atexit.register(self.flush)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _reindex(self):
+        """إعادة بناء مجموعات البحث من البيانات"""
+        self.users = frozenset(self._data.get(AUTHORIZED_KEY, []))
+        self.admins = frozenset(self._data.get("admins", []))
+        self.enabled_groups = tuple(
+            chat_id for chat_id, info in self._data.get("groups", {}).items() if info.get("enabled")
+        )
+
+    def _load(self):
+        """قراءة الملف (أو إنشاء الافتراضي) وإعادة بناء الفهارس"""
+        try:
+            with open(self.path) as f:
+                self._data = json.load(f)
+            self._signature = self._file_signature()
+        except FileNotFoundError:
+            self._data = default_permissions()
+            self._write()
+        except Exception as e:
+            print(f"خطأ في قراءة ملف الصلاحيات: {e}")
+            if not self._loaded:
+                self._data = default_permissions()
+        self._loaded = True
+        self._reindex()
+
+    def refresh(self):
+        """إعادة التحميل إذا تغير الملف على القرص منذ آخر قراءة"""
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            # التعديلات المحلية التي لم تُكتب بعد لها الأولوية
+            if not self._loaded or (not self._dirty and self._file_signature() != self._signature):
+                self._load()
+
+    def _write(self):
+        """كتابة ذرية: ملف مؤقت في نفس المجلد ثم استبدال الملف"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".permissions-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        self._signature = self._file_signature()
+
+    def flush(self):
+        """كتابة التعديلات المعلقة الآن"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            try:
+                self._write()
+                self._dirty = False
+            except Exception as e:
+                print(f"خطأ في حفظ ملف الصلاحيات: {e}")
+
+    def _schedule_flush(self):
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    @contextmanager
+    def edit(self):
+        """تعديل الصلاحيات مباشرة؛ الفهارس تُحدّث فوراً والكتابة تُجمع"""
+        self.refresh()
+        with self._lock:
+            yield self._data
+            self._reindex()
+            self._schedule_flush()
+
+    def snapshot(self) -> dict:
+        """نسخة من الصلاحيات للقراءة (تعديلها لا يمس المخزن)"""
+        self.refresh()
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def replace(self, permissions: dict):
+        """استبدال الصلاحيات كاملة"""
+        with self._lock:
+            self._data = copy.deepcopy(permissions)
+            self._reindex()
+            self._schedule_flush()
+
+    def is_authorized(self, user_id) -> bool:
+        self.refresh()
+        return user_id in self.users
+
+    def is_admin(self, user_id) -> bool:
+        self.refresh()
+        return user_id in self.admins
+
+    def get_enabled_groups(self) -> tuple:
+        self.refresh()
+        return self.enabled_groups
+
+
+# مخزن الصلاحيات المشترك
+permission_store = PermissionStore()
+
+
 def load_permissions():
-    try:
-        with open("permissions.json") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # إنشاء ملف الصلاحيات الافتراضي
-        default_permissions = {
-            "1142810150": [123456789, 1142810150],  # المستخدمين المعتمدين
-            "admins": [123456789, 1142810150],      # المشرفين
-            "groups": {},
-            "pending_requests": {},  # طلبات الانتظار
-            "rejected_users": []     # المستخدمين المرفوضين
-        }
-        with open("permissions.json", "w") as f:
-            json.dump(default_permissions, f)
-        return default_permissions
+    """نسخة من الصلاحيات من الذاكرة (الملف يُقرأ فقط عند تغيره)"""
+    return permission_store.snapshot()
 
 def save_permissions(permissions):
-    """حفظ الصلاحيات في الملف"""
-    with open("permissions.json", "w") as f:
-        json.dump(permissions, f, indent=2)
+    """حفظ الصلاحيات (الكتابة تُجمع وتتم بشكل ذري)"""
+    permission_store.replace(permissions)
 
 def add_user_request(user_id, user_info):
     """إضافة طلب مستخدم جديد"""
-    permissions = load_permissions()
-    if "pending_requests" not in permissions:
-        permissions["pending_requests"] = {}
-    permissions["pending_requests"][str(user_id)] = user_info
-    save_permissions(permissions)
+    with permission_store.edit() as permissions:
+        permissions.setdefault("pending_requests", {})[str(user_id)] = user_info
 
 def approve_user(user_id):
     """الموافقة على مستخدم"""
-    permissions = load_permissions()
     user_id_str = str(user_id)
     
-    if user_id_str in permissions["pending_requests"]:
-        # إضافة المستخدم للمعتمدين
-        permissions["1142810150"].append(user_id)
-        # حذف من قائمة الانتظار
-        del permissions["pending_requests"][user_id_str]
-        save_permissions(permissions)
-        return True
+    with permission_store.edit() as permissions:
+        if user_id_str in permissions.get("pending_requests", {}):
+            # إضافة المستخدم للمعتمدين
+            permissions.setdefault(AUTHORIZED_KEY, []).append(user_id)
+            # حذف من قائمة الانتظار
+            del permissions["pending_requests"][user_id_str]
+            return True
     return False
 
 def reject_user(user_id):
     """رفض مستخدم"""
-    permissions = load_permissions()
     user_id_str = str(user_id)
     
-    if user_id_str in permissions["pending_requests"]:
-        # إضافة للمرفوضين
-        if user_id not in permissions["rejected_users"]:
-            permissions["rejected_users"].append(user_id)
-        # حذف من قائمة الانتظار
-        del permissions["pending_requests"][user_id_str]
-        save_permissions(permissions)
-        return True
+    with permission_store.edit() as permissions:
+        if user_id_str in permissions.get("pending_requests", {}):
+            # إضافة للمرفوضين
+            rejected = permissions.setdefault("rejected_users", [])
+            if user_id not in rejected:
+                rejected.append(user_id)
+            # حذف من قائمة الانتظار
+            del permissions["pending_requests"][user_id_str]
+            return True
     return False
 
 def get_pending_requests():
@@ -68,33 +215,26 @@ def get_pending_requests():
 def get_all_users():
     """الحصول على جميع المستخدمين المعتمدين"""
     permissions = load_permissions()
-    return permissions.get("1142810150", [])
+    return permissions.get(AUTHORIZED_KEY, [])
 
 def remove_user_approval(user_id):
     """إلغاء موافقة مستخدم"""
-    permissions = load_permissions()
-    user_list = permissions.get("1142810150", [])
-    
-    if user_id in user_list:
-        user_list.remove(user_id)
-        permissions["1142810150"] = user_list
-        save_permissions(permissions)
-        return True
+    with permission_store.edit() as permissions:
+        user_list = permissions.get(AUTHORIZED_KEY, [])
+        if user_id in user_list:
+            user_list.remove(user_id)
+            return True
     return False
 
 def search_user_by_id(search_id):
     """البحث عن مستخدم بالمعرف"""
-    permissions = load_permissions()
-    users = permissions.get("1142810150", [])
-    return search_id in users
+    return permission_store.is_authorized(search_id)
 
 def is_authorized(user_id):
-    perms = load_permissions()
-    return user_id in perms["1142810150"]
+    return permission_store.is_authorized(user_id)
 
 def is_admin(user_id):
-    perms = load_permissions()
-    return user_id in perms["admins"]
+    return permission_store.is_admin(user_id)
 
 def send_to_telegram(chat_id, message, bot_token):
     url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
@@ -106,7 +246,5 @@ def send_to_telegram(chat_id, message, bot_token):
     requests.post(url, json=payload)
 
 def send_alert_to_enabled_groups(message, bot_token):
-    perms = load_permissions()
-    for chat_id, info in perms.get("groups", {}).items():
-        if info.get("enabled"):
-            send_to_telegram(chat_id, message, bot_token)
\ No newline at end of file
+    for chat_id in permission_store.get_enabled_groups():
+        send_to_telegram(chat_id, message, bot_token)
\ No newline at end of file